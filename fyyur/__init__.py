@@ -46,11 +46,51 @@ def create_app(config_object: type[Config] = NormalConfig) -> Flask:
     db.init_app(app)
     migrate.init_app(app, db)
 
-    from fyyur.routes import artist, show, venue
+    from fyyur import genre_cache
+
+    genre_cache.init_app(app)
+
+    if app.config["SQL_INSTRUMENTATION"]:
+        from fyyur import instrumentation
+
+        instrumentation.init_app(app)
+
+    if app.config["PROFILE_DIR"]:
+        from fyyur import profiling
+
+        profiling.init_app(app)
+
+    if app.config["METRICS"]:
+        from fyyur import metrics
+
+        metrics.init_app(app)
+
+    if app.config["SLOW_QUERY_THRESHOLD"] is not None:
+        from fyyur import slow_queries
+
+        slow_queries.init_app(app)
+
+    if app.config["QUERY_STATS"]:
+        from fyyur import query_stats
+
+        query_stats.init_app(app)
+
+    if app.config["SEARCH_NGRAM_INDEX"]:
+        from fyyur import search
+
+        search.init_app(app)
+
+    from fyyur.routes import api, artist, genre, show, venue
 
     app.register_blueprint(venue.bp)
     app.register_blueprint(artist.bp)
     app.register_blueprint(show.bp)
+    app.register_blueprint(genre.bp)
+    app.register_blueprint(api.bp)
+
+    from fyyur.cli import cli
+
+    app.cli.add_command(cli)
 
     @app.route("/")
     def index() -> str:
@@ -0,0 +1,209 @@
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import IO, Optional
+
+import click
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+
+from fyyur.importer import IMPORT_KINDS, ImportReport, import_records, read_records
+from fyyur.index_advisor import advise_indexes, format_suggestions, migration_indexes
+from fyyur.models import db
+from fyyur.profiling import hot_functions_report
+from fyyur.routes.show import read_show_batch, schedule_shows
+from fyyur.synthetic import DatasetSpec, generate_dataset
+
+cli = AppGroup("fyyur", help="Fyyur data management commands.")
+
+
+@click.command("schedule-shows")
+@click.argument("file", type=click.File("r", encoding="utf-8"))
+@click.option(
+    "--format",
+    type=click.Choice(["csv", "json"]),
+    default=None,
+    help="Input format, guessed from the file extension by default.",
+)
+@with_appcontext
+def schedule_shows_command(file: IO[str], format: Optional[str]) -> None:
+    """Schedule the shows listed in FILE, one (artist_id, venue_id, start_time) per
+    row, and report which ones were accepted."""
+    if format is None:
+        format = "json" if Path(file.name).suffix == ".json" else "csv"
+
+    try:
+        rows = read_show_batch(file, format)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="FILE")
+
+    results = schedule_shows(rows)
+    for result in results:
+        if result.accepted:
+            click.echo(f"row {result.row}: accepted")
+        else:
+            click.echo(f"row {result.row}: rejected: {result.reason}")
+
+    accepted = sum(result.accepted for result in results)
+    click.echo(f"{accepted} accepted, {len(results) - accepted} rejected")
+
+
+@click.command("import")
+@click.argument("kind", type=click.Choice(sorted(IMPORT_KINDS)))
+@click.argument("file", type=click.File("r", encoding="utf-8"))
+@click.option(
+    "--format",
+    type=click.Choice(["csv", "jsonl"]),
+    default=None,
+    help="Input format, guessed from the file extension by default.",
+)
+@click.option("--chunk-size", type=click.IntRange(min=1), default=1000, show_default=True)
+@with_appcontext
+def import_command(
+    kind: str, file: IO[str], format: Optional[str], chunk_size: int
+) -> None:
+    """Import the venues or artists listed in FILE, one record per line (JSONL) or
+    per row (CSV, with genres separated by `;`)."""
+    if format is None:
+        format = "csv" if Path(file.name).suffix == ".csv" else "jsonl"
+
+    def on_progress(report: ImportReport) -> None:
+        click.echo(
+            f"{report.imported} imported, {report.rejected} rejected, "
+            f"{report.failed_chunks} failed chunks",
+            err=True,
+        )
+
+    report = import_records(
+        kind, read_records(file, format), chunk_size=chunk_size, on_progress=on_progress
+    )
+    for error in report.errors:
+        click.echo(error)
+    click.echo(
+        f"{report.imported} {kind}s imported, {report.rejected} rejected, "
+        f"{report.failed_chunks} chunks failed"
+    )
+
+
+@click.command("generate")
+@click.option("--venues", type=click.IntRange(min=0), default=1000, show_default=True)
+@click.option("--artists", type=click.IntRange(min=0), default=5000, show_default=True)
+@click.option("--shows", type=click.IntRange(min=0), default=50_000, show_default=True)
+@click.option("--seed", type=int, default=0, show_default=True)
+@click.option(
+    "--past-ratio",
+    type=click.FloatRange(0, 1),
+    default=0.5,
+    show_default=True,
+    help="Fraction of the shows in the past.",
+)
+@click.option(
+    "--days",
+    type=click.IntRange(min=1),
+    default=730,
+    show_default=True,
+    help="Number of days the shows are spread over.",
+)
+@click.option(
+    "--origin",
+    type=click.DateTime(),
+    default=None,
+    help="Boundary between past and upcoming shows, the current hour by default.",
+)
+@click.option(
+    "--chunk-size", type=click.IntRange(min=1), default=10_000, show_default=True
+)
+@click.option(
+    "--processes",
+    type=click.IntRange(min=1),
+    default=os.cpu_count() or 1,
+    show_default="number of CPUs",
+)
+@with_appcontext
+def generate_command(
+    venues: int,
+    artists: int,
+    shows: int,
+    seed: int,
+    past_ratio: float,
+    days: int,
+    origin: Optional[datetime],
+    chunk_size: int,
+    processes: int,
+) -> None:
+    """Fill an empty database with a synthetic dataset for load testing. The same
+    options always generate the same data."""
+    spec = DatasetSpec(
+        venues=venues,
+        artists=artists,
+        shows=shows,
+        seed=seed,
+        past_ratio=past_ratio,
+        days=days,
+        chunk_size=chunk_size,
+        **({"origin": origin} if origin is not None else {}),
+    )
+
+    def on_progress(kind: str, done: int, total: int) -> None:
+        click.echo(f"{done}/{total} {kind}s", err=True)
+
+    generate_dataset(spec, processes=processes, on_progress=on_progress)
+    click.echo(f"{venues} venues, {artists} artists and {shows} shows generated")
+
+
+@click.command("profile-report")
+@click.option(
+    "--dir",
+    "profile_dir",
+    type=click.Path(exists=True, file_okay=False),
+    default=None,
+    help="Directory of the profiles, PROFILE_DIR by default.",
+)
+@click.option("--endpoint", default=None, help="Only aggregate the profiles of ENDPOINT.")
+@click.option("--top", type=click.IntRange(min=1), default=20, show_default=True)
+@click.option(
+    "--sort",
+    type=click.Choice(["cumulative", "tottime", "ncalls"]),
+    default="cumulative",
+    show_default=True,
+)
+@with_appcontext
+def profile_report_command(
+    profile_dir: Optional[str], endpoint: Optional[str], top: int, sort: str
+) -> None:
+    """Aggregate the sampled request profiles into a report of the hottest
+    functions."""
+    profile_dir = profile_dir or current_app.config["PROFILE_DIR"]
+    if not profile_dir:
+        raise click.UsageError("PROFILE_DIR is not configured, pass --dir.")
+    click.echo(hot_functions_report(profile_dir, endpoint=endpoint, top=top, sort=sort))
+
+
+@click.command("advise-indexes")
+@click.argument("stats_file", type=click.File("r", encoding="utf-8"))
+@click.option(
+    "--top",
+    type=click.IntRange(min=1),
+    default=50,
+    show_default=True,
+    help="Number of most time consuming fingerprints to look at.",
+)
+@with_appcontext
+def advise_indexes_command(stats_file: IO[str], top: int) -> None:
+    """Suggest the indexes missing to the statements of STATS_FILE, a dump of
+    `/query-stats`, given the tables of the models and the indexes of the
+    migrations."""
+    query_stats = json.load(stats_file)
+    versions_dir = Path(current_app.extensions["migrate"].directory) / "versions"
+    suggestions = advise_indexes(
+        query_stats, db.metadata, migration_indexes(versions_dir), top=top
+    )
+    click.echo(format_suggestions(suggestions, query_stats))
+
+
+cli.add_command(schedule_shows_command)
+cli.add_command(import_command)
+cli.add_command(generate_command)
+cli.add_command(profile_report_command)
+cli.add_command(advise_indexes_command)
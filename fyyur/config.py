@@ -1,5 +1,6 @@
 import os
 from pathlib import Path
+from typing import Optional
 
 
 class Config(object):
@@ -7,6 +8,76 @@ class Config(object):
     # Grabs the folder where the script runs.
     basedir = os.path.abspath(os.path.dirname(__file__))
 
+    # Number of shows rendered per page on `/shows/`.
+    SHOWS_PER_PAGE = 30
+    # Number of venues or artists rendered per page on `/genres/<genre>/...`.
+    GENRE_MEMBERS_PER_PAGE = 30
+    # Seconds the genre ids are cached for, see `genre_cache`, bounding how long a
+    # change of the `Genre` table made out of band can go unnoticed.
+    GENRE_IDS_MAX_AGE = 300.0
+    # Matches listed on `/venues/<id>/matches` and `/artists/<id>/matches`, see
+    # `matchmaking`, counting the free days over the next MATCH_CALENDAR_DAYS days.
+    # At most MATCH_CACHE_SIZE match pages are cached, for MATCH_CACHE_MAX_AGE
+    # seconds, bounding how long a change made out of band can go unnoticed. The
+    # index of the seeking venues and artists is rebuilt every MATCH_INDEX_MAX_AGE
+    # seconds, for the rows updated out of band.
+    MATCH_LIMIT = 20
+    MATCH_CALENDAR_DAYS = 30
+    MATCH_CACHE_SIZE = 1000
+    MATCH_CACHE_MAX_AGE = 60.0
+    MATCH_INDEX_MAX_AGE = 300.0
+
+    # Per-request SQL statistics and `Server-Timing` header, see `instrumentation`.
+    SQL_INSTRUMENTATION = False
+    # In debug mode, warn about requests running more statements than this.
+    SQL_STATEMENT_BUDGET = 20
+    # Warn about statements run this many times in a request, likely N+1 queries.
+    SQL_REPEATED_STATEMENT_THRESHOLD = 5
+
+    # Sampling profiler, see `profiling`. When PROFILE_DIR is set, one request in
+    # PROFILE_SAMPLE_RATE (0 for none) and every request sent with the PROFILE_HEADER
+    # header are profiled, the PROFILE_MAX_FILES most recent profiles of a process are
+    # kept. Outside of debug mode, the header must be set to PROFILE_TOKEN, and is
+    # ignored when it is None.
+    PROFILE_DIR: Optional[str] = None
+    PROFILE_SAMPLE_RATE = 0
+    PROFILE_HEADER = "X-Fyyur-Profile"
+    PROFILE_TOKEN: Optional[str] = None
+    PROFILE_MAX_FILES = 500
+
+    # Prometheus metrics on `/metrics`, see `metrics`. Under a pre-fork server, set
+    # METRICS_DIR to a directory shared by the workers, each worker writes its metrics
+    # there every METRICS_FLUSH_INTERVAL seconds, until it exits.
+    METRICS = False
+    METRICS_DIR: Optional[str] = None
+    METRICS_FLUSH_INTERVAL = 1.0
+
+    # Log the statements running longer than this many seconds with their plan, see
+    # `slow_queries`. None to disable.
+    SLOW_QUERY_THRESHOLD: Optional[float] = None
+
+    # Aggregate the statements by fingerprint and serve the aggregates on
+    # `/query-stats`, the input of `flask fyyur advise-indexes`. See `query_stats`.
+    # Outside of debug mode, `/query-stats` needs an `Authorization: Bearer` header
+    # with QUERY_STATS_TOKEN, and is forbidden when it is None.
+    QUERY_STATS = False
+    QUERY_STATS_TOKEN: Optional[str] = None
+
+    # On SQLite, narrow the substring searches down with an in process n-gram index,
+    # built at startup, see `search`. Postgres uses its trigram indexes. A process
+    # sees the rows inserted by the others within SEARCH_INDEX_REFRESH_INTERVAL, but
+    # the rows they update or delete only once its index is rebuilt, within
+    # SEARCH_INDEX_MAX_AGE: disable it when several processes write to the database.
+    SEARCH_NGRAM_INDEX = True
+    # The in process search indexes look for the rows inserted out of band at most
+    # every SEARCH_INDEX_REFRESH_INTERVAL seconds, and are rebuilt, for the rows
+    # updated or deleted out of band, every SEARCH_INDEX_MAX_AGE seconds.
+    SEARCH_INDEX_REFRESH_INTERVAL = 1.0
+    SEARCH_INDEX_MAX_AGE = 300.0
+    # Build and rebuild the n-gram indexes in a thread of their own rather than in the
+    # startup and the searches, which go without them until first built.
+    SEARCH_INDEX_BUILD_IN_BACKGROUND = True
+
 
 class NormalConfig(Config):
     # Enable debug mode.
@@ -22,3 +93,5 @@ class TestingConfig(Config):
     TEST_DB_PATH = Path(__file__).parent.parent / "tests" / "test.db"
     SQLALCHEMY_DATABASE_URI = "sqlite:///" + str(TEST_DB_PATH)
     WTF_CSRF_ENABLED = False
+    # the tests expect the indexes as of their writes
+    SEARCH_INDEX_BUILD_IN_BACKGROUND = False
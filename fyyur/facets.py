@@ -0,0 +1,133 @@
+from typing import Any, Union
+
+import sqlalchemy as sa
+
+from fyyur.models import Artist, Genre, Venue, artist_genre, db, venue_genre
+from fyyur.schema.facet import BrowseFilters, Facet, FacetValue
+
+FACETS = ("genre", "state", "city", "seeking", "upcoming")
+
+LABELS = {
+    "genre": "Genre",
+    "state": "State",
+    "city": "City",
+    "seeking": {"Venue": "Seeking talent", "Artist": "Seeking a venue"},
+    "upcoming": "Upcoming shows",
+}
+
+
+def seeking_column(model: type[Union[Venue, Artist]]) -> Any:
+    return Venue.seeking_talent if model is Venue else Artist.seeking_venue
+
+
+def filter_conditions(
+    model: type[Union[Venue, Artist]], filters: BrowseFilters
+) -> list[sa.ColumnExpressionArgument[bool]]:
+    conditions: list[sa.ColumnExpressionArgument[bool]] = []
+    if filters.genre is not None:
+        conditions.append(model.with_any_genre([filters.genre]))
+    if filters.state is not None:
+        conditions.append(model.state == filters.state.value)
+    if filters.city is not None:
+        conditions.append(model.city == filters.city)
+    if filters.seeking is not None:
+        conditions.append(seeking_column(model) == filters.seeking)
+    if filters.upcoming is not None:
+        upcoming = model.has_upcoming_shows
+        conditions.append(upcoming if filters.upcoming else ~upcoming)
+    return conditions
+
+
+def facet_counts(
+    model: type[Union[Venue, Artist]], filters: BrowseFilters
+) -> dict[str, dict[Any, int]]:
+    """Count the rows matching `filters` by each value of every facet, in a single
+    statement: GROUPING SETS on PostgreSQL, a UNION ALL of one grouped select per
+    facet elsewhere, both over the filtered rows joined to their genres."""
+    if model is Venue:
+        association, foreign_key = venue_genre, venue_genre.c.venue_id
+    else:
+        association, foreign_key = artist_genre, artist_genre.c.artist_id
+
+    rows = (
+        sa.select(
+            model.id.label("id"),
+            Genre.name.label("genre"),
+            model.state.label("state"),
+            model.city.label("city"),
+            seeking_column(model).label("seeking"),
+            sa.case((model.has_upcoming_shows, True), else_=False).label("upcoming"),
+        )
+        .select_from(model)
+        .outerjoin(association, foreign_key == model.id)
+        .outerjoin(Genre, Genre.id == association.c.genre_id)
+        .where(*filter_conditions(model, filters))
+        .cte("browse")
+    )
+    count = sa.func.count(sa.distinct(rows.c.id))
+
+    counts: dict[str, dict[Any, int]] = {name: {} for name in FACETS}
+    if db.engine.dialect.name == "postgresql":
+        columns = [rows.c[name] for name in FACETS]
+        grouped = sa.select(
+            *columns, *(sa.func.grouping(column) for column in columns), count
+        ).group_by(sa.func.grouping_sets(*columns))
+        for row in db.session.execute(grouped):
+            values, grouping = row[: len(FACETS)], row[len(FACETS) : -1]
+            # each row is grouped by the one facet not aggregated over
+            index = grouping.index(0)
+            if values[index] is not None:
+                counts[FACETS[index]][values[index]] = row[-1]
+    else:
+        union = sa.union_all(
+            *(
+                sa.select(
+                    sa.literal(name).label("facet"),
+                    rows.c[name].label("value"),
+                    count.label("count"),
+                ).group_by(rows.c[name])
+                for name in FACETS
+            )
+        )
+        for name, value, value_count in db.session.execute(union):
+            if value is not None:
+                # booleans come back as integers from the union
+                if name in ("seeking", "upcoming"):
+                    value = bool(value)
+                counts[name][value] = value_count
+
+    return counts
+
+
+def get_facets(model: type[Union[Venue, Artist]], filters: BrowseFilters) -> list[Facet]:
+    """The facets of the listing, each value with its count among the rows matching
+    all of the current filters, linking to the listing with that value toggled."""
+    counts = facet_counts(model, filters)
+    facets: list[Facet] = []
+    for name in FACETS:
+        label = LABELS[name]
+        if isinstance(label, dict):
+            label = label[model.__name__]
+        selected = getattr(filters, name)
+        if selected is not None and not isinstance(selected, (bool, str)):
+            selected = selected.value
+
+        values = [
+            FacetValue(
+                label=facet_value_label(name, value),
+                count=value_count,
+                selected=value == selected,
+                args=filters.query_args(**{name: None if value == selected else value}),
+            )
+            for value, value_count in sorted(
+                counts[name].items(), key=lambda item: (-item[1], str(item[0]))
+            )
+        ]
+        facets.append(Facet(name=name, label=label, values=values))
+    return facets
+
+
+def facet_value_label(name: str, value: Any) -> str:
+    if isinstance(value, bool):
+        return "Yes" if value else "No"
+    return str(value)
@@ -0,0 +1,168 @@
+import threading
+import time
+from collections.abc import Iterable, Mapping
+from types import MappingProxyType
+from typing import Any, Optional, Union
+
+import sqlalchemy as sa
+from flask import Flask, current_app, has_app_context
+from sqlalchemy.orm import Session
+
+from fyyur.metrics import record_cache_access
+from fyyur.models import (
+    Artist,
+    Genre,
+    Venue,
+    artist_genre,
+    db,
+    to_genre_mask,
+    venue_genre,
+)
+from fyyur.schema.genre import GenreEnum
+
+# the association tables whose rows reference the cached ids
+GENRE_TABLES = (venue_genre.name, artist_genre.name)
+
+
+class GenreIds:
+    """Genre -> id map of every `GenreEnum` genre, shared by the whole process.
+
+    The map is immutable: `init_app()` inserts the missing genres and loads all of
+    them at startup, a reload after `invalidate()` or `max_age` seconds replaces it
+    whole.
+    """
+
+    def __init__(self, max_age: float) -> None:
+        self.max_age = max_age
+        self._ids: Optional[Mapping[GenreEnum, int]] = None
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def ids(self) -> Mapping[GenreEnum, int]:
+        ids = self._ids
+        hit = ids is not None and time.monotonic() - self._loaded_at < self.max_age
+        record_cache_access("genre_ids", hit)
+        if ids is not None and hit:
+            return ids
+
+        with self._lock:
+            # unless another thread reloaded it meanwhile
+            if self._ids is ids:
+                self._ids = load_genre_ids()
+                self._loaded_at = time.monotonic()
+            assert self._ids is not None
+            return self._ids
+
+    def load(self) -> None:
+        with self._lock:
+            self._ids = load_genre_ids()
+            self._loaded_at = time.monotonic()
+
+    def get(self, genres: Iterable[GenreEnum]) -> list[int]:
+        ids = self.ids()
+        return [ids[genre] for genre in genres]
+
+    def invalidate(self) -> None:
+        self._ids = None
+
+
+def load_genre_ids() -> Mapping[GenreEnum, int]:
+    """Insert the genres missing from the `Genre` table and read the ids of all of
+    them, in a transaction of their own: the ids outlive the current one."""
+    with db.engine.connect() as connection:
+        names = set(connection.scalars(sa.select(Genre.name)))
+        missing = [genre.value for genre in GenreEnum if genre.value not in names]
+        if missing:
+            try:
+                connection.execute(sa.insert(Genre), [{"name": name} for name in missing])
+                connection.commit()
+            except sa.exc.IntegrityError:
+                # another process inserted them first
+                connection.rollback()
+
+        ids = dict(connection.execute(sa.select(Genre.name, Genre.id)).all())
+        connection.rollback()
+
+    return MappingProxyType({genre: ids[genre.value] for genre in GenreEnum})
+
+
+def init_app(app: Flask) -> None:
+    """Seed the `Genre` table with every `GenreEnum` genre and cache their ids."""
+    cache = GenreIds(app.config["GENRE_IDS_MAX_AGE"])
+    app.extensions["genre_ids"] = cache
+    with app.app_context():
+        try:
+            cache.load()
+        except sa.exc.DBAPIError as error:
+            # e.g. the tables are yet to be created, the first access loads them
+            app.logger.warning("Could not load the genre ids: %s", error)
+
+
+def genre_ids() -> GenreIds:
+    cache: GenreIds = current_app.extensions["genre_ids"]
+    return cache
+
+
+def set_genres(entity: Union[Venue, Artist], genres: list[GenreEnum]) -> None:
+    """Replace the genres of a venue or artist of the session, writing its rows of
+    the association table by genre id instead of loading any `Genre`."""
+    # before writing anything, loading the cache may insert genres
+    ids = genre_ids().get(dict.fromkeys(genres))
+    if isinstance(entity, Venue):
+        table, foreign_key = venue_genre, venue_genre.c.venue_id
+    else:
+        table, foreign_key = artist_genre, artist_genre.c.artist_id
+
+    is_new: bool = sa.inspect(entity).pending
+    entity.genre_mask = to_genre_mask(genres)
+    # a new entity needs its id
+    db.session.flush()
+
+    if not is_new:
+        db.session.execute(sa.delete(table).where(foreign_key == entity.id))
+    if ids:
+        db.session.execute(
+            sa.insert(table),
+            [{foreign_key.name: entity.id, "genre_id": genre_id} for genre_id in ids],
+        )
+    db.session.expire(entity, ["genres"])
+
+
+# The `Genre` rows change behind the cache when written through the ORM (on the
+# commit), or out of band, noticed when an association row references a genre id
+# which doesn't exist anymore.
+
+
+@sa.event.listens_for(Session, "after_flush")
+def record_genre_changes(session: Session, flush_context: Any) -> None:
+    if any(
+        isinstance(instance, Genre)
+        for instance in (*session.new, *session.dirty, *session.deleted)
+    ):
+        session.info["genres_changed"] = True
+
+
+@sa.event.listens_for(Session, "after_commit")
+def invalidate_changed_genres(session: Session) -> None:
+    if session.info.pop("genres_changed", False):
+        invalidate_genre_ids()
+
+
+@sa.event.listens_for(Session, "after_rollback")
+def forget_genre_changes(session: Session) -> None:
+    session.info.pop("genres_changed", None)
+
+
+@sa.event.listens_for(sa.Engine, "handle_error")
+def invalidate_on_missing_genre(context: sa.engine.ExceptionContext) -> None:
+    if isinstance(context.sqlalchemy_exception, sa.exc.IntegrityError) and any(
+        table in (context.statement or "") for table in GENRE_TABLES
+    ):
+        invalidate_genre_ids()
+
+
+def invalidate_genre_ids() -> None:
+    if has_app_context():
+        cache: Optional[GenreIds] = current_app.extensions.get("genre_ids")
+        if cache is not None:
+            cache.invalidate()
@@ -0,0 +1,242 @@
+import csv
+import io
+import json
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+from datetime import datetime
+from itertools import islice
+from typing import IO, Any, Callable, Optional, TypeVar, Union
+
+import sqlalchemy as sa
+from pydantic import ValidationError
+
+from fyyur.genre_cache import GenreIds, genre_ids
+from fyyur.models import (
+    Artist,
+    Venue,
+    artist_genre,
+    db,
+    to_genre_mask,
+    venue_genre,
+)
+from fyyur.schema.artist import ArtistInDb
+from fyyur.schema.genre import GenreEnum
+from fyyur.schema.venue import VenueInDb
+
+T = TypeVar("T")
+
+# separates the genres of a record in CSV input, e.g. `Jazz;Rock n Roll`
+CSV_GENRES_SEPARATOR = ";"
+
+# keep the report readable on large imports
+MAX_REPORTED_ERRORS = 100
+
+
+@dataclass(frozen=True)
+class ImportKind:
+    model: Union[type[Venue], type[Artist]]
+    schema: Union[type[VenueInDb], type[ArtistInDb]]
+    genres_table: sa.Table
+    foreign_key: str
+
+
+IMPORT_KINDS = {
+    "venue": ImportKind(Venue, VenueInDb, venue_genre, "venue_id"),
+    "artist": ImportKind(Artist, ArtistInDb, artist_genre, "artist_id"),
+}
+
+
+@dataclass
+class ImportReport:
+    imported: int = 0
+    rejected: int = 0
+    failed_chunks: int = 0
+    errors: list[str] = field(default_factory=list)
+
+    def add_error(self, error: str) -> None:
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(error)
+
+
+@dataclass(frozen=True)
+class InvalidRecord:
+    """A record of the input which couldn't be read, rejected by the import."""
+
+    error: str
+
+
+def read_records(stream: IO[str], format: str) -> Iterator[Any]:
+    """Lazily read the records of a JSONL or CSV stream. A JSONL line which is not
+    valid JSON reads as an `InvalidRecord`, its value otherwise, not necessarily an
+    object."""
+    if format == "jsonl":
+        for line in stream:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield InvalidRecord(f"invalid JSON: {e}")
+        return
+
+    for row in csv.DictReader(stream):
+        # CSV has no null, treat empty cells as missing values
+        record: dict[str, Any] = {key: value for key, value in row.items() if value}
+        if "genres" in record:
+            record["genres"] = [
+                genre.strip() for genre in record["genres"].split(CSV_GENRES_SEPARATOR)
+            ]
+        yield record
+
+
+def chunked(iterable: Iterable[T], size: int) -> Iterator[list[T]]:
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def import_records(
+    kind: str,
+    records: Iterable[Any],
+    chunk_size: int = 1000,
+    on_progress: Optional[Callable[[ImportReport], None]] = None,
+) -> ImportReport:
+    """Validate `records` as venues or artists and bulk insert them, one transaction
+    per chunk. Records unreadable or failing validation are skipped, a chunk failing
+    to insert is rolled back without stopping the import. Ids in the input are
+    ignored."""
+    import_kind = IMPORT_KINDS[kind]
+    report = ImportReport()
+
+    for chunk_number, chunk in enumerate(chunked(enumerate(records, 1), chunk_size)):
+        valid: list[tuple[dict[str, Any], list[GenreEnum]]] = []
+        for record_number, record in chunk:
+            try:
+                if isinstance(record, InvalidRecord):
+                    raise ValueError(record.error)
+                if not isinstance(record, dict):
+                    raise ValueError(f"not an object: {record!r}")
+                genres = [GenreEnum(genre) for genre in record.get("genres", [])]
+                entity = import_kind.schema.model_validate(
+                    {**record, "id": None, "shows": [], "genres": []}
+                )
+            except (ValidationError, ValueError, TypeError) as e:
+                report.rejected += 1
+                report.add_error(f"record {record_number}: {e}")
+                continue
+            valid.append((entity.model_dump(exclude={"id", "shows", "genres"}), genres))
+
+        try:
+            write_chunk(import_kind, valid, genre_ids())
+            db.session.commit()
+            report.imported += len(valid)
+
+        except sa.exc.SQLAlchemyError as e:
+            db.session.rollback()
+            report.failed_chunks += 1
+            report.add_error(f"chunk {chunk_number + 1}: {e}")
+
+        finally:
+            db.session.close()
+
+        if on_progress is not None:
+            on_progress(report)
+
+    return report
+
+
+def write_chunk(
+    import_kind: ImportKind,
+    entities: list[tuple[dict[str, Any], list[GenreEnum]]],
+    genre_ids: GenreIds,
+) -> list[int]:
+    """Insert the rows of a chunk with their genres, return the ids of the rows."""
+    if not entities:
+        return []
+
+    # before writing anything, loading the cache may insert genres
+    entities_genre_ids = [set(genre_ids.get(genres)) for _, genres in entities]
+
+    now = datetime.now()
+    rows = [
+        {**row, "create_date": now, "genre_mask": to_genre_mask(genres)}
+        for row, genres in entities
+    ]
+    connection = db.session.connection()
+
+    if connection.dialect.name == "postgresql":
+        ids = allocate_ids(connection, import_kind.model.__table__, len(rows))
+        copy_rows(
+            connection,
+            import_kind.model.__table__,
+            [{"id": id, **row} for id, row in zip(ids, rows)],
+        )
+    else:
+        ids = list(
+            db.session.scalars(
+                sa.insert(import_kind.model).returning(
+                    import_kind.model.id, sort_by_parameter_order=True
+                ),
+                rows,
+            )
+        )
+
+    genres_rows = [
+        {import_kind.foreign_key: id, "genre_id": genre_id}
+        for id, row_genre_ids in zip(ids, entities_genre_ids)
+        for genre_id in row_genre_ids
+    ]
+    write_rows(import_kind.genres_table, genres_rows)
+    return ids
+
+
+def write_rows(table: sa.Table, rows: list[dict[str, Any]]) -> None:
+    """Bulk insert rows which do not need their ids back."""
+    if not rows:
+        return
+    connection = db.session.connection()
+    if connection.dialect.name == "postgresql":
+        copy_rows(connection, table, rows)
+    else:
+        db.session.execute(sa.insert(table), rows)
+
+
+def allocate_ids(connection: sa.Connection, table: sa.Table, count: int) -> list[int]:
+    """Reserve `count` ids from the table's sequence so rows can be copied with them."""
+    return list(
+        connection.scalars(
+            sa.select(
+                sa.func.nextval(sa.func.pg_get_serial_sequence(f'"{table.name}"', "id"))
+            ).select_from(sa.func.generate_series(1, count))
+        )
+    )
+
+
+def copy_rows(
+    connection: sa.Connection, table: sa.Table, rows: list[dict[str, Any]]
+) -> None:
+    """Load rows with Postgres `COPY`, which is much faster than INSERT."""
+    columns = list(rows[0])
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(_copy_value(row[column]) for column in columns))
+        buffer.write("\n")
+    buffer.seek(0)
+
+    quoted_columns = ", ".join(f'"{column}"' for column in columns)
+    cursor = connection.connection.dbapi_connection.cursor()  # type: ignore[union-attr]
+    try:
+        cursor.copy_expert(f'COPY "{table.name}" ({quoted_columns}) FROM STDIN', buffer)
+    finally:
+        cursor.close()
+
+
+def _copy_value(value: Any) -> str:
+    if value is None:
+        return "\\N"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
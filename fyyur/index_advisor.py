@@ -0,0 +1,285 @@
+import ast
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Optional
+
+import sqlalchemy as sa
+
+_NAME = r'(?:"(\w+)"|\b([A-Za-z_]\w*))'
+_COLUMN = re.compile(rf"{_NAME}\.{_NAME}")
+_ALIAS = re.compile(rf"{_NAME}\s+AS\s+{_NAME}", re.IGNORECASE)
+# operators a btree index can serve, LIKE is left out as the searches use `%term%`
+_EQUALITY = re.compile(r"\s*(=|\bIN\b|\bIS\b)", re.IGNORECASE)
+_RANGE = re.compile(r"\s*(<=|>=|<|>|\bBETWEEN\b)", re.IGNORECASE)
+_SELECT = re.compile(r"\bSELECT\b", re.IGNORECASE)
+_ORDER_BY = re.compile(r"\bORDER BY\b(.*?)(?:\bLIMIT\b|\bOFFSET\b|\)|$)", re.IGNORECASE)
+_JOIN_AFTER = re.compile(rf"\s*=\s*{_NAME}\.{_NAME}")
+_JOIN_BEFORE = re.compile(rf"{_NAME}\.{_NAME}\s*=$")
+
+
+@dataclass(frozen=True)
+class IndexSuggestion:
+    table: str
+    columns: tuple[str, ...]
+    # DB time of the statements which would use the index, in seconds
+    total_time: float
+    count: int
+    fingerprints: list[str] = field(default_factory=list, compare=False, hash=False)
+
+    @property
+    def name(self) -> str:
+        return f"ix_{self.table}_{'_'.join(self.columns)}"
+
+
+@dataclass(frozen=True)
+class ExistingIndex:
+    table: str
+    columns: tuple[str, ...]
+    unique: bool
+
+
+@dataclass
+class ColumnUsage:
+    equality: list[str] = field(default_factory=list)
+    range: list[str] = field(default_factory=list)
+    order: list[str] = field(default_factory=list)
+
+    def last_column(self) -> Optional[str]:
+        for column in [*self.range, *self.order]:
+            if column not in self.equality:
+                return column
+        return None
+
+    def candidate(self) -> tuple[str, ...]:
+        """Columns of the index serving the usage: the columns compared for equality
+        first, then a range or ordering column."""
+        last_column = self.last_column()
+        columns = list(dict.fromkeys(self.equality))
+        return tuple(columns + ([last_column] if last_column else []))
+
+    def served_by(self, index: ExistingIndex) -> bool:
+        """Whether the leading columns of `index` are the columns compared for
+        equality, in any order, then the range or ordering column. A unique index
+        on columns compared for equality finds at most one row, nothing to order."""
+        if index.unique and set(index.columns) <= set(self.equality):
+            return True
+
+        last_column = self.last_column()
+        remaining = set(self.equality)
+        for column in index.columns:
+            if column in remaining:
+                remaining.remove(column)
+            elif not remaining and column == last_column:
+                return True
+            else:
+                break
+        return not remaining and last_column is None
+
+
+def migration_indexes(versions_dir: Path) -> dict[str, list[ExistingIndex]]:
+    """Column lists of the primary keys, unique constraints and indexes of each table
+    once every migration of `versions_dir` is applied."""
+    # down revision -> revision, upgrade function
+    migrations: dict[Optional[str], tuple[str, list[ast.stmt]]] = {}
+    for path in versions_dir.glob("*.py"):
+        module = ast.parse(path.read_text())
+        values: dict[str, Any] = {
+            target.id: _literal(node.value)
+            for node in module.body
+            if isinstance(node, ast.Assign)
+            for target in node.targets
+            if isinstance(target, ast.Name)
+        }
+        upgrade = [
+            statement
+            for node in module.body
+            if isinstance(node, ast.FunctionDef) and node.name == "upgrade"
+            for statement in node.body
+        ]
+        migrations[values.get("down_revision")] = (values["revision"], upgrade)
+
+    # index name (or table and columns of an unnamed constraint) -> table, columns
+    indexes: dict[str, ExistingIndex] = {}
+    revision: Optional[str] = None
+    while revision in migrations:
+        revision, upgrade = migrations.pop(revision)
+        _apply_operations(upgrade, indexes, table=None)
+
+    tables: dict[str, list[ExistingIndex]] = defaultdict(list)
+    for index in indexes.values():
+        tables[index.table].append(index)
+    return tables
+
+
+def _literal(node: ast.AST) -> Any:
+    try:
+        return ast.literal_eval(node)
+    except (ValueError, TypeError):
+        return None
+
+
+def _apply_operations(
+    body: list[ast.stmt],
+    indexes: dict[str, ExistingIndex],
+    table: Optional[str],
+) -> None:
+    for statement in body:
+        if isinstance(statement, ast.With):
+            call = statement.items[0].context_expr
+            if isinstance(call, ast.Call) and getattr(call.func, "attr", None) == (
+                "batch_alter_table"
+            ):
+                _apply_operations(statement.body, indexes, _literal(call.args[0]))
+            continue
+        if not (
+            isinstance(statement, ast.Expr)
+            and isinstance(statement.value, ast.Call)
+            and isinstance(statement.value.func, ast.Attribute)
+        ):
+            continue
+
+        call = statement.value
+        operation = statement.value.func.attr
+        args = [_literal(arg) for arg in call.args]
+        if operation == "create_table":
+            for arg in call.args[1:]:
+                if isinstance(arg, ast.Call) and getattr(arg.func, "attr", None) in (
+                    "PrimaryKeyConstraint",
+                    "UniqueConstraint",
+                ):
+                    columns = tuple(_literal(column) for column in arg.args)
+                    indexes[f"{args[0]}:{columns}"] = ExistingIndex(
+                        args[0], columns, True
+                    )
+        elif operation == "drop_table":
+            for name, index in list(indexes.items()):
+                if index.table == args[0]:
+                    del indexes[name]
+        elif operation == "create_index":
+            unique = any(
+                keyword.arg == "unique" and _literal(keyword.value) is True
+                for keyword in call.keywords
+            )
+            if table is None:
+                indexes[args[0]] = ExistingIndex(args[1], tuple(args[2]), unique)
+            else:
+                indexes[args[0]] = ExistingIndex(table, tuple(args[1]), unique)
+        elif operation == "create_unique_constraint" and table is not None:
+            columns = tuple(args[1])
+            indexes[args[0] or f"{table}:{columns}"] = ExistingIndex(table, columns, True)
+        elif operation in ("drop_index", "drop_constraint"):
+            indexes.pop(args[0], None)
+
+
+def _aliases(statement: str) -> dict[str, str]:
+    return {
+        match.group(3) or match.group(4): match.group(1) or match.group(2)
+        for match in _ALIAS.finditer(statement)
+    }
+
+
+def _table_column(
+    match: re.Match[str], aliases: dict[str, str], metadata: sa.MetaData
+) -> Optional[tuple[str, str]]:
+    name = match.group(1) or match.group(2)
+    table = aliases.get(name, name)
+    column = match.group(3) or match.group(4)
+    if table not in metadata.tables or column not in metadata.tables[table].c:
+        return None
+    return table, column
+
+
+def column_usages(statement: str, metadata: sa.MetaData) -> list[tuple[str, ColumnUsage]]:
+    """Columns of the tables of `metadata` compared or ordered by in `statement`,
+    for each of its SELECT blocks."""
+    aliases = _aliases(statement)
+    usages: list[tuple[str, ColumnUsage]] = []
+    for block in _SELECT.split(statement):
+        block_usages: dict[str, ColumnUsage] = defaultdict(ColumnUsage)
+        joins: dict[str, list[str]] = defaultdict(list)
+        for match in _COLUMN.finditer(block):
+            table_column = _table_column(match, aliases, metadata)
+            if table_column is None:
+                continue
+            table, column = table_column
+            before = block[: match.start()].rstrip()
+            after = block[match.end() :]
+            # `before` catches the right hand side of the comparisons
+            if _JOIN_AFTER.match(after) or _JOIN_BEFORE.search(before):
+                joins[table].append(column)
+            elif _EQUALITY.match(after) or before.endswith("="):
+                block_usages[table].equality.append(column)
+            elif _RANGE.match(after) or before.endswith(("<", ">")):
+                block_usages[table].range.append(column)
+
+        for order_by in _ORDER_BY.finditer(block):
+            for match in _COLUMN.finditer(order_by.group(1)):
+                table_column = _table_column(match, aliases, metadata)
+                if table_column is not None:
+                    block_usages[table_column[0]].order.append(table_column[1])
+        # a table filtered or ordered by drives the join, its join columns are only
+        # looked up in the other tables
+        for table, columns in joins.items():
+            if table not in block_usages:
+                block_usages[table].equality.extend(columns)
+        usages.extend(block_usages.items())
+    return usages
+
+
+def advise_indexes(
+    query_stats: list[dict[str, Any]],
+    metadata: sa.MetaData,
+    indexes: dict[str, list[ExistingIndex]],
+    top: int = 50,
+) -> list[IndexSuggestion]:
+    """Suggest the indexes missing to the `top` most time consuming fingerprints,
+    the indexes serving the most DB time first."""
+    fingerprints = sorted(query_stats, key=lambda stats: stats["total_time"])[::-1]
+    suggestions: dict[tuple[str, tuple[str, ...]], IndexSuggestion] = {}
+    for stats in fingerprints[:top]:
+        statement = stats["fingerprint"]
+        if statement.lstrip().upper().startswith("INSERT"):
+            continue
+
+        for table, usage in column_usages(statement, metadata):
+            candidate = usage.candidate()
+            if not candidate or any(
+                usage.served_by(index) for index in indexes.get(table, ())
+            ):
+                continue
+
+            key = (table, candidate)
+            previous = suggestions.get(key)
+            suggestions[key] = IndexSuggestion(
+                table,
+                candidate,
+                total_time=stats["total_time"] + (previous.total_time if previous else 0),
+                count=stats["count"] + (previous.count if previous else 0),
+                fingerprints=[*(previous.fingerprints if previous else []), statement],
+            )
+
+    return sorted(suggestions.values(), key=lambda s: s.total_time, reverse=True)
+
+
+def format_suggestions(
+    suggestions: list[IndexSuggestion], query_stats: list[dict[str, Any]]
+) -> str:
+    if not suggestions:
+        return "No missing index found."
+
+    db_time = sum(stats["total_time"] for stats in query_stats) or 1
+    lines = []
+    for suggestion in suggestions:
+        columns = ", ".join(f'"{column}"' for column in suggestion.columns)
+        lines.append(
+            f'CREATE INDEX {suggestion.name} ON "{suggestion.table}" ({columns});'
+        )
+        lines.append(
+            f"  -- up to {suggestion.total_time * 1000:.1f}ms saved "
+            f"({suggestion.total_time / db_time:.0%} of the DB time) over "
+            f"{suggestion.count} executions of:"
+        )
+        lines.extend(f"  --   {statement}" for statement in suggestion.fingerprints)
+    return "\n".join(lines)
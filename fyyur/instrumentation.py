@@ -0,0 +1,191 @@
+import re
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Callable, Optional
+
+import sqlalchemy as sa
+from flask import Flask, Response, g, has_app_context, request, template_rendered
+from flask.signals import before_render_template
+
+from fyyur.models import db
+
+# literal lists such as `IN (?, ?, ?)` are expanded with one parameter per value
+_PARAMETER = r"\s*(?:\?|%s|%\(\w+\)s|:\w+)\s*"
+_PARAMETER_LIST = re.compile(rf"\((?:{_PARAMETER},)+{_PARAMETER}\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def statement_shape(statement: str) -> str:
+    """Normalize a statement so that executions differing only by their parameters
+    have the same shape."""
+    return _WHITESPACE.sub(" ", _PARAMETER_LIST.sub("(?)", statement)).strip()
+
+
+@dataclass
+class RequestStats:
+    start: float = field(default_factory=time.perf_counter)
+    db_time: float = 0
+    render_time: float = 0
+    shapes: Counter[str] = field(default_factory=Counter)
+
+    @property
+    def num_statements(self) -> int:
+        return sum(self.shapes.values())
+
+    def repeated_statements(self, threshold: int) -> list[tuple[str, int]]:
+        """Statement shapes run at least `threshold` times, the signature of N+1
+        queries."""
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+    def server_timing(self) -> str:
+        total = time.perf_counter() - self.start
+        statements = f'desc="{self.num_statements} statements"'
+        return ", ".join(
+            [
+                f"db;dur={self.db_time * 1000:.2f};{statements}",
+                f"render;dur={self.render_time * 1000:.2f}",
+                f"total;dur={total * 1000:.2f}",
+            ]
+        )
+
+
+def current_stats() -> Optional[RequestStats]:
+    """Statistics of the request being handled, None outside of an instrumented
+    request."""
+    if not has_app_context():
+        return None
+    stats: Optional[RequestStats] = g.get("request_stats")
+    return stats
+
+
+@dataclass(frozen=True)
+class ExecutedStatement:
+    connection: sa.Connection
+    cursor: Any
+    statement: str
+    parameters: Any
+    executemany: bool
+    duration: float
+    # the execution context, its `cursor` is the one the result will fetch from
+    context: Any
+
+
+StatementObserver = Callable[[ExecutedStatement], None]
+
+
+def before_cursor_execute(
+    connection: sa.Connection,
+    cursor: Any,
+    statement: str,
+    parameters: Any,
+    context: Any,
+    executemany: bool,
+) -> None:
+    # on the context of the statement rather than the connection, which outlives
+    # the statements failing without an `after_cursor_execute`
+    context._query_start = time.perf_counter()
+
+
+def after_cursor_execute(
+    observers: list[StatementObserver],
+    connection: sa.Connection,
+    cursor: Any,
+    statement: str,
+    parameters: Any,
+    context: Any,
+    executemany: bool,
+) -> None:
+    duration = time.perf_counter() - context._query_start
+    executed = ExecutedStatement(
+        connection, cursor, statement, parameters, executemany, duration, context
+    )
+    for observer in observers:
+        observer(executed)
+
+
+def observe_statements(app: Flask, observer: StatementObserver) -> None:
+    """Call `observer` after each statement run by the engine of `app`, the engine
+    events are only listened to once whatever the number of observers."""
+    observers: Optional[list[StatementObserver]] = app.extensions.get(
+        "statement_observers"
+    )
+    if observers is None:
+        observers = app.extensions["statement_observers"] = []
+        with app.app_context():
+            sa.event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+            sa.event.listen(
+                db.engine,
+                "after_cursor_execute",
+                partial(after_cursor_execute, observers),
+            )
+    observers.append(observer)
+
+
+def record_statement(executed: ExecutedStatement) -> None:
+    stats = current_stats()
+    if stats is not None:
+        stats.db_time += executed.duration
+        stats.shapes[statement_shape(executed.statement)] += 1
+
+
+def before_render(app: Flask, **extra: Any) -> None:
+    g.render_start = time.perf_counter()
+
+
+def after_render(app: Flask, **extra: Any) -> None:
+    stats = current_stats()
+    if stats is not None and "render_start" in g:
+        stats.render_time += time.perf_counter() - g.pop("render_start")
+
+
+def collect_request_stats(app: Flask) -> None:
+    """Collect the `RequestStats` of each request, once per app whichever feature
+    asks for them."""
+    if "request_stats" in app.extensions:
+        return
+    app.extensions["request_stats"] = True
+
+    observe_statements(app, record_statement)
+    before_render_template.connect(before_render, app)
+    template_rendered.connect(after_render, app)
+
+    @app.before_request
+    def start_request_stats() -> None:
+        g.request_stats = RequestStats()
+
+
+def init_app(app: Flask) -> None:
+    """Count statements and DB time of each request, add a `Server-Timing` header to
+    the responses and log the requests running repeated statements or, in debug
+    mode, more statements than `SQL_STATEMENT_BUDGET`."""
+    collect_request_stats(app)
+
+    @app.after_request
+    def report_request_stats(response: Response) -> Response:
+        stats = current_stats()
+        if stats is None:
+            return response
+        response.headers["Server-Timing"] = stats.server_timing()
+
+        for shape, n in stats.repeated_statements(
+            app.config["SQL_REPEATED_STATEMENT_THRESHOLD"]
+        ):
+            app.logger.warning(
+                "%s %s: statement run %d times, possible N+1 query: %s",
+                request.method,
+                request.path,
+                n,
+                shape,
+            )
+        budget = app.config["SQL_STATEMENT_BUDGET"]
+        if app.debug and stats.num_statements > budget:
+            app.logger.warning(
+                "%s %s: %d statements, over the budget of %d",
+                request.method,
+                request.path,
+                stats.num_statements,
+                budget,
+            )
+        return response
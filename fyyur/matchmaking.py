@@ -0,0 +1,374 @@
+import bisect
+import math
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Sequence
+from datetime import date, datetime, timedelta
+from typing import Any, NamedTuple, Optional, Union
+
+import sqlalchemy as sa
+from flask import current_app, has_app_context
+from sqlalchemy.orm import Session
+
+from fyyur.facets import seeking_column
+from fyyur.metrics import record_cache_access
+from fyyur.models import Artist, Show, Venue, db, from_genre_mask
+from fyyur.schema.match import Match, MatchPage
+from fyyur.search import TableIndex
+
+# Score of a counterpart: the Jaccard similarity of the genres, up to 1, plus these
+# for the same state, the same city, and the share of the calendar window free
+# for both sides.
+STATE_WEIGHT = 0.25
+CITY_WEIGHT = 0.25
+CALENDAR_WEIGHT = 0.25
+
+# counterparts ranked by calendar, beyond it ties are broken by the lower id
+MAX_CANDIDATES = 200
+
+# the venues match the artists seeking a venue, the artists the venues seeking talent
+COUNTERPARTS: dict[str, type[Union[Venue, Artist]]] = {"Venue": Artist, "Artist": Venue}
+
+
+class Profile(NamedTuple):
+    genre_mask: int
+    state: str
+    city: str
+
+
+def genre_similarity(mask: int, other: int) -> float:
+    union = mask | other
+    if not union:
+        return 0.0
+    return bin(mask & other).count("1") / bin(union).count("1")
+
+
+class MatchIndex(TableIndex[Profile]):
+    """The seeking venues or artists, grouped by genre mask, then by state and by
+    city, each group a sorted list of ids.
+
+    A match query scores each genre mask once (a few hundred, as the rows have
+    one to three of the 19 genres) instead of each row, then reads ids from the
+    best scoring groups only."""
+
+    def __init__(
+        self,
+        model: type[Union[Venue, Artist]],
+        max_age: float = math.inf,
+        refresh_interval: float = math.inf,
+    ) -> None:
+        super().__init__(max_age, refresh_interval)
+        self.model = model
+        self.models = (model,)
+        self.table: str = model.__tablename__
+        self.profiles: dict[int, Profile] = {}
+        self.by_mask: dict[int, list[int]] = {}
+        self.by_state: dict[int, dict[str, list[int]]] = {}
+        self.by_city: dict[int, dict[tuple[str, str], list[int]]] = {}
+
+    def columns(self, model: type[Union[Venue, Artist]]) -> list[Any]:
+        return [
+            model.id,
+            model.genre_mask,
+            model.state,
+            model.city,
+            seeking_column(model).label("seeking"),
+        ]
+
+    def value(self, table: str, row: Any) -> Optional[Profile]:
+        if not row.seeking:
+            return None
+        return Profile(row.genre_mask, row.state, row.city)
+
+    def clear(self) -> None:
+        self.profiles = {}
+        self.by_mask = {}
+        self.by_state = {}
+        self.by_city = {}
+
+    def load(self, rows: dict[str, Sequence[Any]], rebuild: bool) -> None:
+        if not rebuild:
+            return super().load(rows, rebuild)
+        for row in rows[self.table]:
+            profile = self.value(self.table, row)
+            if profile is not None:
+                self.profiles[row.id] = profile
+                # in the order of the ids
+                for ids in self.groups(profile):
+                    ids.append(row.id)
+
+    def groups(self, profile: Profile) -> tuple[list[int], list[int], list[int]]:
+        mask, state, city = profile
+        return (
+            self.by_mask.setdefault(mask, []),
+            self.by_state.setdefault(mask, {}).setdefault(state, []),
+            self.by_city.setdefault(mask, {}).setdefault((state, city), []),
+        )
+
+    def apply(self, table: str, id: int, profile: Optional[Profile]) -> None:
+        previous = self.profiles.pop(id, None)
+        if previous is not None:
+            for ids in self.groups(previous):
+                i = bisect.bisect_left(ids, id)
+                if i < len(ids) and ids[i] == id:
+                    del ids[i]
+        if profile is not None:
+            self.profiles[id] = profile
+            for ids in self.groups(profile):
+                bisect.insort(ids, id)
+
+    def replace(self, id: int, profile: Optional[Profile]) -> None:
+        """Index `profile` for the row `id` instead of its indexed profile, None for
+        a deleted row or a row not seeking anymore."""
+        self.update(self.table, id, profile)
+
+    def candidates(self, profile: Profile, limit: int) -> list[tuple[float, int]]:
+        """Score and id of the counterparts of `profile` sharing a genre or its state,
+        the best first, before the calendar: every one which could still make the
+        first `limit` with the calendar, up to `MAX_CANDIDATES`."""
+        self.refresh()
+
+        mask, state, city = profile
+        with self.lock:
+            # (score, genre mask, location) of each group
+            tiers: list[tuple[float, int, str]] = []
+            for other, ids in self.by_mask.items():
+                similarity = genre_similarity(mask, other)
+                city_ids = self.by_city[other].get((state, city), [])
+                state_ids = self.by_state[other].get(state, [])
+                if city_ids:
+                    tiers.append((similarity + STATE_WEIGHT + CITY_WEIGHT, other, "city"))
+                if len(state_ids) > len(city_ids):
+                    tiers.append((similarity + STATE_WEIGHT, other, "state"))
+                if similarity and len(ids) > len(state_ids):
+                    tiers.append((similarity, other, "other"))
+            tiers.sort(key=lambda tier: (-tier[0], tier[1], tier[2]))
+
+            candidates: list[tuple[float, int]] = []
+            for score, other, location in tiers:
+                if len(candidates) >= limit and (
+                    score + CALENDAR_WEIGHT < candidates[limit - 1][0]
+                ):
+                    break
+                if location == "city":
+                    ids = self.by_city[other][(state, city)]
+                elif location == "state":
+                    ids = [
+                        id
+                        for id in self.by_state[other][state]
+                        if self.profiles[id].city != city
+                    ]
+                else:
+                    ids = self.by_mask[other]
+                for id in ids:
+                    if len(candidates) >= MAX_CANDIDATES:
+                        return candidates
+                    if location == "other" and self.profiles[id].state == state:
+                        continue
+                    candidates.append((score, id))
+            return candidates
+
+
+class MatchCache:
+    """The match pages of the venues and artists by (table, id, limit), the least recently
+    stored dropped first, each for `max_age` seconds at most."""
+
+    def __init__(self, max_size: int, max_age: float) -> None:
+        self.max_size = max_size
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self.pages: OrderedDict[tuple[str, int, int], tuple[float, MatchPage]] = (
+            OrderedDict()
+        )
+
+    def get(self, key: tuple[str, int, int]) -> Optional[MatchPage]:
+        entry = self.pages.get(key)
+        hit = entry is not None and time.monotonic() - entry[0] < self.max_age
+        record_cache_access("matches", hit)
+        return entry[1] if entry is not None and hit else None
+
+    def put(self, key: tuple[str, int, int], page: MatchPage) -> None:
+        with self.lock:
+            self.pages.pop(key, None)
+            self.pages[key] = (time.monotonic(), page)
+            while len(self.pages) > self.max_size:
+                self.pages.popitem(last=False)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.pages.clear()
+
+
+def match_indexes() -> dict[str, MatchIndex]:
+    indexes: dict[str, MatchIndex] = current_app.extensions.setdefault(
+        "match_indexes",
+        {
+            # the pages are cached: look for the rows inserted out of band on
+            # every query
+            model.__tablename__: MatchIndex(
+                model, current_app.config["MATCH_INDEX_MAX_AGE"], 0.0
+            )
+            for model in (Venue, Artist)
+        },
+    )
+    return indexes
+
+
+def match_cache() -> MatchCache:
+    cache: MatchCache = current_app.extensions.setdefault(
+        "match_cache",
+        MatchCache(
+            current_app.config["MATCH_CACHE_SIZE"],
+            current_app.config["MATCH_CACHE_MAX_AGE"],
+        ),
+    )
+    return cache
+
+
+def find_matches(
+    model: type[Union[Venue, Artist]], id: int, limit: Optional[int] = None
+) -> Optional[MatchPage]:
+    """The counterparts of the venue or artist `id` seeking it, the best first: the
+    seeking artists for a venue, the seeking venues for an artist. None if there is
+    no such venue or artist."""
+    if limit is None:
+        limit = current_app.config["MATCH_LIMIT"]
+    key = (model.__tablename__, id, limit)
+    cache = match_cache()
+    page = cache.get(key)
+    if page is not None:
+        return page
+
+    subject = db.session.execute(
+        sa.select(model.name, model.genre_mask, model.state, model.city).where(
+            model.id == id
+        )
+    ).first()
+    if subject is None:
+        return None
+
+    name, genre_mask, state, city = subject
+    profile = Profile(genre_mask, state, city)
+    counterpart = COUNTERPARTS[model.__tablename__]
+    candidates = match_indexes()[counterpart.__tablename__].candidates(profile, limit)
+
+    days = current_app.config["MATCH_CALENDAR_DAYS"]
+    free_days = shared_free_days(model, id, [id for _, id in candidates], days)
+    scored = sorted(
+        (
+            (score + CALENDAR_WEIGHT * free_days[candidate] / days, candidate)
+            for score, candidate in candidates
+        ),
+        key=lambda match: (-match[0], match[1]),
+    )[:limit]
+
+    rows = {
+        row.id: row
+        for row in db.session.execute(
+            sa.select(
+                counterpart.id,
+                counterpart.name,
+                counterpart.city,
+                counterpart.state,
+                counterpart.genre_mask,
+            ).where(counterpart.id.in_([candidate for _, candidate in scored]))
+        )
+    }
+    page = MatchPage(
+        id=id,
+        name=name,
+        calendar_days=days,
+        matches=[
+            Match(
+                id=candidate,
+                name=rows[candidate].name,
+                city=rows[candidate].city,
+                state=rows[candidate].state,
+                shared_genres=from_genre_mask(genre_mask & rows[candidate].genre_mask),
+                free_days=free_days[candidate],
+                score=round(score, 3),
+            )
+            for score, candidate in scored
+            if candidate in rows
+        ],
+    )
+    cache.put(key, page)
+    return page
+
+
+def shared_free_days(
+    model: type[Union[Venue, Artist]], id: int, counterparts: list[int], days: int
+) -> dict[int, int]:
+    """Number of the next `days` days on which neither the venue or artist `id` nor
+    each of its `counterparts` has a show, in a single statement."""
+    if model is Venue:
+        own, other = Show.venue_id, Show.artist_id
+    else:
+        own, other = Show.artist_id, Show.venue_id
+    today = date.today()
+    start = datetime.combine(today, datetime.min.time())
+
+    busy: dict[Optional[int], set[date]] = {None: set()}
+    shows = db.session.execute(
+        sa.select(own, other, Show.start_time).where(
+            sa.or_(own == id, other.in_(counterparts)),
+            Show.start_time >= start,
+            Show.start_time < start + timedelta(days=days),
+        )
+    )
+    for own_id, other_id, start_time in shows:
+        # the own shows keep the counterparts busy too
+        busy.setdefault(None if own_id == id else other_id, set()).add(start_time.date())
+
+    return {
+        counterpart: days - len(busy[None] | busy.get(counterpart, set()))
+        for counterpart in counterparts
+    }
+
+
+# The match indexes follow the rows written through the ORM, like the search
+# indexes, and the rows written out of band through `TableIndex`: the changes of
+# a flush are applied to them on the commit, and drop the cached match pages, as
+# do the shows changing the calendars.
+
+
+@sa.event.listens_for(Session, "after_flush")
+def record_match_changes(session: Session, flush_context: Any) -> None:
+    changes = session.info.setdefault("match_index_changes", {})
+    for instance in [*session.new, *session.dirty, *session.deleted]:
+        if isinstance(instance, Show):
+            session.info["match_shows_changed"] = True
+        if not isinstance(instance, (Venue, Artist)):
+            continue
+        seeking = getattr(instance, seeking_column(type(instance)).key)
+        changes[(instance.__tablename__, instance.id)] = (
+            Profile(instance.genre_mask or 0, instance.state, instance.city)
+            if seeking and instance not in session.deleted
+            else None
+        )
+
+
+@sa.event.listens_for(Session, "after_commit")
+def apply_match_changes(session: Session) -> None:
+    changes: dict[tuple[str, int], Optional[Profile]] = session.info.pop(
+        "match_index_changes", {}
+    )
+    shows_changed = session.info.pop("match_shows_changed", False)
+    if not (changes or shows_changed) or not has_app_context():
+        return
+
+    indexes: dict[str, MatchIndex] = current_app.extensions.get("match_indexes", {})
+    for (table, id), profile in changes.items():
+        index = indexes.get(table)
+        if index is not None:
+            index.replace(id, profile)
+    cache: Optional[MatchCache] = current_app.extensions.get("match_cache")
+    if cache is not None:
+        cache.clear()
+
+
+@sa.event.listens_for(Session, "after_rollback")
+def forget_match_changes(session: Session) -> None:
+    session.info.pop("match_index_changes", None)
+    session.info.pop("match_shows_changed", None)
@@ -0,0 +1,286 @@
+import atexit
+import json
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Optional
+
+import sqlalchemy as sa
+from flask import Flask, Response, current_app, has_app_context, request
+
+from fyyur.instrumentation import collect_request_stats, current_stats
+from fyyur.models import db
+
+Labels = tuple[tuple[str, str], ...]
+Sample = tuple[str, Labels]
+
+# seconds, as the Prometheus client libraries
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+COUNTERS = {
+    "fyyur_requests_total": "Requests by endpoint, method and status code.",
+    "fyyur_cache_hits_total": "Cache hits by cache.",
+    "fyyur_cache_misses_total": "Cache misses by cache.",
+}
+HISTOGRAMS = {
+    "fyyur_request_duration_seconds": "Request latency by endpoint.",
+    "fyyur_db_duration_seconds": "Time spent running SQL statements per request.",
+    "fyyur_render_duration_seconds": "Time spent rendering templates per request.",
+}
+GAUGES = {
+    "fyyur_db_pool_checked_out": "Connections checked out of the pool.",
+    "fyyur_db_pool_overflow": "Connections opened over the pool size.",
+}
+
+
+class MetricsRegistry:
+    """Metrics of one process. With a `directory`, the process periodically writes
+    its metrics to its own file there, and `render` merges the files of the running
+    processes. The file of a process is removed when it exits, or when found by
+    `render` if it exited without cleaning up: a restarted worker starts over, as
+    counters of a Prometheus client do."""
+
+    def __init__(
+        self, engine: sa.Engine, directory: Optional[str], flush_interval: float
+    ) -> None:
+        self.engine = engine
+        self.directory = Path(directory) if directory else None
+        self.flush_interval = flush_interval
+        self.reset()
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            atexit.register(self.remove)
+            # a pre-fork server may create the app before forking its workers, the
+            # metrics of the parent stay in the file of the parent
+            os.register_at_fork(after_in_child=self.reset)
+
+    def reset(self) -> None:
+        self.lock = threading.Lock()
+        self.counters: defaultdict[Sample, float] = defaultdict(float)
+        # one count per bucket then +Inf, then the sum of the observations
+        self.histograms: dict[Sample, list[float]] = {}
+        self.gauges: dict[Sample, float] = {}
+        self.last_flush = 0.0
+        self.path = (
+            self.directory / f"{os.getpid()}-{time.time_ns()}.json"
+            if self.directory is not None
+            else None
+        )
+
+    def inc(self, name: str, labels: Labels, value: float = 1) -> None:
+        with self.lock:
+            self.counters[(name, labels)] += value
+
+    def observe(self, name: str, labels: Labels, value: float) -> None:
+        with self.lock:
+            histogram = self.histograms.setdefault(
+                (name, labels), [0.0] * (len(BUCKETS) + 2)
+            )
+            histogram[bisect_left(BUCKETS, value)] += 1
+            histogram[-1] += value
+
+    def update_gauges(self) -> None:
+        pool = self.engine.pool
+        # pools without a size limit, as SQLite's in memory ones, have no overflow
+        if isinstance(pool, sa.QueuePool):
+            with self.lock:
+                self.gauges[("fyyur_db_pool_checked_out", ())] = pool.checkedout()
+                self.gauges[("fyyur_db_pool_overflow", ())] = max(pool.overflow(), 0)
+
+    def snapshot(self) -> dict[str, Any]:
+        with self.lock:
+            return {
+                "pid": os.getpid(),
+                "counters": [[*sample, value] for sample, value in self.counters.items()],
+                "histograms": [
+                    [*sample, list(values)] for sample, values in self.histograms.items()
+                ],
+                "gauges": [[*sample, value] for sample, value in self.gauges.items()],
+            }
+
+    def flush(self, force: bool = True) -> None:
+        if self.path is None:
+            return
+        now = time.monotonic()
+        if not force and now - self.last_flush < self.flush_interval:
+            return
+        self.last_flush = now
+        self.update_gauges()
+
+        # readers never see a partially written file
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self.snapshot()))
+        os.replace(tmp_path, self.path)
+
+    def remove(self) -> None:
+        if self.path is not None:
+            self.path.unlink(missing_ok=True)
+
+    def snapshots(self) -> list[dict[str, Any]]:
+        if self.directory is None:
+            self.update_gauges()
+            return [self.snapshot()]
+
+        self.flush()
+        snapshots = []
+        for path in self.directory.glob("*.json"):
+            try:
+                snapshot = json.loads(path.read_text())
+            except (OSError, ValueError):
+                # the process exited and its file got cleaned up meanwhile
+                continue
+            if is_alive(snapshot["pid"]):
+                snapshots.append(snapshot)
+            else:
+                path.unlink(missing_ok=True)
+        return snapshots
+
+    def render(self) -> str:
+        counters: defaultdict[Sample, float] = defaultdict(float)
+        histograms: dict[Sample, list[float]] = {}
+        gauges: defaultdict[Sample, float] = defaultdict(float)
+        for snapshot in self.snapshots():
+            for name, labels, value in snapshot["counters"]:
+                counters[(name, to_labels(labels))] += value
+            for name, labels, values in snapshot["histograms"]:
+                total = histograms.setdefault(
+                    (name, to_labels(labels)), [0.0] * len(values)
+                )
+                for i, value in enumerate(values):
+                    total[i] += value
+            for name, labels, value in snapshot["gauges"]:
+                gauges[(name, to_labels(labels))] += value
+
+        lines: list[str] = []
+        for name, help in COUNTERS.items():
+            add_header(lines, name, "counter", help)
+            for (sample_name, labels), value in sorted(counters.items()):
+                if sample_name == name:
+                    lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+
+        for name, help in HISTOGRAMS.items():
+            add_header(lines, name, "histogram", help)
+            for (sample_name, labels), values in sorted(histograms.items()):
+                if sample_name != name:
+                    continue
+                cumulative = 0.0
+                for bound, count in zip([*BUCKETS, math.inf], values):
+                    cumulative += count
+                    bucket_labels = (*labels, ("le", format_value(bound)))
+                    lines.append(
+                        f"{name}_bucket{format_labels(bucket_labels)} "
+                        f"{format_value(cumulative)}"
+                    )
+                lines.append(f"{name}_sum{format_labels(labels)} {values[-1]!r}")
+                lines.append(
+                    f"{name}_count{format_labels(labels)} {format_value(cumulative)}"
+                )
+
+        for name, help in GAUGES.items():
+            add_header(lines, name, "gauge", help)
+            for (sample_name, labels), value in sorted(gauges.items()):
+                if sample_name == name:
+                    lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+
+        add_header(lines, "fyyur_cache_hit_ratio", "gauge", "Cache hits over accesses.")
+        for (name, labels), hits in sorted(counters.items()):
+            if name == "fyyur_cache_hits_total":
+                misses = counters.get(("fyyur_cache_misses_total", labels), 0)
+                lines.append(
+                    f"fyyur_cache_hit_ratio{format_labels(labels)} "
+                    f"{format_value(hits / (hits + misses))}"
+                )
+        for (name, labels), misses in sorted(counters.items()):
+            if name == "fyyur_cache_misses_total" and (
+                ("fyyur_cache_hits_total", labels) not in counters
+            ):
+                lines.append(f"fyyur_cache_hit_ratio{format_labels(labels)} 0")
+
+        return "\n".join(lines) + "\n"
+
+
+def to_labels(labels: list[list[str]]) -> Labels:
+    return tuple((key, value) for key, value in labels)
+
+
+def is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def add_header(lines: list[str], name: str, type: str, help: str) -> None:
+    lines.append(f"# HELP {name} {help}")
+    lines.append(f"# TYPE {name} {type}")
+
+
+def format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (key, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in labels
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+def format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def record_cache_access(cache: str, hit: bool) -> None:
+    """Count a hit or a miss of `cache`, for the hit ratio on `/metrics`."""
+    if not has_app_context():
+        return
+    registry: Optional[MetricsRegistry] = current_app.extensions.get("metrics")
+    if registry is not None:
+        name = "fyyur_cache_hits_total" if hit else "fyyur_cache_misses_total"
+        registry.inc(name, (("cache", cache),))
+
+
+def init_app(app: Flask) -> None:
+    """Record the latency, DB time and render time of each request and serve them
+    in the Prometheus text format on `/metrics`."""
+    collect_request_stats(app)
+    with app.app_context():
+        registry = MetricsRegistry(
+            db.engine, app.config["METRICS_DIR"], app.config["METRICS_FLUSH_INTERVAL"]
+        )
+    app.extensions["metrics"] = registry
+
+    @app.after_request
+    def record_request(response: Response) -> Response:
+        stats = current_stats()
+        if stats is None:
+            return response
+
+        endpoint = request.url_rule.endpoint if request.url_rule else "unknown"
+        labels: Labels = (("endpoint", endpoint), ("method", request.method))
+        registry.inc(
+            "fyyur_requests_total", (*labels, ("status", str(response.status_code)))
+        )
+        registry.observe(
+            "fyyur_request_duration_seconds", labels, time.perf_counter() - stats.start
+        )
+        registry.observe("fyyur_db_duration_seconds", labels, stats.db_time)
+        registry.observe("fyyur_render_duration_seconds", labels, stats.render_time)
+        registry.flush(force=False)
+        return response
+
+    @app.route("/metrics")
+    def metrics() -> Response:
+        return Response(
+            registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+        )
@@ -1,13 +1,22 @@
 from __future__ import annotations
 
+import sqlite3
 from datetime import datetime
+from typing import Any, Iterable, Optional, Union
 
 import sqlalchemy as sa
 from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.ext.hybrid import hybrid_property
-from sqlalchemy.orm import Mapped, mapped_column, relationship
-from typing_extensions import Self
+from sqlalchemy.orm import (
+    Mapped,
+    WriteOnlyMapped,
+    mapped_column,
+    query_expression,
+    relationship,
+    with_expression,
+)
+from sqlalchemy.orm.interfaces import LoaderOption
 
 from fyyur.schema.artist import (
     ArtistBase,
@@ -36,6 +45,8 @@ venue_genre = db.Table(
     "venue_genres",
     db.Column("venue_id", sa.Integer, sa.ForeignKey("Venue.id"), primary_key=True),
     db.Column("genre_id", sa.Integer, sa.ForeignKey("Genre.id"), primary_key=True),
+    # the primary key covers venue -> genres, this one covers genre -> venues
+    sa.Index("ix_venue_genres_genre_id_venue_id", "genre_id", "venue_id"),
 )
 
 
@@ -43,9 +54,36 @@ artist_genre = db.Table(
     "artist_genres",
     db.Column("artist_id", sa.Integer, sa.ForeignKey("Artist.id"), primary_key=True),
     db.Column("genre_id", sa.Integer, sa.ForeignKey("Genre.id"), primary_key=True),
+    # the primary key covers artist -> genres, this one covers genre -> artists
+    sa.Index("ix_artist_genres_genre_id_artist_id", "genre_id", "artist_id"),
 )
 
 
+# one bit of `genre_mask` per genre, in the order of `GenreEnum`
+GENRE_BITS = {genre: 1 << bit for bit, genre in enumerate(GenreEnum)}
+
+
+def to_genre_mask(genres: Iterable[GenreEnum]) -> int:
+    mask = 0
+    for genre in genres:
+        mask |= GENRE_BITS[genre]
+    return mask
+
+
+def from_genre_mask(mask: int) -> list[GenreEnum]:
+    return [genre for genre, bit in GENRE_BITS.items() if mask & bit]
+
+
+def count_shows(*criteria: sa.ColumnElement[bool]) -> sa.ScalarSelect[int]:
+    """Correlated subquery counting the shows matching `criteria`."""
+    return (
+        sa.select(sa.func.count(Show.id))
+        .where(*criteria)
+        .correlate_except(Show)
+        .scalar_subquery()
+    )
+
+
 class Venue(db.Model):  # type: ignore
     __tablename__ = "Venue"
 
@@ -70,24 +108,83 @@ class Venue(db.Model):  # type: ignore
         back_populates="venue", lazy=True, cascade="all, delete-orphan"
     )
 
-    genres: Mapped[list["Genre"]] = relationship(secondary=venue_genre, lazy="subquery")
+    genres: Mapped[list["Genre"]] = relationship(secondary=venue_genre, lazy="select")
+    # the `GENRE_BITS` of the genres, updated as `genres` changes
+    genre_mask: Mapped[int] = mapped_column(default=0, server_default="0")
 
-    @hybrid_property
+    # only loaded with `Venue.with_show_counts()`, None otherwise
+    num_upcoming_shows: Mapped[Optional[int]] = query_expression()
+    num_past_shows: Mapped[Optional[int]] = query_expression()
+
+    @classmethod
+    def with_show_counts(cls, now: Optional[datetime] = None) -> list[LoaderOption]:
+        """Query options loading the upcoming and past show counts of each venue
+        in the same statement, instead of loading all of its shows."""
+        if now is None:
+            now = datetime.now()
+        return [
+            with_expression(
+                cls.num_upcoming_shows,
+                count_shows(Show.venue_id == cls.id, Show.start_time >= now),
+            ),
+            with_expression(
+                cls.num_past_shows,
+                count_shows(Show.venue_id == cls.id, Show.start_time < now),
+            ),
+        ]
+
+    @property
     def upcoming_shows(self) -> list["Show"]:
         return [show for show in self.shows if show.is_future]
 
     @hybrid_property
+    def has_upcoming_shows(self) -> bool:
+        return any(show.is_future for show in self.shows)
+
+    @has_upcoming_shows.inplace.expression
+    @classmethod
+    def _has_upcoming_shows_expression(cls) -> sa.ColumnElement[bool]:
+        return sa.exists().where(
+            Show.venue_id == cls.id, Show.start_time >= datetime.now()
+        )
+
+    @property
     def past_shows(self) -> list["Show"]:
         return [show for show in self.shows if show.is_past]
 
-    @property
+    @hybrid_property
+    def has_past_shows(self) -> bool:
+        return any(show.is_past for show in self.shows)
+
+    @has_past_shows.inplace.expression
+    @classmethod
+    def _has_past_shows_expression(cls) -> sa.ColumnElement[bool]:
+        return sa.exists().where(
+            Show.venue_id == cls.id, Show.start_time < datetime.now()
+        )
+
+    @hybrid_property
     def upcoming_shows_count(self) -> int:
+        if self.num_upcoming_shows is not None:
+            return self.num_upcoming_shows
         return len(self.upcoming_shows)
 
-    @property
+    @upcoming_shows_count.inplace.expression
+    @classmethod
+    def _upcoming_shows_count_expression(cls) -> sa.ColumnElement[int]:
+        return count_shows(Show.venue_id == cls.id, Show.start_time >= datetime.now())
+
+    @hybrid_property
     def past_shows_count(self) -> int:
+        if self.num_past_shows is not None:
+            return self.num_past_shows
         return len(self.past_shows)
 
+    @past_shows_count.inplace.expression
+    @classmethod
+    def _past_shows_count_expression(cls) -> sa.ColumnElement[int]:
+        return count_shows(Show.venue_id == cls.id, Show.start_time < datetime.now())
+
     @property
     def venue_response(self) -> VenueResponse:
         return VenueResponse(
@@ -98,12 +195,18 @@ class Venue(db.Model):  # type: ignore
     def venue_info(self) -> VenueInfo:
         return VenueInfo.model_validate(self)
 
+    @classmethod
+    def with_any_genre(cls, genres: Iterable[GenreEnum]) -> sa.ColumnElement[bool]:
+        """The venues with any of `genres`, without joining the genre tables."""
+        return cls.genre_mask.op("&")(to_genre_mask(genres)) != 0
+
+    @property
+    def genre_enums(self) -> list[GenreEnum]:
+        return from_genre_mask(self.genre_mask or 0)
+
     @property
     def venue_in_form(self) -> VenueInForm:
-        genres = [genre.genre_base for genre in self.genres]
-        return VenueInForm(
-            **self.venue_info.model_dump(), genres=[genre.name for genre in genres]
-        )
+        return VenueInForm(**self.venue_info.model_dump(), genres=self.genre_enums)
 
     @property
     def venue_info_response(self) -> VenueInfoResponse:
@@ -141,25 +244,84 @@ class Artist(db.Model):  # type: ignore
     )
 
     genres: Mapped[list["Genre"]] = relationship(
-        secondary=artist_genre, lazy="subquery", cascade="all, delete"
+        secondary=artist_genre, lazy="select", cascade="all, delete"
     )
+    # the `GENRE_BITS` of the genres, updated as `genres` changes
+    genre_mask: Mapped[int] = mapped_column(default=0, server_default="0")
 
-    @hybrid_property
+    # only loaded with `Artist.with_show_counts()`, None otherwise
+    num_upcoming_shows: Mapped[Optional[int]] = query_expression()
+    num_past_shows: Mapped[Optional[int]] = query_expression()
+
+    @classmethod
+    def with_show_counts(cls, now: Optional[datetime] = None) -> list[LoaderOption]:
+        """Query options loading the upcoming and past show counts of each artist
+        in the same statement, instead of loading all of its shows."""
+        if now is None:
+            now = datetime.now()
+        return [
+            with_expression(
+                cls.num_upcoming_shows,
+                count_shows(Show.artist_id == cls.id, Show.start_time >= now),
+            ),
+            with_expression(
+                cls.num_past_shows,
+                count_shows(Show.artist_id == cls.id, Show.start_time < now),
+            ),
+        ]
+
+    @property
     def upcoming_shows(self) -> list["Show"]:
         return [show for show in self.shows if show.is_future]
 
     @hybrid_property
+    def has_upcoming_shows(self) -> bool:
+        return any(show.is_future for show in self.shows)
+
+    @has_upcoming_shows.inplace.expression
+    @classmethod
+    def _has_upcoming_shows_expression(cls) -> sa.ColumnElement[bool]:
+        return sa.exists().where(
+            Show.artist_id == cls.id, Show.start_time >= datetime.now()
+        )
+
+    @property
     def past_shows(self) -> list["Show"]:
         return [show for show in self.shows if show.is_past]
 
-    @property
+    @hybrid_property
+    def has_past_shows(self) -> bool:
+        return any(show.is_past for show in self.shows)
+
+    @has_past_shows.inplace.expression
+    @classmethod
+    def _has_past_shows_expression(cls) -> sa.ColumnElement[bool]:
+        return sa.exists().where(
+            Show.artist_id == cls.id, Show.start_time < datetime.now()
+        )
+
+    @hybrid_property
     def upcoming_shows_count(self) -> int:
+        if self.num_upcoming_shows is not None:
+            return self.num_upcoming_shows
         return len(self.upcoming_shows)
 
-    @property
+    @upcoming_shows_count.inplace.expression
+    @classmethod
+    def _upcoming_shows_count_expression(cls) -> sa.ColumnElement[int]:
+        return count_shows(Show.artist_id == cls.id, Show.start_time >= datetime.now())
+
+    @hybrid_property
     def past_shows_count(self) -> int:
+        if self.num_past_shows is not None:
+            return self.num_past_shows
         return len(self.past_shows)
 
+    @past_shows_count.inplace.expression
+    @classmethod
+    def _past_shows_count_expression(cls) -> sa.ColumnElement[int]:
+        return count_shows(Show.artist_id == cls.id, Show.start_time < datetime.now())
+
     @property
     def artist_base(self) -> ArtistBase:
         return ArtistBase.model_validate(self)
@@ -179,12 +341,18 @@ class Artist(db.Model):  # type: ignore
     def artist_info(self) -> ArtistInfo:
         return ArtistInfo.model_validate(self)
 
+    @classmethod
+    def with_any_genre(cls, genres: Iterable[GenreEnum]) -> sa.ColumnElement[bool]:
+        """The artists with any of `genres`, without joining the genre tables."""
+        return cls.genre_mask.op("&")(to_genre_mask(genres)) != 0
+
+    @property
+    def genre_enums(self) -> list[GenreEnum]:
+        return from_genre_mask(self.genre_mask or 0)
+
     @property
     def artist_in_form(self) -> ArtistInForm:
-        genres = [genre.genre_base for genre in self.genres]
-        return ArtistInForm(
-            **self.artist_info.model_dump(), genres=[genre.name for genre in genres]
-        )
+        return ArtistInForm(**self.artist_info.model_dump(), genres=self.genre_enums)
 
     @property
     def artist_info_response(self) -> ArtistInfoResponse:
@@ -208,34 +376,43 @@ class Genre(db.Model):  # type: ignore
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(unique=True)
 
-    artists: Mapped[list["Artist"]] = relationship(
-        secondary=artist_genre, lazy="subquery", viewonly=True
+    # never loaded as a whole, page through `.select()` instead
+    artists: WriteOnlyMapped["Artist"] = relationship(
+        secondary=artist_genre, viewonly=True
     )
 
-    venues: Mapped[list["Venue"]] = relationship(
-        secondary=venue_genre, lazy="subquery", viewonly=True
-    )
+    venues: WriteOnlyMapped["Venue"] = relationship(secondary=venue_genre, viewonly=True)
 
     @property
     def genre_base(self) -> GenreBase:
         return GenreBase.model_validate(self)
 
-    @classmethod
-    def genres_in_and_out_db(cls, genres: list[GenreEnum]) -> list[Self]:
-        genres_in_db: list[Self] = cls.query.filter(
-            cls.name.in_(genre.value for genre in genres)
-        ).all()
-        genres_in_db_names = {genre.name for genre in genres_in_db}
-        genres_out_db = [
-            GenreBase(name=genre).to_orm(Genre)
-            for genre in genres
-            if genre.value not in genres_in_db_names
-        ]
-        return genres_in_db + genres_out_db
+
+def add_genre_bit(target: Union[Venue, Artist], genre: Genre, initiator: Any) -> None:
+    target.genre_mask = (target.genre_mask or 0) | GENRE_BITS[GenreEnum(genre.name)]
+
+
+def remove_genre_bit(target: Union[Venue, Artist], genre: Genre, initiator: Any) -> None:
+    target.genre_mask = (target.genre_mask or 0) & ~GENRE_BITS[GenreEnum(genre.name)]
+
+
+# keep the mask in sync when the genres are assigned through the relationship, which
+# appends the new ones and removes the others. The app writes them by id instead,
+# with `genre_cache.set_genres`, setting the mask itself.
+for model in (Venue, Artist):
+    sa.event.listen(model.genres, "append", add_genre_bit)
+    sa.event.listen(model.genres, "remove", remove_genre_bit)
 
 
 class Show(db.Model):  # type: ignore
     __tablename__ = "Show"
+    __table_args__ = (
+        # shows of a venue / an artist within a time range
+        sa.Index("ix_Show_venue_id_start_time", "venue_id", "start_time"),
+        sa.Index("ix_Show_artist_id_start_time", "artist_id", "start_time"),
+        # keyset pagination of the shows page
+        sa.Index("ix_Show_start_time_id", "start_time", "id"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     artist_id: Mapped[int] = mapped_column(sa.ForeignKey("Artist.id"))
@@ -289,3 +466,200 @@ class Show(db.Model):  # type: ignore
             artist_image_link=self.artist.image_link,
             start_time=self.start_time,
         )
+
+
+# Two shows of the same venue, or of the same artist, can't start within a minute of
+# each other. Postgres enforces it with exclusion constraints over a +/- 30 seconds
+# range around `start_time`, SQLite with triggers doing the equivalent lookup.
+SHOW_OVERLAP_CONSTRAINTS = ("show_venue_overlap", "show_artist_overlap")
+
+SHOW_OVERLAP_POSTGRESQL = [
+    "CREATE EXTENSION IF NOT EXISTS btree_gist",
+    *(f"""ALTER TABLE "Show" ADD CONSTRAINT show_{owner}_overlap EXCLUDE USING gist (
+            {owner}_id WITH =,
+            tsrange(
+                start_time - interval '30 seconds',
+                start_time + interval '30 seconds',
+                '[]'
+            ) WITH &&
+        )""" for owner in ("venue", "artist")),
+]
+
+SHOW_OVERLAP_SQLITE = [
+    f"""CREATE TRIGGER show_{owner}_overlap_{event.split()[0].lower()}
+        BEFORE {event} ON "Show"
+        WHEN EXISTS (
+            SELECT 1 FROM "Show"
+            WHERE {owner}_id = NEW.{owner}_id
+            AND start_time BETWEEN datetime(NEW.start_time, '-61 seconds')
+                AND datetime(NEW.start_time, '+61 seconds')
+            AND abs(julianday(start_time) - julianday(NEW.start_time)) * 86400 <= 60.001
+            {"AND id != NEW.id" if event.startswith("UPDATE") else ""}
+        )
+        BEGIN
+            SELECT RAISE(ABORT, 'show_{owner}_overlap');
+        END"""
+    for owner in ("venue", "artist")
+    for event in ("INSERT", "UPDATE OF venue_id, artist_id, start_time")
+]
+
+for statement in SHOW_OVERLAP_POSTGRESQL:
+    sa.event.listen(
+        Show.__table__,
+        "after_create",
+        sa.DDL(statement).execute_if(dialect="postgresql"),  # type: ignore[no-untyped-call]
+    )
+for statement in SHOW_OVERLAP_SQLITE:
+    sa.event.listen(
+        Show.__table__,
+        "after_create",
+        sa.DDL(statement).execute_if(dialect="sqlite"),  # type: ignore[no-untyped-call]
+    )
+
+
+# Search documents: the fields of each searchable table, and the columns concatenated
+# into each field.
+#
+# For full-text search, Postgres keeps a generated `search_vector` column with a GIN
+# index, the fields weighted in this order. SQLite keeps an FTS5 table named
+# `{table}_search`, with the id of the row as rowid, in sync with triggers.
+#
+# For substring search, Postgres keeps a trigram GIN index per field. SQLite has no
+# equivalent, `fyyur.search` keeps an n-gram index in process instead.
+SEARCH_DOCUMENTS: dict[str, dict[str, tuple[str, ...]]] = {
+    "Venue": {"name": ("name",), "location": ("city", "state")},
+    "Artist": {"name": ("name",)},
+}
+FULL_TEXT_WEIGHTS = ("A", "B", "C", "D")
+
+
+def full_text_table(table: str) -> str:
+    return f"{table.lower()}_search"
+
+
+def search_field(columns: tuple[str, ...], row: str = "") -> str:
+    return " || ', ' || ".join(f"{row}{column}" for column in columns)
+
+
+def full_text_postgresql(table: str) -> list[str]:
+    vector = " || ".join(
+        f"setweight(to_tsvector('simple', {search_field(columns)}), '{weight}')"
+        for columns, weight in zip(SEARCH_DOCUMENTS[table].values(), FULL_TEXT_WEIGHTS)
+    )
+    return [
+        f"""ALTER TABLE "{table}" ADD COLUMN search_vector tsvector
+            GENERATED ALWAYS AS ({vector}) STORED""",
+        f"""CREATE INDEX ix_{table}_search_vector ON "{table}"
+            USING gin (search_vector)""",
+    ]
+
+
+def trigram_postgresql(table: str) -> list[str]:
+    return [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        *(
+            f"""CREATE INDEX ix_{table}_{name}_trgm ON "{table}"
+            USING gin (({search_field(columns)}) gin_trgm_ops)"""
+            for name, columns in SEARCH_DOCUMENTS[table].items()
+        ),
+    ]
+
+
+def full_text_sqlite(table: str) -> list[str]:
+    fields = SEARCH_DOCUMENTS[table]
+    search_table = full_text_table(table)
+    names = ", ".join(fields)
+    values = ", ".join(search_field(columns, "NEW.") for columns in fields.values())
+    assignments = ", ".join(
+        f"{name} = {search_field(columns, 'NEW.')}" for name, columns in fields.items()
+    )
+    columns = ", ".join(column for columns in fields.values() for column in columns)
+    return [
+        f"""CREATE VIRTUAL TABLE {search_table} USING fts5(
+            {names}, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+        )""",
+        f"""CREATE TRIGGER {search_table}_insert AFTER INSERT ON "{table}"
+        BEGIN
+            INSERT INTO {search_table} (rowid, {names}) VALUES (NEW.id, {values});
+        END""",
+        f"""CREATE TRIGGER {search_table}_update AFTER UPDATE OF {columns} ON "{table}"
+        BEGIN
+            UPDATE {search_table} SET {assignments} WHERE rowid = OLD.id;
+        END""",
+        f"""CREATE TRIGGER {search_table}_delete AFTER DELETE ON "{table}"
+        BEGIN
+            DELETE FROM {search_table} WHERE rowid = OLD.id;
+        END""",
+    ]
+
+
+for model in (Venue, Artist):
+    for statement in [
+        *full_text_postgresql(model.__tablename__),
+        *trigram_postgresql(model.__tablename__),
+    ]:
+        sa.event.listen(
+            model.__table__,
+            "after_create",
+            sa.DDL(statement).execute_if(dialect="postgresql"),  # type: ignore[no-untyped-call]
+        )
+    for statement in full_text_sqlite(model.__tablename__):
+        sa.event.listen(
+            model.__table__,
+            "after_create",
+            sa.DDL(statement).execute_if(dialect="sqlite"),  # type: ignore[no-untyped-call]
+        )
+    # the triggers go away with the table, the FTS5 table has to be dropped
+    sa.event.listen(
+        model.__table__,
+        "after_drop",
+        sa.DDL(  # type: ignore[no-untyped-call]
+            f"DROP TABLE IF EXISTS {full_text_table(model.__tablename__)}"
+        ).execute_if(dialect="sqlite"),
+    )
+
+
+# The search objects are created by the DDL above, not declared in the metadata: the
+# FTS5 tables with their shadow tables, the `search_vector` column and its index, and
+# the trigram indexes. The autogenerated migrations have to leave them alone, see
+# `migrations/env.py`.
+FTS5_SHADOW_TABLES = ("data", "idx", "content", "docsize", "config")
+SEARCH_TABLES = {
+    name
+    for table in SEARCH_DOCUMENTS
+    for name in (
+        full_text_table(table),
+        *(f"{full_text_table(table)}_{shadow}" for shadow in FTS5_SHADOW_TABLES),
+    )
+}
+SEARCH_INDEXES = {
+    *(f"ix_{table}_search_vector" for table in SEARCH_DOCUMENTS),
+    *(
+        f"ix_{table}_{name}_trgm"
+        for table in SEARCH_DOCUMENTS
+        for name in SEARCH_DOCUMENTS[table]
+    ),
+}
+
+
+def is_search_object(name: Optional[str], type_: str) -> bool:
+    """Whether the schema object `name` of type `type_`, as named by Alembic, is a
+    search object."""
+    return (
+        (type_ == "table" and name in SEARCH_TABLES)
+        or (type_ == "column" and name == "search_vector")
+        or (type_ == "index" and name in SEARCH_INDEXES)
+    )
+
+
+def is_show_overlap_error(error: sa.exc.IntegrityError) -> bool:
+    return any(name in str(error.orig) for name in SHOW_OVERLAP_CONSTRAINTS)
+
+
+@sa.event.listens_for(sa.Engine, "connect")
+def enable_sqlite_foreign_keys(dbapi_connection: Any, connection_record: Any) -> None:
+    """SQLite only enforces foreign keys when asked to, per connection."""
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
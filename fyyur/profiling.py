@@ -0,0 +1,161 @@
+import cProfile
+import hmac
+import io
+import itertools
+import os
+import pstats
+import re
+import threading
+import time
+from collections import deque
+from collections.abc import Iterable
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+from flask import Flask
+from werkzeug.exceptions import HTTPException
+
+if TYPE_CHECKING:
+    from _typeshed.wsgi import StartResponse, WSGIApplication, WSGIEnvironment
+
+PROFILE_SUFFIX = ".prof"
+# `<endpoint>-<start in ms>-<pid>.prof`, as saved by the middleware
+_PROFILE_NAME = re.compile(rf"(.+)-(\d+)-(\d+){re.escape(PROFILE_SUFFIX)}")
+
+
+class SamplingProfilerMiddleware:
+    """Profile one request in `sample_rate` and the trusted requests carrying
+    `header` with cProfile, and write one profile per request to `profile_dir`,
+    keeping the `max_files` most recent ones.
+
+    The header is trusted in debug mode, or when its value is `token`: anyone else
+    could make every request pay for a profile and its write.
+
+    Requests which are not sampled only pay for a counter and a header lookup."""
+
+    def __init__(
+        self,
+        app: Flask,
+        profile_dir: str,
+        sample_rate: int,
+        header: str,
+        token: Optional[str],
+        max_files: int,
+    ) -> None:
+        self.app = app
+        self.wsgi_app: "WSGIApplication" = app.wsgi_app
+        self.profile_dir = Path(profile_dir)
+        self.sample_rate = sample_rate
+        self.header_key = "HTTP_" + header.upper().replace("-", "_")
+        self.token = token
+        self.max_files = max_files
+        self.counter = itertools.count(1)
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        # the profiles to rotate, oldest first: those found at startup, then those
+        # saved by this process
+        found = []
+        for path in self.profile_dir.glob(f"*{PROFILE_SUFFIX}"):
+            saved_at = profile_time(path)
+            if saved_at is None:
+                app.logger.warning("Skipping %s, not named as a saved profile", path)
+                continue
+            found.append((saved_at, path))
+        self.saved = deque(path for _, path in sorted(found))
+        self.saved_lock = threading.Lock()
+
+    def trusted(self, environ: "WSGIEnvironment") -> bool:
+        if self.app.debug:
+            return True
+        return self.token is not None and hmac.compare_digest(
+            environ[self.header_key].encode(), self.token.encode()
+        )
+
+    def sampled(self, environ: "WSGIEnvironment") -> bool:
+        if self.header_key in environ and self.trusted(environ):
+            return True
+        return self.sample_rate > 0 and next(self.counter) % self.sample_rate == 0
+
+    def __call__(
+        self, environ: "WSGIEnvironment", start_response: "StartResponse"
+    ) -> Iterable[bytes]:
+        if not self.sampled(environ):
+            return self.wsgi_app(environ, start_response)
+
+        # the view runs within the call, only streamed bodies escape the profile
+        profile = cProfile.Profile()
+        start = time.time()
+        profile.enable()
+        try:
+            return self.wsgi_app(environ, start_response)
+        finally:
+            profile.disable()
+            # a profile failing to save must not replace the response, or the error
+            # of the request
+            try:
+                self.save(profile, self.endpoint(environ), start)
+            except Exception:
+                self.app.logger.exception("could not save the profile")
+
+    def endpoint(self, environ: "WSGIEnvironment") -> str:
+        try:
+            endpoint, _ = self.app.url_map.bind_to_environ(environ).match()
+        except HTTPException:
+            return "unknown"
+        return str(endpoint)
+
+    def save(self, profile: cProfile.Profile, endpoint: str, start: float) -> None:
+        name = f"{endpoint}-{start * 1000:.0f}-{os.getpid()}{PROFILE_SUFFIX}"
+        path = self.profile_dir / name
+        profile.dump_stats(path)
+
+        with self.saved_lock:
+            self.saved.append(path)
+            rotated = [
+                self.saved.popleft() for _ in range(len(self.saved) - self.max_files)
+            ]
+        for path in rotated:
+            # another process may have rotated it already
+            path.unlink(missing_ok=True)
+
+
+def profile_endpoint(path: Path) -> str:
+    return path.name.rsplit("-", 2)[0]
+
+
+def profile_time(path: Path) -> Optional[int]:
+    """Start time of the request of a saved profile, None for another file."""
+    match = _PROFILE_NAME.fullmatch(path.name)
+    return int(match.group(2)) if match else None
+
+
+def hot_functions_report(
+    profile_dir: str,
+    endpoint: Optional[str] = None,
+    top: int = 20,
+    sort: str = "cumulative",
+) -> str:
+    """Aggregate the profiles of `profile_dir`, optionally only those of `endpoint`,
+    into a report of the `top` functions."""
+    profiles = [
+        str(path)
+        for path in sorted(Path(profile_dir).glob(f"*{PROFILE_SUFFIX}"))
+        if endpoint is None or profile_endpoint(path) == endpoint
+    ]
+    if not profiles:
+        return "No profiles found."
+
+    output = io.StringIO()
+    stats = pstats.Stats(*profiles, stream=output)
+    stats.strip_dirs().sort_stats(sort).print_stats(top)
+    return f"{len(profiles)} profiles\n{output.getvalue()}"
+
+
+def init_app(app: Flask) -> None:
+    app.wsgi_app = SamplingProfilerMiddleware(  # type: ignore[method-assign]
+        app,
+        profile_dir=app.config["PROFILE_DIR"],
+        sample_rate=app.config["PROFILE_SAMPLE_RATE"],
+        header=app.config["PROFILE_HEADER"],
+        token=app.config["PROFILE_TOKEN"],
+        max_files=app.config["PROFILE_MAX_FILES"],
+    )
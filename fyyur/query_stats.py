@@ -0,0 +1,133 @@
+import hmac
+import re
+import threading
+from dataclasses import asdict, dataclass
+from typing import Any
+
+from flask import Flask, Response, abort, current_app, jsonify, request
+
+from fyyur.instrumentation import ExecutedStatement, observe_statements, statement_shape
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.\"])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\$\d+|(?<![:\w]):\w+")
+
+# fingerprints beyond this many are aggregated together
+MAX_FINGERPRINTS = 5000
+OTHER_FINGERPRINT = "(other statements)"
+
+
+def fingerprint(statement: str) -> str:
+    """Normalize a statement by replacing its literals and parameters by `?`, so
+    that the executions of a same query have the same fingerprint."""
+    statement = _STRING.sub("?", statement)
+    statement = _PLACEHOLDER.sub("?", statement)
+    statement = _NUMBER.sub("?", statement)
+    return statement_shape(statement)
+
+
+@dataclass
+class FingerprintStats:
+    fingerprint: str
+    count: int = 0
+    total_time: float = 0
+    max_time: float = 0
+    # affected by the DML statements, fetched from the others
+    rows: int = 0
+
+
+class CountingCursor:
+    """DBAPI cursor adding the number of rows fetched from it to `stats`."""
+
+    def __init__(self, cursor: Any, stats: FingerprintStats, lock: threading.Lock):
+        self.cursor = cursor
+        self.stats = stats
+        self.lock = lock
+
+    def count(self, rows: int) -> None:
+        with self.lock:
+            self.stats.rows += rows
+
+    def fetchone(self) -> Any:
+        row = self.cursor.fetchone()
+        if row is not None:
+            self.count(1)
+        return row
+
+    def fetchmany(self, *args: Any) -> Any:
+        rows = self.cursor.fetchmany(*args)
+        self.count(len(rows))
+        return rows
+
+    def fetchall(self) -> Any:
+        rows = self.cursor.fetchall()
+        self.count(len(rows))
+        return rows
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.cursor, name)
+
+
+class QueryStats:
+    """Count, time and rows of the executed statements, by fingerprint."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.stats: dict[str, FingerprintStats] = {}
+
+    def __call__(self, executed: ExecutedStatement) -> None:
+        key = fingerprint(executed.statement)
+        with self.lock:
+            stats = self.stats.get(key)
+            if stats is None:
+                if len(self.stats) >= MAX_FINGERPRINTS:
+                    key = OTHER_FINGERPRINT
+                stats = self.stats.setdefault(key, FingerprintStats(key))
+            stats.count += 1
+            stats.total_time += executed.duration
+            stats.max_time = max(stats.max_time, executed.duration)
+            if executed.cursor.description is None:
+                stats.rows += max(executed.cursor.rowcount, 0)
+
+        # the rows of a statement returning some are only known once fetched, the
+        # drivers don't count them beforehand, SQLite not at all
+        context = executed.context
+        if executed.cursor.description is not None and context.cursor is executed.cursor:
+            context.cursor = CountingCursor(executed.cursor, stats, self.lock)
+
+    def dump(self) -> list[dict[str, Any]]:
+        """The stats of every fingerprint, most time consuming first."""
+        with self.lock:
+            stats = [asdict(stats) for stats in self.stats.values()]
+        return sorted(stats, key=lambda stats: stats["total_time"], reverse=True)
+
+    def reset(self) -> None:
+        with self.lock:
+            self.stats.clear()
+
+
+def authorized() -> bool:
+    if current_app.debug:
+        return True
+    token = current_app.config["QUERY_STATS_TOKEN"]
+    return token is not None and hmac.compare_digest(
+        request.headers.get("Authorization", "").encode(), f"Bearer {token}".encode()
+    )
+
+
+def init_app(app: Flask) -> None:
+    """Aggregate the statements run by the app and serve the aggregates as JSON on
+    `/query-stats`, the input of `flask fyyur advise-indexes`. The aggregates are per
+    process.
+
+    The statements tell about the schema and the traffic: outside of debug mode,
+    they are only served to requests authorized with `QUERY_STATS_TOKEN`."""
+    query_stats = QueryStats()
+    app.extensions["query_stats"] = query_stats
+    observe_statements(app, query_stats)
+
+    @app.route("/query-stats")
+    def dump_query_stats() -> Response:
+        if not authorized():
+            abort(403)
+        return jsonify(query_stats.dump())
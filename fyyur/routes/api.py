@@ -0,0 +1,34 @@
+from typing import Union
+
+from flask import Blueprint, jsonify, request, url_for
+from pydantic import ValidationError
+from werkzeug.wrappers.response import Response as FlaskResponse
+
+from fyyur.schema.autocomplete import AutocompleteQuery, AutocompleteResponse, Completion
+from fyyur.search import autocomplete_index
+
+bp = Blueprint("api", __name__, url_prefix="/api")
+
+
+@bp.route("/autocomplete")
+def autocomplete() -> Union[FlaskResponse, tuple[FlaskResponse, int]]:
+    try:
+        query = AutocompleteQuery(**request.args)
+    except ValidationError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(get_completions(query).model_dump(mode="json"))
+
+
+def get_completions(query: AutocompleteQuery) -> AutocompleteResponse:
+    """Venues and artists with a word of their name starting with `query.q`, from
+    the in process prefix index, without querying the database."""
+    completions = []
+    for table, id, name in autocomplete_index().complete(query.q, query.limit):
+        if table == "Venue":
+            url = url_for("venue.show_venue", venue_id=id)
+            completions.append(Completion(kind="venue", id=id, name=name, url=url))
+        else:
+            url = url_for("artist.show_artist", artist_id=id)
+            completions.append(Completion(kind="artist", id=id, name=name, url=url))
+    return AutocompleteResponse(completions=completions)
@@ -1,6 +1,7 @@
 from datetime import datetime
 from typing import Optional, Union
 
+import sqlalchemy as sa
 from flask import (
     Blueprint,
     abort,
@@ -14,8 +15,11 @@ from flask import (
 from pydantic import ValidationError
 from werkzeug.wrappers.response import Response as FlaskResponse
 
+from fyyur.facets import filter_conditions, get_facets
 from fyyur.forms import ArtistForm
-from fyyur.models import Artist, Genre, Show, Venue, db
+from fyyur.genre_cache import set_genres
+from fyyur.matchmaking import find_matches
+from fyyur.models import Artist, Show, Venue, db
 from fyyur.schema.artist import (
     ArtistInfo,
     ArtistInfoResponse,
@@ -23,21 +27,31 @@ from fyyur.schema.artist import (
     ArtistResponse,
     ArtistSearchResponse,
 )
-from fyyur.schema.base import SearchSchema
+from fyyur.schema.base import SearchMode, SearchSchema
+from fyyur.schema.facet import BrowseFilters
 from fyyur.schema.show import ShowInArtistInfo
+from fyyur.search import full_text_search, fuzzy_search, substring_search
 
 bp = Blueprint("artist", __name__, url_prefix="/artists")
 
 
 @bp.route("/")
 def artists() -> str:
-    data = [artist.model_dump(mode="json") for artist in get_artists()]
-    return render_template("pages/artists.html", artists=data)
+    try:
+        filters = BrowseFilters(**{k: v for k, v in request.args.items() if v})
+    except ValidationError:
+        abort(400)
+    data = [artist.model_dump(mode="json") for artist in get_artists(filters)]
+    facets = [facet.model_dump(mode="json") for facet in get_facets(Artist, filters)]
+    return render_template("pages/artists.html", artists=data, facets=facets)
 
 
 @bp.route("/search", methods=["POST"])
 def search_artists() -> str:
-    search_schema = SearchSchema(**request.form)
+    try:
+        search_schema = SearchSchema(**request.form)
+    except ValidationError:
+        abort(400)
     data = [artist.model_dump(mode="json") for artist in find_artists(search_schema)]
     response = {
         "count": len(data),
@@ -48,6 +62,7 @@ def search_artists() -> str:
         "pages/search_artists.html",
         results=response,
         search_term=search_schema.search_term,
+        search_mode=search_schema.mode.value,
     )
 
 
@@ -61,6 +76,16 @@ def show_artist(artist_id: int) -> str:
     )
 
 
+@bp.route("/<int:artist_id>/matches")
+def artist_matches(artist_id: int) -> str:
+    page = find_matches(Artist, artist_id)
+    if page is None:
+        abort(404)
+    return render_template(
+        "pages/matches.html", kind="artists", page=page.model_dump(mode="json")
+    )
+
+
 #  Update
 #  ----------------------------------------------------------------
 @bp.route("/<int:artist_id>/edit", methods=["GET"])
@@ -102,20 +127,34 @@ def create_artist_submission() -> Union[FlaskResponse, str]:
     return redirect(url_for("artist.create_artist_form"))
 
 
-def get_artists() -> list[ArtistResponse]:
-    artists: list[Artist] = Artist.query.order_by("id").all()
+def get_artists(filters: BrowseFilters = BrowseFilters()) -> list[ArtistResponse]:
+    artists: list[Artist] = (
+        Artist.query.filter(*filter_conditions(Artist, filters)).order_by("id").all()
+    )
     return [artist.artist_response for artist in artists]
 
 
 def find_artists(search: SearchSchema) -> list[ArtistSearchResponse]:
-    artists: list[Artist] = Artist.query.filter(
-        Artist.name.ilike(f"%{search.search_term}%")
-    ).all()
+    query = Artist.query.options(*Artist.with_show_counts())
+    if search.mode == SearchMode.SUBSTRING:
+        query = substring_search(query, Artist, search.search_term)
+    elif search.mode == SearchMode.FUZZY:
+        query = fuzzy_search(query, Artist, search.search_term)
+    else:
+        query = full_text_search(query, Artist, search.search_term)
+    artists: list[Artist] = query.all()
     return [artist.artist_search_response for artist in artists]
 
 
 def get_artist_info(artist_id: int) -> Optional[ArtistInfoResponse]:
-    artist: Artist = Artist.query.filter_by(id=artist_id).first()
+    """Load the artist page in two statements: the artist, with its genres read from its
+    bitmask, then all of its shows, split into past and upcoming against a single
+    timestamp."""
+    now = datetime.now()
+
+    artist: Optional[Artist] = (
+        Artist.query.options(sa.orm.lazyload("*")).filter_by(id=artist_id).one_or_none()
+    )
     if artist is None:
         return None
 
@@ -128,24 +167,21 @@ def get_artist_info(artist_id: int) -> Optional[ArtistInfoResponse]:
         )
         .join(Venue, Show.venue_id == Venue.id)
         .filter(Show.artist_id == artist_id)
+        .order_by(Show.start_time)
     )
 
-    upcoming_shows_query = shows_query.filter(Show.start_time >= datetime.now())
-    past_shows_query = shows_query.filter(Show.start_time < datetime.now())
-
+    upcoming_shows: list[ShowInArtistInfo] = []
+    past_shows: list[ShowInArtistInfo] = []
     with current_app.app_context():
-        upcoming_shows = [
-            ShowInArtistInfo.model_validate(row) for row in upcoming_shows_query.all()
-        ]
-        past_shows = [
-            ShowInArtistInfo.model_validate(row) for row in past_shows_query.all()
-        ]
+        for row in shows_query.all():
+            shows = past_shows if row.start_time < now else upcoming_shows
+            shows.append(ShowInArtistInfo.model_validate(row))
 
     artist_info = ArtistInfo.model_validate(artist)
     return ArtistInfoResponse(
         **artist_info.model_dump(),
         id=artist.id,
-        genres=[genre.name for genre in artist.genres],
+        genres=artist.genre_enums,
         past_shows=past_shows,
         upcoming_shows=upcoming_shows,
         past_shows_count=len(past_shows),
@@ -174,12 +210,12 @@ def insert_artist(form: ArtistForm) -> bool:
     if artist_in_form is None:
         return False
 
-    artist = artist_in_form.to_orm(Artist)
-    artist.genres = Genre.genres_in_and_out_db(artist_in_form.genres)
+    artist = Artist(**artist_in_form.model_dump(exclude={"genres"}))
 
     ok: bool = True
     try:
         db.session.add(artist)
+        set_genres(artist, artist_in_form.genres)
         db.session.commit()
 
         flash(f"Artist: {artist_in_form.name} was successfully listed!")
@@ -209,10 +245,10 @@ def update_artist(form: ArtistForm, artist_id: int) -> bool:
 
     for key, value in artist_in_form.model_dump(exclude={"genres"}).items():
         setattr(artist, key, value)
-    artist.genres = Genre.genres_in_and_out_db(artist_in_form.genres)
 
     ok: bool = True
     try:
+        set_genres(artist, artist_in_form.genres)
         db.session.commit()
 
         flash(f"Artist ID: {artist_id} was successfully edited!")
@@ -0,0 +1,99 @@
+from typing import Optional, Union
+
+import sqlalchemy as sa
+from flask import Blueprint, abort, current_app, render_template, request
+
+from fyyur.models import Artist, Genre, Venue, db
+from fyyur.schema.genre import GenreEnum, GenreMember, GenrePage
+
+bp = Blueprint("genre", __name__, url_prefix="/genres")
+
+MEMBERS: dict[str, type[Union[Venue, Artist]]] = {"venues": Venue, "artists": Artist}
+
+
+@bp.route("/")
+def genres() -> str:
+    return render_template(
+        "pages/genres.html", genres=[genre.value for genre in GenreEnum]
+    )
+
+
+@bp.route("/<genre_name>/<kind>")
+def browse_genre(genre_name: str, kind: str) -> str:
+    try:
+        genre = GenreEnum(genre_name)
+        model = MEMBERS[kind]
+    except (ValueError, KeyError):
+        abort(404)
+
+    try:
+        after, before = (
+            int(request.args[arg]) if arg in request.args else None
+            for arg in ("after", "before")
+        )
+    except ValueError:
+        abort(400)
+
+    page = get_genre_page(genre, model, after=after, before=before)
+    return render_template(
+        "pages/genre.html",
+        genre=genre.value,
+        kind=kind,
+        members=[member.model_dump(mode="json") for member in page.members],
+        next_cursor=page.next_cursor,
+        prev_cursor=page.prev_cursor,
+    )
+
+
+def get_genre_page(
+    genre: GenreEnum,
+    model: type[Union[Venue, Artist]],
+    after: Optional[int] = None,
+    before: Optional[int] = None,
+    per_page: Optional[int] = None,
+) -> GenrePage:
+    """Page through the venues or artists of a genre by keyset on their id, from the
+    genre side of the association table, without loading the genre's collection:
+    `after` returns the rows following the cursor, `before` the rows preceding it."""
+    if per_page is None:
+        per_page = current_app.config["GENRE_MEMBERS_PER_PAGE"]
+
+    genre_row: Optional[Genre] = Genre.query.filter_by(name=genre.value).first()
+    if genre_row is None:
+        return GenrePage(members=[])
+
+    collection = genre_row.venues if model is Venue else genre_row.artists
+    members = collection.select().with_only_columns(model.id, model.name)
+
+    if before is not None:
+        query = members.where(model.id < before).order_by(model.id.desc())
+    else:
+        query = members.where(model.id > (after or 0)).order_by(model.id)
+
+    rows = list(db.session.execute(query.limit(per_page + 1)))
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if before is not None:
+        rows.reverse()
+    if not rows:
+        return GenrePage(members=[])
+
+    first, last = rows[0].id, rows[-1].id
+    # the direction we paged in is known from the extra row, the other one
+    # needs a (cheap, index-only) existence check
+    if before is not None:
+        has_prev = has_more
+        has_next = db.session.execute(
+            sa.exists(members.where(model.id > last)).select()
+        ).scalar_one()
+    else:
+        has_next = has_more
+        has_prev = db.session.execute(
+            sa.exists(members.where(model.id < first)).select()
+        ).scalar_one()
+
+    return GenrePage(
+        members=[GenreMember.model_validate(row) for row in rows],
+        next_cursor=last if has_next else None,
+        prev_cursor=first if has_prev else None,
+    )
@@ -1,29 +1,62 @@
+import bisect
+import csv
+import io
+import json
+from collections import defaultdict
 from datetime import datetime, timedelta
-from typing import Union
+from typing import IO, Any, Optional, Union
 
+import sqlalchemy as sa
 from flask import (
     Blueprint,
+    abort,
     current_app,
     flash,
+    jsonify,
     redirect,
     render_template,
+    request,
     url_for,
 )
 from pydantic import ValidationError
-from sqlalchemy import or_
 from werkzeug.wrappers.response import Response as FlaskResponse
 
 from fyyur.forms import ShowForm
-from fyyur.models import Artist, Show, Venue, db
-from fyyur.schema.show import ShowInForm, ShowResponse
+from fyyur.models import Artist, Show, Venue, db, is_show_overlap_error
+from fyyur.schema.show import (
+    ShowBatchResult,
+    ShowCursor,
+    ShowInForm,
+    ShowPage,
+    ShowResponse,
+)
 
 bp = Blueprint("show", __name__, url_prefix="/shows")
 
+# two shows of the same artist or venue must be further apart than this
+SHOW_OVERLAP = timedelta(minutes=1)
+# time ranges of a batch looked up for conflicts per statement
+CONFLICT_RANGES_PER_QUERY = 100
+
 
 @bp.route("/")
 def shows() -> str:
-    data = [show.model_dump(mode="json") for show in get_shows()]
-    return render_template("pages/shows.html", shows=data)
+    try:
+        after, before = (
+            ShowCursor.decode(request.args[arg]) if arg in request.args else None
+            for arg in ("after", "before")
+        )
+    except ValueError:
+        abort(400)
+
+    page = get_shows(after=after, before=before)
+    data = [show.model_dump(mode="json") for show in page.shows]
+    return render_template(
+        "pages/shows.html",
+        shows=data,
+        next_cursor=page.next_cursor,
+        prev_cursor=page.prev_cursor,
+    )
 
 
 @bp.route("/create")
@@ -42,11 +75,105 @@ def create_show_submission() -> Union[FlaskResponse, str]:
     return redirect(url_for("show.create_shows"))
 
 
-def get_shows() -> list[ShowResponse]:
-    """Seperate `get_shows` so we can test this behavior"""
+@bp.route("/bulk", methods=["POST"])
+def create_shows_bulk() -> Union[FlaskResponse, tuple[FlaskResponse, int]]:
+    """Schedule a batch of shows posted as a JSON array or as CSV (either as the
+    request body or as an uploaded `file`), with `artist_id`, `venue_id` and
+    `start_time` for each show."""
+    try:
+        if "file" in request.files:
+            file = request.files["file"]
+            format = "json" if (file.filename or "").endswith(".json") else "csv"
+            rows = read_show_batch(io.TextIOWrapper(file.stream, "utf-8"), format)
+        elif request.is_json:
+            rows = read_show_batch(io.StringIO(request.get_data(as_text=True)), "json")
+        else:
+            rows = read_show_batch(io.StringIO(request.get_data(as_text=True)), "csv")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    results = schedule_shows(rows)
+    accepted = sum(result.accepted for result in results)
+    return jsonify(
+        {
+            "accepted": accepted,
+            "rejected": len(results) - accepted,
+            "results": [result.model_dump(mode="json") for result in results],
+        }
+    )
+
+
+def get_shows(
+    after: Optional[ShowCursor] = None,
+    before: Optional[ShowCursor] = None,
+    per_page: Optional[int] = None,
+) -> ShowPage:
+    """Seperate `get_shows` so we can test this behavior
+
+    Shows are paginated by keyset on `(start_time, id)`: `after` returns the shows
+    following the cursor, `before` the shows preceding it. Without any cursor the
+    page starts at the current time so upcoming shows come first.
+    """
+    if per_page is None:
+        per_page = current_app.config["SHOWS_PER_PAGE"]
+    if after is None and before is None:
+        after = ShowCursor(start_time=datetime.now(), id=0)
+
+    key = sa.tuple_(Show.start_time, Show.id)
+    shows_query = (
+        db.session.query(
+            Show.id,
+            Show.venue_id,
+            Show.artist_id,
+            Show.start_time,
+            Venue.name.label("venue_name"),
+            Artist.name.label("artist_name"),
+            Artist.image_link.label("artist_image_link"),
+        )
+        .join(Venue, Show.venue_id == Venue.id)
+        .join(Artist, Show.artist_id == Artist.id)
+    )
+
+    if before is not None:
+        cursor = before
+        shows_query = shows_query.filter(key < (before.start_time, before.id)).order_by(
+            Show.start_time.desc(), Show.id.desc()
+        )
+    else:
+        assert after is not None
+        cursor = after
+        shows_query = shows_query.filter(key > (after.start_time, after.id)).order_by(
+            Show.start_time, Show.id
+        )
+
     with current_app.app_context():
-        shows: list[Show] = Show.query.all()
-        return [show.show_response for show in shows]
+        rows = shows_query.limit(per_page + 1).all()
+        has_more = len(rows) > per_page
+        rows = rows[:per_page]
+        if before is not None:
+            rows.reverse()
+
+        first = ShowCursor(rows[0].start_time, rows[0].id) if rows else cursor
+        last = ShowCursor(rows[-1].start_time, rows[-1].id) if rows else cursor
+
+        # the direction we paged in is known from the extra row, the other one
+        # needs a (cheap, index-only) existence check
+        if before is not None:
+            has_prev = has_more
+            has_next = db.session.query(
+                sa.exists().where(key > (last.start_time, last.id))
+            ).scalar()
+        else:
+            has_next = has_more
+            has_prev = db.session.query(
+                sa.exists().where(key < (first.start_time, first.id))
+            ).scalar()
+
+        return ShowPage(
+            shows=[ShowResponse.model_validate(row) for row in rows],
+            next_cursor=last.encode() if has_next else None,
+            prev_cursor=first.encode() if has_prev else None,
+        )
 
 
 def insert_show(form: ShowForm) -> bool:
@@ -58,35 +185,14 @@ def insert_show(form: ShowForm) -> bool:
 
     try:
         show = ShowInForm.model_validate(form.data)
-        artist_id = show.artist_id
-        venue_id = show.venue_id
-        start_time = show.start_time
     except ValidationError as e:
         flash(str(e), "error")
         return False
 
-    if start_time < datetime.now():
+    if show.start_time < datetime.now():
         flash("Could not create show in the past", "error")
         return False
 
-    if (
-        not Artist.query.filter_by(id=artist_id).first()
-        or not Venue.query.filter_by(id=venue_id).first()
-    ):
-        flash("Artist or Venue doesn't exist", "error")
-        return False
-
-    offset = timedelta(minutes=1)
-    existed_shows = (
-        Show.query.filter(Show.start_time >= start_time - offset)
-        .filter(Show.start_time <= start_time + offset)
-        .filter(or_(Show.artist_id == artist_id, Show.venue_id == venue_id))
-        .first()
-    )
-    if existed_shows:
-        flash("Show existed", "error")
-        return False
-
     ok: bool = True
     try:
         db.session.add(show.to_orm(Show))
@@ -94,6 +200,17 @@ def insert_show(form: ShowForm) -> bool:
 
         flash("Show was successfully listed!", "info")
 
+    # the database checks that the artist and venue exist and that neither of them
+    # has another show at the same time
+    except sa.exc.IntegrityError as e:
+        db.session.rollback()
+        ok = False
+
+        if is_show_overlap_error(e):
+            flash("Show existed", "error")
+        else:
+            flash("Artist or Venue doesn't exist", "error")
+
     except Exception as e:
         db.session.rollback()
         ok = False
@@ -104,3 +221,168 @@ def insert_show(form: ShowForm) -> bool:
         db.session.close()
 
     return ok
+
+
+def read_show_batch(stream: IO[str], format: str) -> list[dict[str, Any]]:
+    if format == "csv":
+        rows = list(csv.DictReader(stream))
+        for row_number, row in enumerate(rows, 1):
+            # the values beyond the header are put under the `None` key
+            if None in row:
+                raise ValueError(f"Row {row_number} has more columns than the header")
+        return rows
+
+    rows = json.load(stream)
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        raise ValueError("Expected a JSON array of shows")
+    return rows
+
+
+def schedule_shows(rows: list[dict[str, Any]]) -> list[ShowBatchResult]:
+    """Validate a batch of shows and insert the valid ones in one statement.
+
+    Artists and venues are checked with a single `IN` query, conflicts against the
+    database with range queries over the clusters of start times of the batch, and
+    conflicts inside the batch by sweeping the shows in start time order. When two
+    shows of the batch conflict, the earlier one wins.
+    """
+    now = datetime.now()
+    results: dict[int, ShowBatchResult] = {}
+    shows: dict[int, ShowInForm] = {}
+
+    for row_number, row in enumerate(rows, 1):
+        try:
+            show = ShowInForm.model_validate(row)
+        except ValidationError as e:
+            results[row_number] = ShowBatchResult(
+                row=row_number, accepted=False, reason=str(e)
+            )
+            continue
+        if show.start_time < now:
+            results[row_number] = ShowBatchResult(
+                row=row_number, accepted=False, reason="Could not create show in the past"
+            )
+            continue
+        shows[row_number] = show
+
+    if shows:
+        artist_ids = {show.artist_id for show in shows.values()}
+        venue_ids = {show.venue_id for show in shows.values()}
+        existing = db.session.execute(
+            sa.union_all(
+                sa.select(sa.literal("artist"), Artist.id).where(
+                    Artist.id.in_(artist_ids)
+                ),
+                sa.select(sa.literal("venue"), Venue.id).where(Venue.id.in_(venue_ids)),
+            )
+        ).all()
+        existing_artists = {id for kind, id in existing if kind == "artist"}
+        existing_venues = {id for kind, id in existing if kind == "venue"}
+
+        for row_number, show in list(shows.items()):
+            if (
+                show.artist_id not in existing_artists
+                or show.venue_id not in existing_venues
+            ):
+                results[row_number] = ShowBatchResult(
+                    row=row_number, accepted=False, reason="Artist or Venue doesn't exist"
+                )
+                del shows[row_number]
+
+    if shows:
+        # start times taken by each artist / venue, kept sorted, with the batch row
+        # that took it (0 for shows already in the database)
+        busy: dict[tuple[str, int], list[tuple[datetime, int]]] = defaultdict(list)
+        clusters = _cluster_shows(list(shows.values()))
+        for start in range(0, len(clusters), CONFLICT_RANGES_PER_QUERY):
+            conditions = [
+                _conflict_condition(cluster)
+                for cluster in clusters[start : start + CONFLICT_RANGES_PER_QUERY]
+            ]
+            scheduled = db.session.execute(
+                sa.select(Show.artist_id, Show.venue_id, Show.start_time).where(
+                    sa.or_(*conditions)
+                )
+            )
+            for artist_id, venue_id, start_time in scheduled:
+                busy["artist", artist_id].append((start_time, 0))
+                busy["venue", venue_id].append((start_time, 0))
+        for times in busy.values():
+            times.sort()
+
+        for row_number, show in sorted(
+            shows.items(), key=lambda item: (item[1].start_time, item[0])
+        ):
+            owners = [("artist", show.artist_id), ("venue", show.venue_id)]
+            conflict = _find_conflict([busy[owner] for owner in owners], show.start_time)
+            if conflict is None:
+                for owner in owners:
+                    bisect.insort(busy[owner], (show.start_time, row_number))
+                continue
+
+            _, conflicting_row = conflict
+            reason = (
+                f"Conflicts with row {conflicting_row}"
+                if conflicting_row
+                else "Show existed"
+            )
+            results[row_number] = ShowBatchResult(
+                row=row_number, accepted=False, reason=reason
+            )
+            del shows[row_number]
+
+    if shows:
+        try:
+            db.session.execute(
+                sa.insert(Show), [show.model_dump() for show in shows.values()]
+            )
+            db.session.commit()
+            for row_number in shows:
+                results[row_number] = ShowBatchResult(row=row_number, accepted=True)
+
+        # a conflicting show was created since the range query
+        except sa.exc.IntegrityError as e:
+            db.session.rollback()
+            reason = "Show existed" if is_show_overlap_error(e) else str(e.orig)
+            for row_number in shows:
+                results[row_number] = ShowBatchResult(
+                    row=row_number, accepted=False, reason=f"{reason}, please retry"
+                )
+
+        finally:
+            db.session.close()
+
+    return [results[row_number] for row_number in sorted(results)]
+
+
+def _cluster_shows(shows: list[ShowInForm]) -> list[list[ShowInForm]]:
+    """Group the shows whose conflict windows overlap, so that a batch spread over a
+    long time only looks up the shows around its own."""
+    clusters: list[list[ShowInForm]] = []
+    for show in sorted(shows, key=lambda show: show.start_time):
+        if clusters and show.start_time - clusters[-1][-1].start_time <= 2 * SHOW_OVERLAP:
+            clusters[-1].append(show)
+        else:
+            clusters.append([show])
+    return clusters
+
+
+def _conflict_condition(cluster: list[ShowInForm]) -> sa.ColumnElement[bool]:
+    return sa.and_(
+        Show.start_time >= cluster[0].start_time - SHOW_OVERLAP,
+        Show.start_time <= cluster[-1].start_time + SHOW_OVERLAP,
+        sa.or_(
+            Show.artist_id.in_({show.artist_id for show in cluster}),
+            Show.venue_id.in_({show.venue_id for show in cluster}),
+        ),
+    )
+
+
+def _find_conflict(
+    busy: list[list[tuple[datetime, int]]], start_time: datetime
+) -> Optional[tuple[datetime, int]]:
+    for times in busy:
+        index = bisect.bisect_left(times, (start_time - SHOW_OVERLAP,))
+        if index < len(times) and times[index][0] <= start_time + SHOW_OVERLAP:
+            return times[index]
+    return None
@@ -16,9 +16,13 @@ from flask import (
 from pydantic import ValidationError
 from werkzeug.wrappers.response import Response as FlaskResponse
 
+from fyyur.facets import filter_conditions, get_facets
 from fyyur.forms import VenueForm
-from fyyur.models import Artist, Genre, Show, Venue, db
-from fyyur.schema.base import SearchSchema
+from fyyur.genre_cache import set_genres
+from fyyur.matchmaking import find_matches
+from fyyur.models import Artist, Show, Venue, db
+from fyyur.schema.base import SearchMode, SearchSchema
+from fyyur.schema.facet import BrowseFilters
 from fyyur.schema.show import ShowInVenueInfo
 from fyyur.schema.venue import (
     VenueEditReponse,
@@ -29,19 +33,28 @@ from fyyur.schema.venue import (
     VenueResponse,
     VenueResponseList,
 )
+from fyyur.search import full_text_search, fuzzy_search, substring_search
 
 bp = Blueprint("venue", __name__, url_prefix="/venues")
 
 
 @bp.route("/")
 def venues() -> str:
-    data = [venue.model_dump(mode="json") for venue in get_venues()]
-    return render_template("pages/venues.html", areas=data)
+    try:
+        filters = BrowseFilters(**{k: v for k, v in request.args.items() if v})
+    except ValidationError:
+        abort(400)
+    data = [venue.model_dump(mode="json") for venue in get_venues(filters)]
+    facets = [facet.model_dump(mode="json") for facet in get_facets(Venue, filters)]
+    return render_template("pages/venues.html", areas=data, facets=facets)
 
 
 @bp.route("/search", methods=["POST"])
 def search_venues() -> str:
-    search_schema = SearchSchema(**request.form)
+    try:
+        search_schema = SearchSchema(**request.form)
+    except ValidationError:
+        abort(400)
     data = [venue.model_dump(mode="json") for venue in find_venues(search_schema)]
     response = {
         "count": len(data),
@@ -52,6 +65,7 @@ def search_venues() -> str:
         "pages/search_venues.html",
         results=response,
         search_term=search_schema.search_term,
+        search_mode=search_schema.mode.value,
     )
 
 
@@ -63,6 +77,16 @@ def show_venue(venue_id: int) -> str:
     return render_template("pages/show_venue.html", venue=venue.model_dump(mode="json"))
 
 
+@bp.route("/<int:venue_id>/matches")
+def venue_matches(venue_id: int) -> str:
+    page = find_matches(Venue, venue_id)
+    if page is None:
+        abort(404)
+    return render_template(
+        "pages/matches.html", kind="venues", page=page.model_dump(mode="json")
+    )
+
+
 #  Create Venue
 #  ----------------------------------------------------------------
 
@@ -129,9 +153,14 @@ def edit_venue_submission(venue_id: int) -> Union[FlaskResponse, str]:
     return redirect(url_for("venue.edit_venue", venue_id=venue_id))
 
 
-def get_venues() -> list[VenueResponseList]:
+def get_venues(filters: BrowseFilters = BrowseFilters()) -> list[VenueResponseList]:
     results: dict[VenueLocation, list[VenueResponse]] = {}
-    venues: list[Venue] = Venue.query.order_by("id").all()
+    venues: list[Venue] = (
+        Venue.query.options(*Venue.with_show_counts())
+        .filter(*filter_conditions(Venue, filters))
+        .order_by("id")
+        .all()
+    )
     for venue in venues:
         location = VenueLocation(city=venue.city, state=venue.state)
         if location not in results:
@@ -149,18 +178,26 @@ def get_venues() -> list[VenueResponseList]:
 
 
 def find_venues(search: SearchSchema) -> list[VenueResponse]:
-    search_term = f"%{search.search_term}%"
-    venues: list[Venue] = Venue.query.filter(
-        sa.or_(
-            Venue.name.ilike(search_term),
-            (Venue.city + ", " + Venue.state).ilike(search_term),
-        )
-    ).all()
+    query = Venue.query.options(*Venue.with_show_counts())
+    if search.mode == SearchMode.SUBSTRING:
+        query = substring_search(query, Venue, search.search_term)
+    elif search.mode == SearchMode.FUZZY:
+        query = fuzzy_search(query, Venue, search.search_term)
+    else:
+        query = full_text_search(query, Venue, search.search_term)
+    venues: list[Venue] = query.all()
     return [venue.venue_response for venue in venues]
 
 
 def get_venue_info(venue_id: int) -> Optional[VenueInfoResponse]:
-    venue: Venue = Venue.query.filter_by(id=venue_id).first()
+    """Load the venue page in two statements: the venue, with its genres read from its
+    bitmask, then all of its shows, split into past and upcoming against a single
+    timestamp."""
+    now = datetime.now()
+
+    venue: Optional[Venue] = (
+        Venue.query.options(sa.orm.lazyload("*")).filter_by(id=venue_id).one_or_none()
+    )
     if venue is None:
         return None
 
@@ -173,32 +210,27 @@ def get_venue_info(venue_id: int) -> Optional[VenueInfoResponse]:
         )
         .join(Artist, Show.artist_id == Artist.id)
         .filter(Show.venue_id == venue_id)
+        .order_by(Show.start_time)
     )
 
-    upcoming_shows_query = shows_query.filter(Show.start_time >= datetime.now())
-    past_shows_query = shows_query.filter(Show.start_time < datetime.now())
-
+    upcoming_shows: list[ShowInVenueInfo] = []
+    past_shows: list[ShowInVenueInfo] = []
     with current_app.app_context():
-        upcoming_shows = [
-            ShowInVenueInfo.model_validate(row) for row in upcoming_shows_query.all()
-        ]
-        past_shows = [
-            ShowInVenueInfo.model_validate(row) for row in past_shows_query.all()
-        ]
+        for row in shows_query.all():
+            shows = past_shows if row.start_time < now else upcoming_shows
+            shows.append(ShowInVenueInfo.model_validate(row))
 
     venue_info = VenueInfo.model_validate(venue)
     return VenueInfoResponse(
         **venue_info.model_dump(),
         id=venue.id,
-        genres=[genre.name for genre in venue.genres],
+        genres=venue.genre_enums,
         past_shows=past_shows,
         upcoming_shows=upcoming_shows,
         past_shows_count=len(past_shows),
         upcoming_shows_count=len(upcoming_shows),
     )
 
-    return venue.venue_info_response
-
 
 def form_to_venue(form: VenueForm) -> Optional[VenueInForm]:
     if not form.validate_on_submit():
@@ -221,12 +253,12 @@ def insert_venue(form: VenueForm) -> bool:
     if venue_in_form is None:
         return False
 
-    venue = venue_in_form.to_orm(Venue)
-    venue.genres = Genre.genres_in_and_out_db(venue_in_form.genres)
+    venue = Venue(**venue_in_form.model_dump(exclude={"genres"}))
 
     ok: bool = True
     try:
         db.session.add(venue)
+        set_genres(venue, venue_in_form.genres)
         db.session.commit()
 
         flash(f"Venue: {venue_in_form.name} was successfully listed!")
@@ -256,10 +288,10 @@ def update_venue(form: VenueForm, venue_id: int) -> bool:
 
     for key, value in venue_in_form.model_dump(exclude={"genres"}).items():
         setattr(venue, key, value)
-    venue.genres = Genre.genres_in_and_out_db(venue_in_form.genres)
 
     ok: bool = True
     try:
+        set_genres(venue, venue_in_form.genres)
         db.session.commit()
 
         flash(f"Venue ID: {venue_id} was successfully edited!")
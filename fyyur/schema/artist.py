@@ -31,8 +31,10 @@ class ArtistInfo(ArtistBase):
     seeking_venue: bool = False
     seeking_description: Optional[str] = None
 
-    @field_serializer("image_link", "facebook_link", "website_link", return_type=str)
-    def serialize_url(self, url: HttpUrl) -> str:
+    @field_serializer("image_link", "facebook_link", "website_link")
+    def serialize_url(self, url: Optional[HttpUrl]) -> Optional[str]:
+        if url is None:
+            return None
         return str(url)
 
     @field_serializer("state")
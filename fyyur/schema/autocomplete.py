@@ -0,0 +1,21 @@
+from typing import Literal
+
+from pydantic import BaseModel, Field
+
+from fyyur.schema.base import BaseSchema
+
+
+class AutocompleteQuery(BaseModel):
+    q: str = ""
+    limit: int = Field(default=10, ge=1, le=50)
+
+
+class Completion(BaseSchema):
+    kind: Literal["venue", "artist"]
+    id: int
+    name: str
+    url: str
+
+
+class AutocompleteResponse(BaseSchema):
+    completions: list[Completion]
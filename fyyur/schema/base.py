@@ -16,8 +16,21 @@ class BaseSchema(BaseModel):
         return orm_class(**self.model_dump())
 
 
+class SearchMode(Enum):
+    # case insensitive substring of the name (and location), unranked
+    SUBSTRING = "substring"
+    # ranked match of the words of the name (and location), by prefix
+    FULL_TEXT = "full_text"
+    # name (or location) similar to the term despite typos, the most similar first
+    FUZZY = "fuzzy"
+
+    def __str__(self) -> str:
+        return self.value
+
+
 class SearchSchema(BaseModel):
     search_term: str = ""
+    mode: SearchMode = SearchMode.SUBSTRING
 
 
 class State(Enum):
@@ -0,0 +1,47 @@
+from typing import Any, Optional
+
+from pydantic import BaseModel
+
+from fyyur.schema.base import BaseSchema, State
+from fyyur.schema.genre import GenreEnum
+
+
+class BrowseFilters(BaseModel):
+    genre: Optional[GenreEnum] = None
+    state: Optional[State] = None
+    city: Optional[str] = None
+    # seeking talent for venues, seeking a venue for artists
+    seeking: Optional[bool] = None
+    upcoming: Optional[bool] = None
+
+    def query_args(self, **changes: Any) -> dict[str, str]:
+        """Query string of the filters, with `changes` applied, None removing a
+        filter."""
+        filters = {**self.model_dump(), **changes}
+        return {
+            name: format_filter(value)
+            for name, value in filters.items()
+            if value is not None
+        }
+
+
+def format_filter(value: Any) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (GenreEnum, State)):
+        return str(value.value)
+    return str(value)
+
+
+class FacetValue(BaseSchema):
+    label: str
+    count: int
+    selected: bool
+    # query string of the page with the filter toggled
+    args: dict[str, str]
+
+
+class Facet(BaseSchema):
+    name: str
+    label: str
+    values: list[FacetValue]
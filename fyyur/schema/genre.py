@@ -50,3 +50,17 @@ class GenreBase(BaseSchema):
 
 class GenreInDb(GenreBase):
     id: Optional[int]
+
+
+class GenreMember(BaseSchema):
+    id: int
+    name: str
+
+
+class GenrePage(BaseSchema):
+    # venues or artists of the genre, by id
+    members: list[GenreMember]
+    # pass as `?after=` to get the next page
+    next_cursor: Optional[int] = None
+    # pass as `?before=` to get the previous page
+    prev_cursor: Optional[int] = None
@@ -0,0 +1,27 @@
+from pydantic import field_serializer
+
+from fyyur.schema.base import BaseSchema
+from fyyur.schema.genre import GenreEnum
+
+
+class Match(BaseSchema):
+    id: int
+    name: str
+    city: str
+    state: str
+    shared_genres: list[GenreEnum]
+    # days of the calendar window neither side has a show on
+    free_days: int
+    score: float
+
+    @field_serializer("shared_genres")
+    def serialize_shared_genres(self, genres: list[GenreEnum]) -> list[str]:
+        return [genre.value for genre in genres]
+
+
+class MatchPage(BaseSchema):
+    # the venue or artist the matches are for
+    id: int
+    name: str
+    calendar_days: int
+    matches: list[Match]
@@ -1,7 +1,11 @@
+import base64
+import binascii
 from datetime import datetime
 from typing import Optional
 
-from pydantic import HttpUrl, field_serializer
+from pydantic import HttpUrl, field_serializer, field_validator
+from pydantic.dataclasses import dataclass
+from typing_extensions import Self
 
 from fyyur.schema.base import BaseSchema
 
@@ -17,7 +21,13 @@ class ShowInDb(ShowBase):
 
 
 class ShowInForm(ShowBase):
-    pass
+    @field_validator("start_time")
+    @classmethod
+    def to_local_time(cls, start_time: datetime) -> datetime:
+        # the shows are kept in the local time of the server, without time zone
+        if start_time.tzinfo is not None:
+            return start_time.astimezone().replace(tzinfo=None)
+        return start_time
 
 
 class ShowResponse(ShowBase):
@@ -30,6 +40,42 @@ class ShowResponse(ShowBase):
         return str(url)
 
 
+@dataclass(frozen=True)
+class ShowCursor:
+    """Position of a show in the `(start_time, id)` ordering of the shows page."""
+
+    start_time: datetime
+    id: int
+
+    def encode(self) -> str:
+        raw = f"{self.start_time.isoformat()}|{self.id}"
+        return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+    @classmethod
+    def decode(cls, token: str) -> Self:
+        try:
+            raw = base64.urlsafe_b64decode(token.encode("ascii")).decode("utf-8")
+            start_time, id = raw.rsplit("|", 1)
+            return cls(start_time=datetime.fromisoformat(start_time), id=int(id))
+        except (UnicodeError, binascii.Error) as e:
+            raise ValueError(f"Invalid cursor: {token}") from e
+
+
+class ShowPage(BaseSchema):
+    shows: list[ShowResponse]
+    # pass as `?after=` to get the next page
+    next_cursor: Optional[str] = None
+    # pass as `?before=` to get the previous page
+    prev_cursor: Optional[str] = None
+
+
+class ShowBatchResult(BaseSchema):
+    # 1-based position of the show in the submitted batch
+    row: int
+    accepted: bool
+    reason: Optional[str] = None
+
+
 class ShowInArtistInfo(BaseSchema):
     venue_id: int
     venue_name: str
@@ -46,8 +46,10 @@ class VenueInfo(VenueBase):
     seeking_talent: bool = False
     seeking_description: Optional[str] = None
 
-    @field_serializer("image_link", "facebook_link", "website_link", return_type=str)
-    def serialize_url(self, url: HttpUrl) -> str:
+    @field_serializer("image_link", "facebook_link", "website_link")
+    def serialize_url(self, url: Optional[HttpUrl]) -> Optional[str]:
+        if url is None:
+            return None
         return str(url)
 
     @field_serializer("state")
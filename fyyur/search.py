@@ -0,0 +1,750 @@
+import bisect
+import heapq
+import math
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import Counter, defaultdict
+from collections.abc import Sequence
+from itertools import groupby, islice
+from typing import Any, Generic, Optional, TypeVar, Union
+
+import sqlalchemy as sa
+from flask import Flask, current_app, has_app_context
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import Query, Session
+
+from fyyur.models import SEARCH_DOCUMENTS, Artist, Venue, db, full_text_table
+
+Searchable = TypeVar("Searchable", bound=Union[Venue, Artist])
+SEARCHABLE_MODELS: tuple[type[Union[Venue, Artist]], ...] = (Venue, Artist)
+
+_TOKEN = re.compile(r"\w+")
+
+# weights of the fields of the documents in the SQLite ranking, in the order of
+# `SEARCH_DOCUMENTS`, as the weights of the Postgres vectors
+FTS5_WEIGHTS = (1.0, 0.4, 0.2, 0.1)
+
+
+def search_tokens(term: str) -> list[str]:
+    return _TOKEN.findall(term.lower())
+
+
+def full_text_search(
+    query: "Query[Searchable]", model: type[Searchable], term: str
+) -> "Query[Searchable]":
+    """Filter `query` to the rows of `model` whose full-text document holds words
+    starting with each word of `term`, the best matches first."""
+    tokens = search_tokens(term)
+    if not tokens:
+        return query.order_by(model.id)
+
+    table = model.__tablename__
+    dialect = db.engine.dialect.name
+    if dialect == "postgresql":
+        vector = sa.literal_column(f'"{table}".search_vector', TSVECTOR)
+        tsquery = sa.func.to_tsquery(
+            "simple", " & ".join(f"{token}:*" for token in tokens)
+        )
+        return query.filter(vector.op("@@")(tsquery)).order_by(
+            sa.func.ts_rank(vector, tsquery).desc(), model.id
+        )
+
+    if dialect == "sqlite":
+        search_table = full_text_table(table)
+        match = " ".join(f'"{token}"*' for token in tokens)
+        weights = FTS5_WEIGHTS[: len(SEARCH_DOCUMENTS[table])]
+        rank = sa.func.bm25(sa.literal_column(search_table), *weights)
+        search = sa.table(search_table, sa.column("rowid"))
+        # bm25 is negative, the lower the better
+        return (
+            query.join(search, search.c.rowid == model.id)
+            .filter(sa.literal_column(search_table).op("MATCH")(match))
+            .order_by(rank, model.id)
+        )
+
+    # no full-text index elsewhere
+    return query.filter(
+        sa.and_(*(model.name.ilike(f"%{token}%") for token in tokens))
+    ).order_by(model.id)
+
+
+# the n-grams of these lengths are indexed, a term is looked up by its longest ones
+NGRAM_LENGTHS = (1, 2, 3)
+# past this many candidates, looking them up by id does not beat a scan
+MAX_CANDIDATES = 2000
+
+# share of the trigrams of the term a row must hold to match a fuzzy search
+FUZZY_THRESHOLD = 0.5
+# number of most similar rows returned by a fuzzy search
+FUZZY_LIMIT = 50
+# the trigrams held by more than this share of the strings are too common to be
+# worth counting, a fuzzy search only checks the candidates found through the others
+STOP_GRAM_SHARE = 0.05
+
+
+def ngrams(text: str, n: int) -> set[str]:
+    return {text[i : i + n] for i in range(len(text) - n + 1)}
+
+
+def search_field(model: type[Searchable], columns: tuple[str, ...]) -> Any:
+    """SQL expression of a field of the search documents of `model`."""
+    field = getattr(model, columns[0])
+    for column in columns[1:]:
+        field = field + ", " + getattr(model, column)
+    return field
+
+
+def document_strings(table: str, row: Any) -> list[str]:
+    """Fields of the search document of `row`, an instance or a row of `table`."""
+    return [
+        ", ".join(str(getattr(row, column)) for column in columns)
+        for columns in SEARCH_DOCUMENTS[table].values()
+    ]
+
+
+# past this many rows inserted out of band, rebuild an index rather than add them
+CATCH_UP_LIMIT = 1000
+
+V = TypeVar("V")
+
+
+class TableIndex(ABC, Generic[V]):
+    """Base of the in process indexes of the rows of `models`, mapping each row to
+    a value of the index.
+
+    Built from the tables on the first use, then kept up to date from the writes of
+    the ORM sessions of the process, applied on their commit. The rows inserted out
+    of band, by bulk inserts or other processes, are read on use, at most every
+    `refresh_interval` seconds, as the rows past the highest indexed id. The rows
+    updated or deleted out of band are only seen by a rebuild, once the index is
+    `max_age` seconds old. The tables are read as committed, on a connection of
+    their own.
+
+    Once `build_in_background` is called, the builds and rebuilds run in a thread
+    of their own rather than in the searches: the current index keeps serving them
+    while rebuilt, and they go without it until first built."""
+
+    models: tuple[type[Union[Venue, Artist]], ...] = ()
+
+    def __init__(self, max_age: float = math.inf, refresh_interval: float = math.inf):
+        self.max_age = max_age
+        self.refresh_interval = refresh_interval
+        self.lock = threading.Lock()
+        self.built = False
+        self.built_at = 0.0
+        self.refreshed_at = 0.0
+        # highest id read from each table
+        self.max_ids: dict[str, int] = {}
+        # the changes committed while reading the tables, applied on top of the rows
+        # read, which may predate them; None when not reading
+        self.pending: Optional[dict[tuple[str, int], Optional[V]]] = None
+        self.readers = 0
+        # the app the background builds run in, None to build in the searches
+        self.app: Optional[Flask] = None
+        self.builder: Optional[threading.Thread] = None
+        self.failed_at = -math.inf
+
+    @abstractmethod
+    def columns(self, model: type[Union[Venue, Artist]]) -> list[Any]:
+        """Columns read from the table of `model`, its id first."""
+
+    @abstractmethod
+    def value(self, table: str, row: Any) -> Optional[V]:
+        """Value of a row read from `table`, None for a row left out of the index."""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Empty the index. Called with the lock held."""
+
+    @abstractmethod
+    def apply(self, table: str, id: int, value: Optional[V]) -> None:
+        """Index `value` for the row `id` of `table` instead of its indexed value, None
+        for a row out of the index. Called with the lock held."""
+
+    def load(self, rows: dict[str, Sequence[Any]], rebuild: bool) -> None:
+        """Index the rows read from each table, into an empty index on a rebuild.
+        Called with the lock held."""
+        for table, table_rows in rows.items():
+            for row in table_rows:
+                self.apply(table, row[0], self.value(table, row))
+
+    def update(self, table: str, id: int, value: Optional[V]) -> None:
+        """Apply a change committed through the ORM."""
+        with self.lock:
+            if self.pending is not None:
+                self.pending[(table, id)] = value
+            if self.built:
+                self.apply(table, id, value)
+
+    def refresh(self, catch_up: bool = False) -> None:
+        """Build the index if needed, and read the rows inserted out of band if it is
+        time to, or whenever with `catch_up`."""
+        now = time.monotonic()
+        with self.lock:
+            built, built_at, refreshed_at = self.built, self.built_at, self.refreshed_at
+            max_ids = dict(self.max_ids)
+            failed_at = self.failed_at
+        if not built or now - built_at >= self.max_age:
+            self.rebuild(now - failed_at >= self.refresh_interval)
+        elif catch_up or now - refreshed_at >= self.refresh_interval:
+            if not self.read(max_ids, CATCH_UP_LIMIT):
+                self.rebuild(True)
+
+    def rebuild(self, retry: bool) -> None:
+        """Build the index in the caller, or start a background build, after a
+        failed one only if `retry`."""
+        if self.app is None:
+            self.build()
+        elif retry:
+            self.start_build()
+
+    def build(self) -> None:
+        self.read({}, None)
+
+    def build_in_background(self, app: Flask) -> None:
+        """Build the index in a thread of its own running in `app`, now and on each
+        rebuild."""
+        self.app = app
+        self.start_build()
+
+    def start_build(self) -> None:
+        with self.lock:
+            if self.builder is not None and self.builder.is_alive():
+                return
+            self.builder = threading.Thread(
+                target=self.build_in_app, name=f"{type(self).__name__} build", daemon=True
+            )
+            self.builder.start()
+
+    def build_in_app(self) -> None:
+        assert self.app is not None
+        with self.app.app_context():
+            try:
+                self.build()
+            except sa.exc.DBAPIError as error:
+                # e.g. the tables are yet to be created, retried by a later search
+                with self.lock:
+                    self.failed_at = time.monotonic()
+                self.app.logger.warning("Could not build the search index: %s", error)
+
+    def read(self, after: dict[str, int], limit: Optional[int]) -> bool:
+        """Read the rows of the tables past the ids `after`, the whole tables for a
+        rebuild when empty. False, reading nothing, when a table has more than
+        `limit` of them."""
+        started = time.monotonic()
+        with self.lock:
+            self.readers += 1
+            if self.pending is None:
+                self.pending = {}
+        try:
+            with db.engine.connect() as connection:
+                rows = {
+                    model.__tablename__: connection.execute(
+                        sa.select(*self.columns(model))
+                        .where(model.id > after.get(model.__tablename__, 0))
+                        .order_by(model.id)
+                        .limit(None if limit is None else limit + 1)
+                    ).all()
+                    for model in self.models
+                }
+            if limit is not None and any(len(r) > limit for r in rows.values()):
+                return False
+
+            with self.lock:
+                rebuild = not after
+                if rebuild:
+                    self.clear()
+                    self.max_ids = {}
+                self.load(rows, rebuild)
+                for table, table_rows in rows.items():
+                    if table_rows:
+                        self.max_ids[table] = max(
+                            self.max_ids.get(table, 0), table_rows[-1][0]
+                        )
+                assert self.pending is not None
+                for (table, id), value in self.pending.items():
+                    self.apply(table, id, value)
+                self.refreshed_at = started
+                if rebuild:
+                    self.built = True
+                    self.built_at = started
+            return True
+        finally:
+            with self.lock:
+                self.readers -= 1
+                if not self.readers:
+                    self.pending = None
+
+
+class NgramIndex(TableIndex[list[str]]):
+    """Inverted index of the n-grams of the lower case search documents of a table,
+    narrowing a substring search down to the rows holding every n-gram of the term.
+    The candidates are a superset of the matches: the database still runs the ilike
+    on them, so the index only has to never miss a row.
+
+    The n-grams are indexed per distinct string rather than per row: the rows sharing
+    a name or a location, as most rows share their city, share its postings."""
+
+    def __init__(
+        self,
+        model: type[Union[Venue, Artist]],
+        max_age: float = math.inf,
+        refresh_interval: float = math.inf,
+    ) -> None:
+        super().__init__(max_age, refresh_interval)
+        self.model = model
+        self.models = (model,)
+        self.table: str = model.__tablename__
+        # ids of the rows holding each string, sorted, and strings of each row
+        self.ids: dict[str, list[int]] = {}
+        self.strings: dict[int, set[str]] = {}
+        # strings holding each n-gram
+        self.postings: defaultdict[str, set[str]] = defaultdict(set)
+        # trigrams of each string, and the strings holding each trigram by their
+        # number of trigrams, to rank the rows of fuzzy searches
+        self.trigrams: dict[str, frozenset[str]] = {}
+        self.lengths: dict[str, dict[int, set[str]]] = {}
+
+    def columns(self, model: type[Union[Venue, Artist]]) -> list[Any]:
+        return [
+            model.id,
+            *(
+                getattr(model, column)
+                for columns in SEARCH_DOCUMENTS[self.table].values()
+                for column in columns
+            ),
+        ]
+
+    def value(self, table: str, row: Any) -> Optional[list[str]]:
+        return document_strings(table, row)
+
+    def clear(self) -> None:
+        self.ids.clear()
+        self.strings.clear()
+        self.postings.clear()
+        self.trigrams.clear()
+        self.lengths.clear()
+
+    def _index_string(self, string: str) -> None:
+        trigrams = frozenset(ngrams(string, 3))
+        self.trigrams[string] = trigrams
+        for n in NGRAM_LENGTHS:
+            for gram in trigrams if n == 3 else ngrams(string, n):
+                self.postings[gram].add(string)
+        for gram in trigrams:
+            self.lengths.setdefault(gram, {}).setdefault(len(trigrams), set()).add(string)
+
+    def _drop_string(self, string: str) -> None:
+        trigrams = self.trigrams.pop(string)
+        for n in NGRAM_LENGTHS:
+            for gram in trigrams if n == 3 else ngrams(string, n):
+                self.postings[gram].discard(string)
+                if not self.postings[gram]:
+                    del self.postings[gram]
+        for gram in trigrams:
+            lengths = self.lengths[gram]
+            lengths[len(trigrams)].discard(string)
+            if not lengths[len(trigrams)]:
+                del lengths[len(trigrams)]
+                if not lengths:
+                    del self.lengths[gram]
+
+    def _add(self, id: int, strings: list[str]) -> None:
+        row_strings = self.strings.setdefault(id, set())
+        for string in strings:
+            string = string.lower()
+            if string in row_strings:
+                continue
+            row_strings.add(string)
+            if string not in self.ids:
+                self.ids[string] = []
+                self._index_string(string)
+            bisect.insort(self.ids[string], id)
+
+    def add(self, id: int, strings: list[str]) -> None:
+        """Index `strings` for the row `id`, on top of its indexed strings."""
+        with self.lock:
+            self._add(id, strings)
+
+    def apply(self, table: str, id: int, strings: Optional[list[str]]) -> None:
+        for string in self.strings.pop(id, ()):
+            ids = self.ids[string]
+            del ids[bisect.bisect_left(ids, id)]
+            if not ids:
+                del self.ids[string]
+                self._drop_string(string)
+        if strings is not None:
+            self._add(id, strings)
+
+    def replace(self, id: int, strings: Optional[list[str]]) -> None:
+        """Index `strings` for the row `id` instead of its indexed strings, None for
+        a deleted row."""
+        self.update(self.table, id, strings)
+
+    def candidates(self, term: str, limit: Optional[int] = None) -> Optional[set[int]]:
+        """Ids of the rows which may contain `term`, None when the index can't tell:
+        the empty term matches everything, and the LIKE wildcards of a term match
+        anything. None as well past `limit` rows, or while the index is not built."""
+        term = term.lower()
+        if not term or "%" in term or "_" in term:
+            return None
+        self.refresh()
+
+        n = min(len(term), max(NGRAM_LENGTHS))
+        with self.lock:
+            if not self.built:
+                return None
+            postings = sorted(
+                (self.postings.get(gram, set()) for gram in ngrams(term, n)), key=len
+            )
+            strings = set(postings[0])
+            for others in postings[1:]:
+                strings &= others
+            candidates: set[int] = set()
+            for string in strings:
+                candidates.update(self.ids[string])
+                if limit is not None and len(candidates) > limit:
+                    return None
+        return candidates
+
+    def similar(self, term: str, threshold: float, limit: int) -> Optional[list[int]]:
+        """Ids of the `limit` rows with a field holding the most trigrams of `term`,
+        at least `threshold` of them, the fields with the fewest other trigrams first
+        on ties.
+        None for a term too short to have trigrams, or while the index is not built.
+
+        Only the strings which may reach the threshold are scored: the strings are
+        scanned by their number of trigrams, the fewest first, and the scan stops once
+        `limit` rows rank above any string left. The strings of each number of
+        trigrams are counted from the postings of the rarest trigrams of the term,
+        the most common ones left to the scoring."""
+        grams = ngrams(term.lower(), 3)
+        if not grams:
+            return None
+        self.refresh()
+
+        required = math.ceil(threshold * len(grams))
+        with self.lock:
+            if not self.built:
+                return None
+            lengths = {gram: self.lengths.get(gram, {}) for gram in grams}
+            # a string holding `required` trigrams of the term holds `required` minus
+            # the number of skipped ones among the others
+            common = sorted(grams, key=lambda gram: -len(self.postings.get(gram, ())))
+            skipped = {
+                gram
+                for gram in common[: required - 1]
+                if len(self.postings.get(gram, ())) > STOP_GRAM_SHARE * len(self.ids)
+            }
+            counted = [lengths[gram] for gram in grams - skipped]
+            # the longest strings holding each trigram, bounding the trigrams of the
+            # term the longer strings can share
+            longest = [
+                max(gram_lengths) for gram_lengths in lengths.values() if gram_lengths
+            ]
+
+            scored: list[tuple[tuple[int, float], str]] = []
+            for length in sorted({n for gram in counted for n in gram if n >= required}):
+                counts: Counter[str] = Counter()
+                for gram_lengths in counted:
+                    counts.update(gram_lengths.get(length, ()))
+                for string, count in counts.items():
+                    if count < required - len(skipped):
+                        continue
+                    shared = len(grams & self.trigrams[string])
+                    if shared >= required:
+                        union = len(grams) + length - shared
+                        scored.append(((shared, shared / union), string))
+
+                longer = length + 1
+                most = min(len(grams), longer, sum(n >= longer for n in longest))
+                if most < required:
+                    break
+                bound = (most, most / (len(grams) + longer - most))
+                ahead: set[int] = set()
+                for score, string in scored:
+                    if score > bound:
+                        ahead.update(islice(self.ids[string], limit))
+                        if len(ahead) >= limit:
+                            break
+                if len(ahead) >= limit:
+                    break
+
+            scored.sort(key=lambda item: item[0], reverse=True)
+            ranked: dict[int, None] = {}
+            for _, group in groupby(scored, key=lambda item: item[0]):
+                # the lowest ids first on ties
+                for id in heapq.merge(*(self.ids[string] for _, string in group)):
+                    ranked.setdefault(id)
+                    if len(ranked) == limit:
+                        return list(ranked)
+        return list(ranked)
+
+
+def ngram_indexes() -> Optional[dict[str, NgramIndex]]:
+    if not has_app_context():
+        return None
+    indexes: Optional[dict[str, NgramIndex]] = current_app.extensions.get("ngram_index")
+    return indexes
+
+
+def substring_search(
+    query: "Query[Searchable]", model: type[Searchable], term: str
+) -> "Query[Searchable]":
+    """Filter `query` to the rows of `model` with a field containing `term`, ignoring
+    case. Postgres serves the ilike with its trigram indexes, SQLite only runs it on
+    the candidates of the n-gram index when there is one."""
+    table = model.__tablename__
+    pattern = f"%{term}%"
+    query = query.filter(
+        sa.or_(
+            *(
+                search_field(model, columns).ilike(pattern)
+                for columns in SEARCH_DOCUMENTS[table].values()
+            )
+        )
+    )
+
+    index = (ngram_indexes() or {}).get(table)
+    if index is not None:
+        index.refresh()
+        # the rows inserted since, out of band, may match too
+        indexed_through = index.max_ids.get(table, 0)
+        candidates = index.candidates(term, MAX_CANDIDATES)
+        if candidates is not None:
+            # a subquery keeps SQLite looking both up by id, where a plain range
+            # would have it scan the table in the order of the ids
+            inserted = sa.alias(model.__table__)
+            query = query.filter(
+                sa.or_(
+                    model.id.in_(sorted(candidates)),
+                    model.id.in_(
+                        sa.select(inserted.c.id).where(inserted.c.id > indexed_through)
+                    ),
+                )
+            )
+    return query.order_by(model.id)
+
+
+def fuzzy_search(
+    query: "Query[Searchable]", model: type[Searchable], term: str
+) -> "Query[Searchable]":
+    """Filter `query` to the `FUZZY_LIMIT` rows of `model` with a field most similar
+    to `term` by trigrams, tolerating typos, the most similar first.
+
+    Postgres ranks by `pg_trgm` similarity, served by the trigram indexes. SQLite
+    ranks by the share of the trigrams of the term held by the fields, from the
+    n-gram index, and falls back to a substring search without it. The index can't
+    rank the rows it doesn't know: it first reads the rows inserted out of band."""
+    table = model.__tablename__
+    if db.engine.dialect.name == "postgresql":
+        return trigram_search(query, model, term)
+
+    index = (ngram_indexes() or {}).get(table)
+    if index is not None:
+        index.refresh(catch_up=True)
+    ids = index.similar(term, FUZZY_THRESHOLD, FUZZY_LIMIT) if index else None
+    if ids is None:
+        return substring_search(query, model, term)
+    if not ids:
+        return query.filter(sa.false())
+    ranks = {id: rank for rank, id in enumerate(ids)}
+    return query.filter(model.id.in_(ids)).order_by(sa.case(ranks, value=model.id))
+
+
+def trigram_search(
+    query: "Query[Searchable]", model: type[Searchable], term: str
+) -> "Query[Searchable]":
+    """The fuzzy search of Postgres, by `pg_trgm` similarity."""
+    # `%` binds tighter than the `||` of the fields concatenating several columns
+    fields = [
+        search_field(model, columns).self_group()
+        for columns in SEARCH_DOCUMENTS[model.__tablename__].values()
+    ]
+    similarity = sa.func.greatest(*(sa.func.similarity(field, term) for field in fields))
+    return (
+        query.filter(sa.or_(*(field.op("%")(term) for field in fields)))
+        .order_by(similarity.desc(), model.id)
+        .limit(FUZZY_LIMIT)
+    )
+
+
+class PrefixIndex(TableIndex[str]):
+    """Sorted array of the lower case names of the venues and artists, and of their
+    ends starting at each word ("musical hop" and "hop" for "The Musical Hop"),
+    completing a prefix with a bisection."""
+
+    models = SEARCHABLE_MODELS
+
+    def __init__(
+        self, max_age: float = math.inf, refresh_interval: float = math.inf
+    ) -> None:
+        super().__init__(max_age, refresh_interval)
+        # (key, table, id), sorted
+        self.entries: list[tuple[str, str, int]] = []
+        self.names: dict[tuple[str, int], str] = {}
+
+    @staticmethod
+    def keys(name: str) -> list[str]:
+        name = " ".join(name.lower().split())
+        return [name[match.start() :] for match in _TOKEN.finditer(name)]
+
+    def columns(self, model: type[Union[Venue, Artist]]) -> list[Any]:
+        return [model.id, model.name]
+
+    def value(self, table: str, row: Any) -> Optional[str]:
+        name: str = row.name
+        return name
+
+    def clear(self) -> None:
+        self.entries = []
+        self.names = {}
+
+    def load(self, rows: dict[str, Sequence[Any]], rebuild: bool) -> None:
+        names = {
+            (table, row.id): row.name
+            for table, table_rows in rows.items()
+            for row in table_rows
+        }
+        # merge the new entries in with a single sort rather than one insertion each
+        for table, id in names.keys() & self.names.keys():
+            self.apply(table, id, None)
+        self.names.update(names)
+        self.entries.extend(
+            (key, table, id)
+            for (table, id), name in names.items()
+            for key in self.keys(name)
+        )
+        self.entries.sort()
+
+    def apply(self, table: str, id: int, name: Optional[str]) -> None:
+        previous = self.names.pop((table, id), None)
+        for key in self.keys(previous) if previous is not None else []:
+            i = bisect.bisect_left(self.entries, (key, table, id))
+            if i < len(self.entries) and self.entries[i] == (key, table, id):
+                del self.entries[i]
+        if name is not None:
+            self.names[(table, id)] = name
+            for key in self.keys(name):
+                bisect.insort(self.entries, (key, table, id))
+
+    def replace(self, table: str, id: int, name: Optional[str]) -> None:
+        """Index `name` for the row `id` of `table` instead of its indexed name, None
+        for a deleted row."""
+        self.update(table, id, name)
+
+    def complete(self, prefix: str, limit: int) -> list[tuple[str, int, str]]:
+        """Table, id and name of the first `limit` rows, in alphabetical order of the
+        matching words, with a word of their name starting with `prefix`."""
+        prefix = " ".join(prefix.lower().split())
+        if not prefix:
+            return []
+        self.refresh()
+
+        completions: dict[tuple[str, int], str] = {}
+        with self.lock:
+            i = bisect.bisect_left(self.entries, (prefix,))
+            while i < len(self.entries) and len(completions) < limit:
+                key, table, id = self.entries[i]
+                if not key.startswith(prefix):
+                    break
+                completions.setdefault((table, id), self.names[(table, id)])
+                i += 1
+        return [(table, id, name) for (table, id), name in completions.items()]
+
+
+def autocomplete_index() -> PrefixIndex:
+    index: PrefixIndex = current_app.extensions.setdefault(
+        "autocomplete_index",
+        PrefixIndex(
+            current_app.config["SEARCH_INDEX_MAX_AGE"],
+            current_app.config["SEARCH_INDEX_REFRESH_INTERVAL"],
+        ),
+    )
+    return index
+
+
+# The in process indexes follow the rows written through the ORM: the changes of a
+# flush are applied to them on the commit.
+
+
+@sa.event.listens_for(Session, "after_flush")
+def index_flushed_rows(session: Session, flush_context: Any) -> None:
+    if not has_app_context():
+        return
+
+    ngram_index = ngram_indexes() or {}
+    changes = session.info.setdefault("search_index_changes", {})
+    for instance in [*session.new, *session.dirty, *session.deleted]:
+        table = getattr(instance, "__tablename__", "")
+        if table not in SEARCH_DOCUMENTS:
+            continue
+        if instance in session.deleted:
+            changes[(table, instance.id)] = None
+            continue
+
+        strings = document_strings(table, instance)
+        changes[(table, instance.id)] = strings
+        index = ngram_index.get(table)
+        if index is not None and index.built:
+            # the n-gram index only has to never miss a row: the committed strings
+            # stay indexed until the commit, as long as the transaction may be
+            # rolled back
+            index.add(instance.id, strings)
+
+
+@sa.event.listens_for(Session, "after_commit")
+def index_committed_rows(session: Session) -> None:
+    changes: dict[tuple[str, int], Optional[list[str]]] = session.info.pop(
+        "search_index_changes", {}
+    )
+    if not changes or not has_app_context():
+        return
+
+    ngram_index = ngram_indexes() or {}
+    prefix_index: Optional[PrefixIndex] = current_app.extensions.get("autocomplete_index")
+    for (table, id), strings in changes.items():
+        index = ngram_index.get(table)
+        if index is not None:
+            index.replace(id, strings)
+        if prefix_index is not None:
+            # the name is the first field of the documents
+            prefix_index.replace(table, id, strings[0] if strings else None)
+
+
+@sa.event.listens_for(Session, "after_rollback")
+def forget_rolled_back_rows(session: Session) -> None:
+    session.info.pop("search_index_changes", None)
+
+
+def init_app(app: Flask) -> None:
+    """Build an n-gram index of the search documents of each searchable table in
+    process, for the substring searches on SQLite. Postgres has trigram indexes.
+
+    The index of a process sees the rows updated by the other processes only once
+    rebuilt, see `SEARCH_NGRAM_INDEX`. It is built at startup, in the background
+    with `SEARCH_INDEX_BUILD_IN_BACKGROUND`."""
+    with app.app_context():
+        if db.engine.dialect.name != "sqlite":
+            return
+        indexes = {
+            model.__tablename__: NgramIndex(
+                model,
+                app.config["SEARCH_INDEX_MAX_AGE"],
+                app.config["SEARCH_INDEX_REFRESH_INTERVAL"],
+            )
+            for model in SEARCHABLE_MODELS
+        }
+        app.extensions["ngram_index"] = indexes
+        if app.config["SEARCH_INDEX_BUILD_IN_BACKGROUND"]:
+            for index in indexes.values():
+                index.build_in_background(app)
+            return
+        try:
+            for index in indexes.values():
+                index.build()
+        except sa.exc.DBAPIError as error:
+            # e.g. the tables are yet to be created, the first search builds them
+            app.logger.warning("Could not build the search indexes: %s", error)
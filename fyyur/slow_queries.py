@@ -0,0 +1,80 @@
+import re
+from typing import Any, Optional
+
+import sqlalchemy as sa
+from flask import Flask, has_request_context, request
+
+from fyyur.instrumentation import ExecutedStatement, observe_statements
+from fyyur.models import db
+
+# statements worth explaining, the others (DDL, PRAGMA, ...) have no plan
+EXPLAINABLE = re.compile(r"^\s*(SELECT|WITH|INSERT|UPDATE|DELETE)\b", re.IGNORECASE)
+
+# keep a log line readable when a statement has a lot of parameters
+MAX_PARAMETERS_LENGTH = 1000
+
+
+class SlowQueryLog:
+    """Log the statements running for longer than `threshold` seconds with their
+    parameters, the endpoint running them and their plan.
+
+    The plan is explained on a connection of its own, outside of the pool of the
+    app: the connection running the slow statement may be in the middle of a
+    transaction, and the pool may be exhausted."""
+
+    def __init__(self, app: Flask, engine: sa.Engine, threshold: float) -> None:
+        self.app = app
+        self.threshold = threshold
+        self.explain_engine: Optional[sa.Engine] = None
+        # a new connection to an in memory database would see another database
+        if engine.url.database not in (None, "", ":memory:"):
+            self.explain_engine = sa.create_engine(engine.url, poolclass=sa.pool.NullPool)
+
+    def __call__(self, executed: ExecutedStatement) -> None:
+        if executed.duration < self.threshold:
+            return
+
+        endpoint = request.endpoint if has_request_context() else None
+        plan = "\n".join(f"    {line}" for line in self.explain(executed))
+        self.app.logger.warning(
+            "slow query: %.1fms in %s\n%s\nparameters: %s\nplan:\n%s",
+            executed.duration * 1000,
+            endpoint or "no request",
+            executed.statement,
+            format_parameters(executed.parameters),
+            plan,
+        )
+
+    def explain(self, executed: ExecutedStatement) -> list[str]:
+        if self.explain_engine is None:
+            return ["not available for in memory databases"]
+        if executed.executemany:
+            return ["not available for executemany"]
+        if not EXPLAINABLE.match(executed.statement):
+            return ["not available for this statement"]
+
+        dialect = self.explain_engine.dialect.name
+        prefix = "EXPLAIN QUERY PLAN" if dialect == "sqlite" else "EXPLAIN"
+        try:
+            with self.explain_engine.connect() as connection:
+                rows = connection.exec_driver_sql(
+                    f"{prefix} {executed.statement}", executed.parameters
+                ).all()
+        except sa.exc.SQLAlchemyError as e:
+            return [f"EXPLAIN failed: {e}"]
+
+        # the last column holds the plan, the others are SQLite node ids
+        return [str(row[-1]) for row in rows]
+
+
+def format_parameters(parameters: Any) -> str:
+    text = repr(parameters)
+    if len(text) > MAX_PARAMETERS_LENGTH:
+        return text[:MAX_PARAMETERS_LENGTH] + "..."
+    return text
+
+
+def init_app(app: Flask) -> None:
+    with app.app_context():
+        engine = db.engine
+    observe_statements(app, SlowQueryLog(app, engine, app.config["SLOW_QUERY_THRESHOLD"]))
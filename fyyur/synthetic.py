@@ -0,0 +1,301 @@
+import math
+import random
+from collections import deque
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from functools import partial
+from itertools import accumulate
+from multiprocessing.pool import AsyncResult, Pool
+from typing import Any, Callable, Optional, TypeVar
+
+import sqlalchemy as sa
+
+from fyyur.genre_cache import genre_ids
+from fyyur.importer import IMPORT_KINDS, write_chunk, write_rows
+from fyyur.models import Show, db
+from fyyur.schema.base import State
+from fyyur.schema.genre import GenreEnum
+
+T = TypeVar("T")
+
+Entity = tuple[dict[str, Any], list[GenreEnum]]
+ShowSlot = tuple[int, int, datetime]
+
+# largest cities first, they get most of the venues and artists
+CITIES: list[tuple[str, State, int]] = [
+    ("New York", State.NY, 212),
+    ("Los Angeles", State.CA, 213),
+    ("Chicago", State.IL, 312),
+    ("Houston", State.TX, 713),
+    ("Phoenix", State.AZ, 602),
+    ("Philadelphia", State.PA, 215),
+    ("San Antonio", State.TX, 210),
+    ("San Diego", State.CA, 619),
+    ("Dallas", State.TX, 214),
+    ("Austin", State.TX, 512),
+    ("San Francisco", State.CA, 415),
+    ("Seattle", State.WA, 206),
+    ("Denver", State.CO, 303),
+    ("Nashville", State.TN, 615),
+    ("Boston", State.MA, 617),
+    ("Portland", State.OR, 503),
+    ("Las Vegas", State.NV, 702),
+    ("Detroit", State.MI, 313),
+    ("Memphis", State.TN, 901),
+    ("Atlanta", State.GA, 404),
+    ("Miami", State.FL, 305),
+    ("Minneapolis", State.MN, 612),
+    ("New Orleans", State.LA, 504),
+    ("Cleveland", State.OH, 216),
+    ("Pittsburgh", State.PA, 412),
+    ("Kansas City", State.MO, 816),
+    ("Salt Lake City", State.UT, 801),
+    ("Albuquerque", State.NM, 505),
+    ("Burlington", State.VT, 802),
+    ("Boise", State.ID, 208),
+]
+# Zipf-like skew of the city sizes
+CITY_WEIGHTS = list(accumulate(1 / rank**1.1 for rank in range(1, len(CITIES) + 1)))
+
+GENRE_WEIGHTS: dict[GenreEnum, float] = {
+    GenreEnum.RockNRoll: 14,
+    GenreEnum.Pop: 13,
+    GenreEnum.HipHop: 11,
+    GenreEnum.Alternative: 9,
+    GenreEnum.Electronic: 8,
+    GenreEnum.Jazz: 7,
+    GenreEnum.Country: 6,
+    GenreEnum.RAndB: 6,
+    GenreEnum.Folk: 5,
+    GenreEnum.Punk: 4,
+    GenreEnum.HeavyMetal: 4,
+    GenreEnum.Blues: 3,
+    GenreEnum.Soul: 3,
+    GenreEnum.Reggae: 2,
+    GenreEnum.Funk: 2,
+    GenreEnum.Classical: 2,
+    GenreEnum.Instrumental: 1,
+    GenreEnum.MusicalTheatre: 1,
+    GenreEnum.Other: 1,
+}
+GENRES = list(GENRE_WEIGHTS)
+GENRE_CUM_WEIGHTS = list(accumulate(GENRE_WEIGHTS.values()))
+
+ADJECTIVES = [
+    "Blue", "Golden", "Electric", "Velvet", "Rusty", "Silver", "Midnight", "Wild",
+    "Crimson", "Lucky", "Hollow", "Neon", "Broken", "Little", "Grand", "Painted",
+]  # fmt: skip
+NOUNS = [
+    "Moon", "Owl", "Lantern", "Garage", "River", "Anchor", "Fox", "Parlor",
+    "Tiger", "Harbor", "Crow", "Echo", "Orchard", "Whistle", "Mill", "Comet",
+]  # fmt: skip
+STREETS = ["Main", "Oak", "Mission", "Market", "Elm", "Broadway", "Church", "Pine"]
+
+# consecutive shows of a venue or an artist are at least this far apart, which is
+# more than the overlap window enforced by the database
+MIN_SHOW_GAP = timedelta(minutes=2)
+
+# strides used to rotate the venue and artist of each show slot
+VENUE_STRIDE = 7919
+ARTIST_STRIDE = 104729
+
+
+@dataclass(frozen=True)
+class DatasetSpec:
+    """Volumes and shape of a synthetic dataset. The same spec always generates the
+    same rows, whatever the number of processes."""
+
+    venues: int
+    artists: int
+    shows: int
+    seed: int = 0
+    # fraction of the shows starting before `origin`
+    past_ratio: float = 0.5
+    # shows are spread over this many days around `origin`
+    days: int = 730
+    origin: datetime = field(
+        default_factory=lambda: datetime.now().replace(minute=0, second=0, microsecond=0)
+    )
+    chunk_size: int = 10_000
+
+    def num_chunks(self, count: int) -> int:
+        return math.ceil(count / self.chunk_size)
+
+    def rng(self, kind: str, chunk: int) -> random.Random:
+        return random.Random(f"{self.seed}:{kind}:{chunk}")
+
+    def indices(self, count: int, chunk: int) -> range:
+        return range(chunk * self.chunk_size, min((chunk + 1) * self.chunk_size, count))
+
+
+def pick_genres(rng: random.Random) -> list[GenreEnum]:
+    count = rng.choices((1, 2, 3), weights=(5, 3, 2))[0]
+    genres: list[GenreEnum] = []
+    while len(genres) < count:
+        genre = rng.choices(GENRES, cum_weights=GENRE_CUM_WEIGHTS)[0]
+        if genre not in genres:
+            genres.append(genre)
+    return genres
+
+
+def common_columns(rng: random.Random, kind: str, index: int) -> dict[str, Any]:
+    city, state, area_code = rng.choices(CITIES, cum_weights=CITY_WEIGHTS)[0]
+    slug = f"{kind}-{index}"
+    return {
+        "city": city,
+        "state": state.value,
+        "phone": f"{area_code}-{rng.randrange(200, 1000)}-{rng.randrange(1000, 10000)}",
+        "image_link": f"https://images.example.com/{slug}.jpg",
+        "facebook_link": f"https://www.facebook.com/{slug}/",
+        "website_link": f"https://{slug}.example.com/",
+    }
+
+
+def venue_rows(spec: DatasetSpec, chunk: int) -> list[Entity]:
+    rng = spec.rng("venue", chunk)
+    rows: list[Entity] = []
+    for index in spec.indices(spec.venues, chunk):
+        seeking_talent = rng.random() < 0.3
+        row = {
+            "name": f"The {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}",
+            "address": f"{rng.randrange(1, 10000)} {rng.choice(STREETS)} Street",
+            **common_columns(rng, "venue", index),
+            "seeking_talent": seeking_talent,
+            "seeking_description": "Looking for local acts" if seeking_talent else None,
+        }
+        rows.append((row, pick_genres(rng)))
+    return rows
+
+
+def artist_rows(spec: DatasetSpec, chunk: int) -> list[Entity]:
+    rng = spec.rng("artist", chunk)
+    rows: list[Entity] = []
+    for index in spec.indices(spec.artists, chunk):
+        seeking_venue = rng.random() < 0.4
+        row = {
+            "name": f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}s",
+            **common_columns(rng, "artist", index),
+            "seeking_venue": seeking_venue,
+            "seeking_description": "Looking for shows" if seeking_venue else None,
+        }
+        rows.append((row, pick_genres(rng)))
+    return rows
+
+
+def show_rows(spec: DatasetSpec, chunk: int) -> list[ShowSlot]:
+    """(venue index, artist index, start time) of the shows of a chunk.
+
+    Shows are laid out in time slots holding at most one show per venue and per
+    artist, the shows of a slot start before the next slot minus `MIN_SHOW_GAP`.
+    No venue or artist ever has two overlapping shows, so the rows pass the
+    database overlap constraints without being checked one by one."""
+    rng = spec.rng("show", chunk)
+    per_slot = min(spec.venues, spec.artists)
+    num_slots = math.ceil(spec.shows / per_slot)
+    # in minutes
+    slot_length = max(
+        timedelta(days=spec.days) // num_slots // timedelta(minutes=1),
+        MIN_SHOW_GAP // timedelta(minutes=1) + 1,
+    )
+    first_slot = spec.origin - timedelta(
+        minutes=slot_length * round(num_slots * spec.past_ratio)
+    )
+
+    rows: list[ShowSlot] = []
+    for index in spec.indices(spec.shows, chunk):
+        slot, position = divmod(index, per_slot)
+        start_time = first_slot + timedelta(minutes=slot * slot_length)
+        rows.append(
+            (
+                (position + slot * VENUE_STRIDE) % spec.venues,
+                (position + slot * ARTIST_STRIDE) % spec.artists,
+                start_time + timedelta(minutes=rng.randrange(slot_length - 1)),
+            )
+        )
+    return rows
+
+
+def generate_chunks(
+    pool: Optional[Pool], generate: Callable[[int], T], num_chunks: int, ahead: int
+) -> Iterator[T]:
+    """Generate chunks in order, at most `ahead` chunks ahead of the consumer so
+    memory stays bounded when writing is slower than generating."""
+    if pool is None:
+        yield from map(generate, range(num_chunks))
+        return
+
+    pending: deque[AsyncResult[T]] = deque()
+    for chunk in range(num_chunks):
+        pending.append(pool.apply_async(generate, (chunk,)))
+        if len(pending) >= ahead:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def generate_dataset(
+    spec: DatasetSpec,
+    processes: int = 1,
+    on_progress: Optional[Callable[[str, int, int], None]] = None,
+) -> None:
+    """Generate the dataset described by `spec` with `processes` worker processes
+    and write it through the bulk insert path, one transaction per chunk.
+
+    Meant for an empty database, generated shows may overlap existing ones."""
+    pool = Pool(processes) if processes > 1 else None
+    ahead = 2 * processes
+    try:
+        ids: dict[str, list[int]] = {}
+        for kind, count, rows in (
+            ("venue", spec.venues, venue_rows),
+            ("artist", spec.artists, artist_rows),
+        ):
+            ids[kind] = []
+            num_chunks = spec.num_chunks(count)
+            chunks = generate_chunks(pool, partial(rows, spec), num_chunks, ahead)
+            for entities in chunks:
+                ids[kind] += commit_chunk(
+                    lambda: write_chunk(IMPORT_KINDS[kind], entities, genre_ids())
+                )
+                if on_progress is not None:
+                    on_progress(kind, len(ids[kind]), count)
+
+        if not (ids["venue"] and ids["artist"]):
+            return
+        done = 0
+        show_chunks = generate_chunks(
+            pool, partial(show_rows, spec), spec.num_chunks(spec.shows), ahead
+        )
+        for slots in show_chunks:
+            shows = [
+                {
+                    "venue_id": ids["venue"][venue],
+                    "artist_id": ids["artist"][artist],
+                    "start_time": start_time,
+                }
+                for venue, artist, start_time in slots
+            ]
+            commit_chunk(lambda: write_rows(Show.__table__, shows))
+            done += len(shows)
+            if on_progress is not None:
+                on_progress("show", done, spec.shows)
+
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+
+def commit_chunk(write: Callable[[], T]) -> T:
+    try:
+        result = write()
+        db.session.commit()
+        return result
+
+    except sa.exc.SQLAlchemyError:
+        db.session.rollback()
+        raise
+
+    finally:
+        db.session.close()
@@ -0,0 +1,48 @@
+"""Add show and genre indexes
+
+Revision ID: 5f1c2a9e7b3d
+Revises: 2d08f838d55a
+Create Date: 2026-10-18 10:12:41.318027
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5f1c2a9e7b3d"
+down_revision = "2d08f838d55a"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("Show", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_Show_venue_id_start_time", ["venue_id", "start_time"], unique=False
+        )
+        batch_op.create_index(
+            "ix_Show_artist_id_start_time", ["artist_id", "start_time"], unique=False
+        )
+        batch_op.create_index("ix_Show_start_time_id", ["start_time", "id"], unique=False)
+
+    with op.batch_alter_table("venue_genres", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_venue_genres_genre_id_venue_id", ["genre_id", "venue_id"], unique=False
+        )
+
+    with op.batch_alter_table("artist_genres", schema=None) as batch_op:
+        batch_op.create_index(
+            "ix_artist_genres_genre_id_artist_id", ["genre_id", "artist_id"], unique=False
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("artist_genres", schema=None) as batch_op:
+        batch_op.drop_index("ix_artist_genres_genre_id_artist_id")
+
+    with op.batch_alter_table("venue_genres", schema=None) as batch_op:
+        batch_op.drop_index("ix_venue_genres_genre_id_venue_id")
+
+    with op.batch_alter_table("Show", schema=None) as batch_op:
+        batch_op.drop_index("ix_Show_start_time_id")
+        batch_op.drop_index("ix_Show_artist_id_start_time")
+        batch_op.drop_index("ix_Show_venue_id_start_time")
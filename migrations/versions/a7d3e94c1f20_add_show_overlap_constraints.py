@@ -0,0 +1,71 @@
+"""Add show overlap constraints
+
+Revision ID: a7d3e94c1f20
+Revises: 5f1c2a9e7b3d
+Create Date: 2026-10-18 13:40:05.902114
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "a7d3e94c1f20"
+down_revision = "5f1c2a9e7b3d"
+branch_labels = None
+depends_on = None
+
+OWNERS = ("venue", "artist")
+SQLITE_EVENTS = {
+    "insert": "INSERT",
+    "update": "UPDATE OF venue_id, artist_id, start_time",
+}
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        op.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+        for owner in OWNERS:
+            op.execute(
+                f"""ALTER TABLE "Show" ADD CONSTRAINT show_{owner}_overlap
+                EXCLUDE USING gist (
+                    {owner}_id WITH =,
+                    tsrange(
+                        start_time - interval '30 seconds',
+                        start_time + interval '30 seconds',
+                        '[]'
+                    ) WITH &&
+                )"""
+            )
+
+    elif dialect == "sqlite":
+        for owner in OWNERS:
+            for name, event in SQLITE_EVENTS.items():
+                exclude_self = "AND id != NEW.id" if name == "update" else ""
+                op.execute(f"""CREATE TRIGGER show_{owner}_overlap_{name}
+                    BEFORE {event} ON "Show"
+                    WHEN EXISTS (
+                        SELECT 1 FROM "Show"
+                        WHERE {owner}_id = NEW.{owner}_id
+                        AND start_time BETWEEN datetime(NEW.start_time, '-61 seconds')
+                            AND datetime(NEW.start_time, '+61 seconds')
+                        AND abs(julianday(start_time) - julianday(NEW.start_time))
+                            * 86400 <= 60.001
+                        {exclude_self}
+                    )
+                    BEGIN
+                        SELECT RAISE(ABORT, 'show_{owner}_overlap');
+                    END""")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        for owner in OWNERS:
+            op.execute(f'ALTER TABLE "Show" DROP CONSTRAINT show_{owner}_overlap')
+
+    elif dialect == "sqlite":
+        for owner in OWNERS:
+            for name in SQLITE_EVENTS:
+                op.execute(f"DROP TRIGGER show_{owner}_overlap_{name}")
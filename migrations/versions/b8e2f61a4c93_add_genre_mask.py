@@ -0,0 +1,60 @@
+"""Add genre mask
+
+Revision ID: b8e2f61a4c93
+Revises: e5a9c0d47b12
+Create Date: 2026-10-18 19:02:13.574218
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "b8e2f61a4c93"
+down_revision = "e5a9c0d47b12"
+branch_labels = None
+depends_on = None
+
+# the genres in the order of `GenreEnum`, one bit each
+GENRES = (
+    "Alternative",
+    "Blues",
+    "Classical",
+    "Country",
+    "Electronic",
+    "Folk",
+    "Funk",
+    "Hip-Hop",
+    "Heavy Metal",
+    "Instrumental",
+    "Jazz",
+    "Musical Theatre",
+    "Pop",
+    "Punk",
+    "R&B",
+    "Reggae",
+    "Rock n Roll",
+    "Soul",
+    "Other",
+)
+OWNERS = {"Venue": ("venue_genres", "venue_id"), "Artist": ("artist_genres", "artist_id")}
+
+
+def upgrade():
+    bits = " ".join(f"WHEN '{genre}' THEN {1 << bit}" for bit, genre in enumerate(GENRES))
+    for table, (genres_table, foreign_key) in OWNERS.items():
+        op.add_column(
+            table,
+            sa.Column("genre_mask", sa.Integer(), nullable=False, server_default="0"),
+        )
+        # each genre once per row, summing the bits is or-ing them
+        op.execute(f"""UPDATE "{table}" SET genre_mask = (
+            SELECT coalesce(sum(CASE "Genre".name {bits} ELSE 0 END), 0)
+            FROM {genres_table} JOIN "Genre" ON "Genre".id = {genres_table}.genre_id
+            WHERE {genres_table}.{foreign_key} = "{table}".id
+        )""")
+
+
+def downgrade():
+    for table in OWNERS:
+        # not batched: recreating the table would drop the search triggers
+        op.drop_column(table, "genre_mask")
@@ -0,0 +1,90 @@
+"""Add full text search
+
+Revision ID: c3f81b6d2e47
+Revises: a7d3e94c1f20
+Create Date: 2026-10-18 18:05:21.440913
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c3f81b6d2e47"
+down_revision = "a7d3e94c1f20"
+branch_labels = None
+depends_on = None
+
+# fields of the documents, and the columns concatenated into each field
+DOCUMENTS = {
+    "Venue": {"name": ("name",), "location": ("city", "state")},
+    "Artist": {"name": ("name",)},
+}
+WEIGHTS = ("A", "B", "C", "D")
+
+
+def field(columns, row=""):
+    return " || ', ' || ".join(f"{row}{column}" for column in columns)
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        for table, fields in DOCUMENTS.items():
+            vector = " || ".join(
+                f"setweight(to_tsvector('simple', {field(columns)}), '{weight}')"
+                for columns, weight in zip(fields.values(), WEIGHTS)
+            )
+            op.execute(f"""ALTER TABLE "{table}" ADD COLUMN search_vector tsvector
+                GENERATED ALWAYS AS ({vector}) STORED""")
+            op.execute(f"""CREATE INDEX ix_{table}_search_vector ON "{table}"
+                USING gin (search_vector)""")
+
+    elif dialect == "sqlite":
+        for table, fields in DOCUMENTS.items():
+            search_table = f"{table.lower()}_search"
+            names = ", ".join(fields)
+            values = ", ".join(field(columns, "NEW.") for columns in fields.values())
+            assignments = ", ".join(
+                f"{name} = {field(columns, 'NEW.')}" for name, columns in fields.items()
+            )
+            columns = ", ".join(c for columns in fields.values() for c in columns)
+
+            op.execute(f"""CREATE VIRTUAL TABLE {search_table} USING fts5(
+                {names}, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+            )""")
+            op.execute(f"""INSERT INTO {search_table} (rowid, {names})
+                SELECT id, {", ".join(field(c) for c in fields.values())}
+                FROM "{table}"
+            """)
+            op.execute(f"""CREATE TRIGGER {search_table}_insert
+                AFTER INSERT ON "{table}"
+                BEGIN
+                    INSERT INTO {search_table} (rowid, {names})
+                    VALUES (NEW.id, {values});
+                END""")
+            op.execute(f"""CREATE TRIGGER {search_table}_update
+                AFTER UPDATE OF {columns} ON "{table}"
+                BEGIN
+                    UPDATE {search_table} SET {assignments} WHERE rowid = OLD.id;
+                END""")
+            op.execute(f"""CREATE TRIGGER {search_table}_delete
+                AFTER DELETE ON "{table}"
+                BEGIN
+                    DELETE FROM {search_table} WHERE rowid = OLD.id;
+                END""")
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        for table in DOCUMENTS:
+            op.execute(f"DROP INDEX ix_{table}_search_vector")
+            op.execute(f'ALTER TABLE "{table}" DROP COLUMN search_vector')
+
+    elif dialect == "sqlite":
+        for table in DOCUMENTS:
+            search_table = f"{table.lower()}_search"
+            for event in ("insert", "update", "delete"):
+                op.execute(f"DROP TRIGGER {search_table}_{event}")
+            op.execute(f"DROP TABLE {search_table}")
@@ -0,0 +1,44 @@
+"""Add trigram indexes
+
+Revision ID: e5a9c0d47b12
+Revises: c3f81b6d2e47
+Create Date: 2026-10-18 18:31:52.207685
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e5a9c0d47b12"
+down_revision = "c3f81b6d2e47"
+branch_labels = None
+depends_on = None
+
+# fields of the documents, and the columns concatenated into each field
+DOCUMENTS = {
+    "Venue": {"name": ("name",), "location": ("city", "state")},
+    "Artist": {"name": ("name",)},
+}
+
+
+def upgrade():
+    # SQLite has no trigram index, the app keeps an n-gram index in process
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for table, fields in DOCUMENTS.items():
+        for name, columns in fields.items():
+            field = " || ', ' || ".join(columns)
+            op.execute(
+                f"""CREATE INDEX ix_{table}_{name}_trgm ON "{table}"
+                USING gin (({field}) gin_trgm_ops)"""
+            )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "postgresql":
+        return
+
+    for table, fields in DOCUMENTS.items():
+        for name in fields:
+            op.execute(f"DROP INDEX ix_{table}_{name}_trgm")
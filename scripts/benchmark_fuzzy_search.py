@@ -0,0 +1,141 @@
+"""Time the fuzzy searches of the n-gram index over the names and locations of a
+synthetic dataset, and check them against a latency budget.
+
+    python -m scripts.benchmark_fuzzy_search --venues 500000 --artists 500000
+
+The index is built in memory from the rows of the generator, without a database.
+The search terms are generated names and cities with a typo, and the words most
+of the rows share. Exits with an error when a percentile of a table is over the
+budget.
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+from typing import Any, Callable, Union
+
+from fyyur.models import Artist, Venue
+from fyyur.search import FUZZY_LIMIT, FUZZY_THRESHOLD, NgramIndex, document_strings
+from fyyur.synthetic import (
+    ADJECTIVES,
+    CITIES,
+    NOUNS,
+    DatasetSpec,
+    Entity,
+    artist_rows,
+    venue_rows,
+)
+
+# words held by most of the generated rows
+COMMON_TERMS = ["the", "new", "san", "on", "s"]
+
+
+def build_index(
+    model: Union[type[Venue], type[Artist]],
+    spec: DatasetSpec,
+    count: int,
+    rows: Callable[[DatasetSpec, int], list[Entity]],
+) -> NgramIndex:
+    index = NgramIndex(model)
+    table = model.__tablename__
+    with index.lock:
+        id = 0
+        for chunk in range(spec.num_chunks(count)):
+            for row, _ in rows(spec, chunk):
+                id += 1
+                index.apply(table, id, document_strings(table, SimpleNamespace(**row)))
+        index.built = True
+        index.built_at = index.refreshed_at = time.monotonic()
+    return index
+
+
+def typo(rng: random.Random, term: str) -> str:
+    """`term` with a character dropped, doubled or swapped with the next one."""
+    i = rng.randrange(len(term) - 1)
+    return rng.choice(
+        [
+            term[:i] + term[i + 1 :],
+            term[:i] + term[i] + term[i:],
+            term[:i] + term[i + 1] + term[i] + term[i + 2 :],
+        ]
+    )
+
+
+def search_terms(rng: random.Random, count: int) -> list[str]:
+    terms = list(COMMON_TERMS)
+    while len(terms) < count:
+        adjective, noun = rng.choice(ADJECTIVES), rng.choice(NOUNS)
+        city = rng.choice(CITIES)[0]
+        terms.append(typo(rng, rng.choice([f"{adjective} {noun}", noun, city])))
+    return terms
+
+
+def time_searches(index: NgramIndex, terms: list[str], repeat: int) -> list[float]:
+    """Best of `repeat` timings of the search of each term, in milliseconds."""
+    timings = []
+    for term in terms:
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            index.similar(term, FUZZY_THRESHOLD, FUZZY_LIMIT)
+            best = min(best, time.perf_counter() - started)
+        timings.append(best * 1000)
+    return timings
+
+
+def run_benchmark(
+    venues: int, artists: int, num_terms: int = 200, repeat: int = 3, seed: int = 0
+) -> dict[str, dict[str, Any]]:
+    """Percentiles of the fuzzy searches of each table in milliseconds, with the
+    build time in seconds and the slowest term."""
+    spec = DatasetSpec(venues=venues, artists=artists, shows=0, seed=seed)
+    terms = search_terms(random.Random(seed), num_terms)
+    report = {}
+    for model, count, rows in (
+        (Venue, venues, venue_rows),
+        (Artist, artists, artist_rows),
+    ):
+        started = time.perf_counter()
+        index = build_index(model, spec, count, rows)
+        build = time.perf_counter() - started
+        timings = time_searches(index, terms, repeat)
+        ranked = sorted(timings)
+        report[model.__tablename__] = {
+            "rows": count,
+            "build_s": build,
+            "p50_ms": statistics.median(ranked),
+            "p99_ms": ranked[min(len(ranked) - 1, int(len(ranked) * 0.99))],
+            "max_ms": ranked[-1],
+            "slowest": terms[timings.index(ranked[-1])],
+        }
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--venues", type=int, default=500_000)
+    parser.add_argument("--artists", type=int, default=500_000)
+    parser.add_argument("--terms", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--budget-ms", type=float, default=5.0, help="p99 per search")
+    args = parser.parse_args()
+
+    report = run_benchmark(args.venues, args.artists, args.terms, args.repeat, args.seed)
+    over = False
+    for table, stats in report.items():
+        print(
+            f"{table}: {stats['rows']} rows built in {stats['build_s']:.1f}s, "
+            f"p50 {stats['p50_ms']:.2f}ms p99 {stats['p99_ms']:.2f}ms "
+            f"max {stats['max_ms']:.2f}ms ({stats['slowest']!r})"
+        )
+        over = over or stats["p99_ms"] > args.budget_ms
+    if over:
+        sys.exit(f"over the budget of {args.budget_ms}ms")
+
+
+if __name__ == "__main__":
+    main()
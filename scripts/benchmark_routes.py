@@ -0,0 +1,352 @@
+"""Time every page of the app against a synthetic dataset and report latency
+percentiles, SQL statement count and peak memory per endpoint.
+
+    python -m scripts.benchmark_routes --venues 10000 --artists 50000 --shows 1000000
+
+Seeds a throwaway SQLite database by default, pass `--database-url` to use another
+database instead (seeded with `flask fyyur generate` if it is empty). Results are
+written as JSON, pass the file of a previous run as `--baseline` to compare.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from collections.abc import Iterator
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from typing import Any, Callable, Optional
+from urllib.parse import urlsplit
+
+import sqlalchemy as sa
+from flask import Flask
+from flask.testing import FlaskClient
+
+from fyyur import create_app
+from fyyur.config import Config
+from fyyur.constant import DATETIME_FORMAT
+from fyyur.models import Artist, Show, Venue, db
+from fyyur.schema.genre import GenreEnum
+from fyyur.synthetic import ADJECTIVES, NOUNS, DatasetSpec, generate_dataset
+
+# url, form data (None for GET) and path the request should redirect to
+Request = tuple[str, Optional[dict[str, Any]], Optional[str]]
+
+
+@dataclass(frozen=True)
+class Case:
+    endpoint: str
+    make_request: Callable[[random.Random, int], Request]
+
+
+@dataclass
+class EndpointResult:
+    requests: int
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    mean_ms: float
+    statements: float
+    max_statements: int
+    peak_memory_kb: float
+    failures: int
+
+
+def benchmark_config(database_url: str) -> type[Config]:
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = database_url
+        WTF_CSRF_ENABLED = False
+
+    return BenchmarkConfig
+
+
+def form_data(entity: dict[str, Any]) -> dict[str, Any]:
+    # unchecked checkboxes are not submitted
+    return {key: value for key, value in entity.items() if value not in (None, False)}
+
+
+def venue_form(rng: random.Random, index: int) -> dict[str, Any]:
+    return {
+        "name": f"Benchmark Venue {index}",
+        "city": "San Francisco",
+        "state": "CA",
+        "address": f"{index} Folsom Street",
+        "phone": "415-555-0100",
+        "genres": [genre.value for genre in rng.sample(list(GenreEnum), 2)],
+        "image_link": f"https://images.example.com/benchmark-venue-{index}.jpg",
+        "facebook_link": f"https://www.facebook.com/benchmark-venue-{index}/",
+        "website_link": f"https://benchmark-venue-{index}.example.com/",
+        "seeking_talent": "y",
+        "seeking_description": "Looking for benchmarks",
+    }
+
+
+def artist_form(rng: random.Random, index: int) -> dict[str, Any]:
+    return {
+        "name": f"Benchmark Artist {index}",
+        "city": "San Francisco",
+        "state": "CA",
+        "phone": "415-555-0101",
+        "genres": [genre.value for genre in rng.sample(list(GenreEnum), 2)],
+        "image_link": f"https://images.example.com/benchmark-artist-{index}.jpg",
+        "facebook_link": f"https://www.facebook.com/benchmark-artist-{index}/",
+        "website_link": f"https://benchmark-artist-{index}.example.com/",
+    }
+
+
+def cases(spec: DatasetSpec) -> list[Case]:
+    venue_ids: list[int] = list(db.session.scalars(sa.select(Venue.id)))
+    artist_ids: list[int] = list(db.session.scalars(sa.select(Artist.id)))
+    # new shows start after the generated ones, one slot per request
+    first_new_show = datetime.now() + timedelta(days=spec.days + 1)
+
+    def search(rng: random.Random) -> dict[str, Any]:
+        return {"search_term": rng.choice(ADJECTIVES + NOUNS).lower()}
+
+    def edit_venue(rng: random.Random, index: int) -> Request:
+        venue_id = rng.choice(venue_ids)
+        venue = db.session.get(Venue, venue_id)
+        assert venue is not None
+        data = form_data(venue.venue_in_form.model_dump(mode="json"))
+        return f"/venues/{venue_id}/edit", data, f"/venues/{venue_id}"
+
+    def edit_artist(rng: random.Random, index: int) -> Request:
+        artist_id = rng.choice(artist_ids)
+        artist = db.session.get(Artist, artist_id)
+        assert artist is not None
+        data = form_data(artist.artist_in_form.model_dump(mode="json"))
+        return f"/artists/{artist_id}/edit", data, f"/artists/{artist_id}"
+
+    def create_show(rng: random.Random, index: int) -> Request:
+        start_time = first_new_show + timedelta(minutes=5 * index)
+        data = {
+            "venue_id": rng.choice(venue_ids),
+            "artist_id": rng.choice(artist_ids),
+            "start_time": start_time.strftime(DATETIME_FORMAT),
+        }
+        return "/shows/create", data, "/"
+
+    return [
+        Case("index", lambda rng, i: ("/", None, None)),
+        Case("venue.venues", lambda rng, i: ("/venues/", None, None)),
+        Case("venue.search_venues", lambda rng, i: ("/venues/search", search(rng), None)),
+        Case(
+            "venue.show_venue",
+            lambda rng, i: (f"/venues/{rng.choice(venue_ids)}", None, None),
+        ),
+        Case("venue.create_venue_form", lambda rng, i: ("/venues/create", None, None)),
+        Case(
+            "venue.create_venue_submission",
+            lambda rng, i: ("/venues/create", venue_form(rng, i), "/"),
+        ),
+        Case(
+            "venue.edit_venue",
+            lambda rng, i: (f"/venues/{rng.choice(venue_ids)}/edit", None, None),
+        ),
+        Case("venue.edit_venue_submission", edit_venue),
+        Case("artist.artists", lambda rng, i: ("/artists/", None, None)),
+        Case(
+            "artist.search_artists",
+            lambda rng, i: ("/artists/search", search(rng), None),
+        ),
+        Case(
+            "artist.show_artist",
+            lambda rng, i: (f"/artists/{rng.choice(artist_ids)}", None, None),
+        ),
+        Case("artist.create_artist_form", lambda rng, i: ("/artists/create", None, None)),
+        Case(
+            "artist.create_artist_submission",
+            lambda rng, i: ("/artists/create", artist_form(rng, i), "/"),
+        ),
+        Case(
+            "artist.edit_artist",
+            lambda rng, i: (f"/artists/{rng.choice(artist_ids)}/edit", None, None),
+        ),
+        Case("artist.edit_artist_submission", edit_artist),
+        Case("show.shows", lambda rng, i: ("/shows/", None, None)),
+        Case("show.create_shows", lambda rng, i: ("/shows/create", None, None)),
+        Case("show.create_show_submission", create_show),
+    ]
+
+
+@contextmanager
+def count_statements() -> Iterator[list[int]]:
+    counter = [0]
+
+    def before_cursor_execute(*args: Any) -> None:
+        counter[0] += 1
+
+    sa.event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        sa.event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    """Nearest-rank percentile."""
+    return sorted_values[max(math.ceil(p / 100 * len(sorted_values)) - 1, 0)]
+
+
+def send(client: FlaskClient, request: Request) -> bool:
+    url, data, redirect_to = request
+    if data is None:
+        response = client.get(url)
+    else:
+        response = client.post(url, data=data)
+    if redirect_to is not None:
+        return urlsplit(response.location or "").path == redirect_to
+    return response.status_code == 200
+
+
+def run_case(
+    app: Flask, case: Case, num_requests: int, memory_requests: int, seed: int
+) -> EndpointResult:
+    client = app.test_client()
+    rng = random.Random(f"{seed}:{case.endpoint}")
+
+    latencies: list[float] = []
+    statements: list[int] = []
+    failures = 0
+    for i in range(num_requests):
+        with app.app_context():
+            request = case.make_request(rng, i)
+            with count_statements() as counter:
+                start = time.perf_counter()
+                failures += not send(client, request)
+                latencies.append((time.perf_counter() - start) * 1000)
+            statements.append(counter[0])
+
+    # tracing allocations slows requests down, measure memory in a separate pass
+    peak_memory = 0
+    tracemalloc.start()
+    try:
+        for i in range(num_requests, num_requests + memory_requests):
+            with app.app_context():
+                request = case.make_request(rng, i)
+                tracemalloc.reset_peak()
+                baseline = tracemalloc.get_traced_memory()[0]
+                failures += not send(client, request)
+                peak_memory = max(
+                    peak_memory, tracemalloc.get_traced_memory()[1] - baseline
+                )
+    finally:
+        tracemalloc.stop()
+
+    latencies.sort()
+    return EndpointResult(
+        requests=num_requests,
+        p50_ms=round(percentile(latencies, 50), 3),
+        p95_ms=round(percentile(latencies, 95), 3),
+        p99_ms=round(percentile(latencies, 99), 3),
+        mean_ms=round(statistics.fmean(latencies), 3),
+        statements=statistics.median(statements),
+        max_statements=max(statements),
+        peak_memory_kb=round(peak_memory / 1024, 1),
+        failures=failures,
+    )
+
+
+def run_benchmarks(
+    app: Flask,
+    spec: DatasetSpec,
+    num_requests: int,
+    memory_requests: int,
+    processes: int = 1,
+    endpoints: Optional[list[str]] = None,
+) -> dict[str, Any]:
+    with app.app_context():
+        db.create_all()
+        counts = Counter(
+            {
+                model.__name__: db.session.scalars(
+                    sa.select(sa.func.count()).select_from(model)
+                ).one()
+                for model in (Venue, Artist, Show)
+            }
+        )
+        if not counts["Venue"]:
+            generate_dataset(spec, processes=processes)
+            counts = Counter(Venue=spec.venues, Artist=spec.artists, Show=spec.shows)
+        all_cases = cases(spec)
+        dialect = db.engine.dialect.name
+
+    results = {
+        case.endpoint: asdict(
+            run_case(app, case, num_requests, memory_requests, spec.seed)
+        )
+        for case in all_cases
+        if not endpoints or case.endpoint in endpoints
+    }
+    return {
+        "dataset": {"dialect": dialect, **counts},
+        "python": platform.python_version(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "endpoints": results,
+    }
+
+
+def print_report(report: dict[str, Any], baseline: Optional[dict[str, Any]]) -> None:
+    print(json.dumps(report["dataset"]))
+    print(f"{'endpoint':34} {'p50':>8} {'p95':>8} {'p99':>8} {'stmts':>6} {'peak kB':>9}")
+    for endpoint, result in report["endpoints"].items():
+        line = (
+            f"{endpoint:34} {result['p50_ms']:8.2f} {result['p95_ms']:8.2f} "
+            f"{result['p99_ms']:8.2f} {result['statements']:6g} "
+            f"{result['peak_memory_kb']:9.1f}"
+        )
+        previous = (baseline or {}).get("endpoints", {}).get(endpoint)
+        if previous:
+            line += f"  p95 x{result['p95_ms'] / previous['p95_ms']:.2f}"
+            line += f" stmts {previous['statements']:g}->{result['statements']:g}"
+        if result["failures"]:
+            line += f"  {result['failures']} failed"
+        print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--venues", type=int, default=2_000)
+    parser.add_argument("--artists", type=int, default=10_000)
+    parser.add_argument("--shows", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--requests", type=int, default=50, help="timed per endpoint")
+    parser.add_argument("--memory-requests", type=int, default=5)
+    parser.add_argument("--endpoint", action="append", help="only run these endpoints")
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--baseline", type=argparse.FileType("r"), default=None)
+    args = parser.parse_args()
+    # read before `--output` may overwrite it
+    baseline = json.load(args.baseline) if args.baseline else None
+
+    spec = DatasetSpec(
+        venues=args.venues, artists=args.artists, shows=args.shows, seed=args.seed
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url or f"sqlite:///{tmp}/benchmark.db"
+        app = create_app(benchmark_config(database_url))
+        report = run_benchmarks(
+            app,
+            spec,
+            num_requests=max(args.requests, 1),
+            memory_requests=args.memory_requests,
+            processes=args.processes,
+            endpoints=args.endpoint,
+        )
+
+    with open(args.output, "w") as output:
+        json.dump(report, output, indent=2)
+    print_report(report, baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""Compare query plans and timings of the hot show queries with and without the
+secondary indexes on `Show`, `venue_genres` and `artist_genres`.
+
+    python -m scripts.explain_show_indexes --venues 2000 --artists 10000 --shows 500000
+
+Runs against a throwaway SQLite database by default, pass `--database-url` to use
+another (empty) database instead.
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable
+
+import sqlalchemy as sa
+
+from fyyur.models import Artist, Genre, Show, Venue, artist_genre, db, venue_genre
+from fyyur.schema.genre import GenreEnum
+
+INDEXED_TABLES = [Show.__table__, venue_genre, artist_genre]
+
+
+def seed(
+    connection: sa.Connection, num_venues: int, num_artists: int, num_shows: int
+) -> None:
+    rng = random.Random(0)
+    now = datetime.now().replace(microsecond=0)
+
+    connection.execute(
+        sa.insert(Genre), [{"id": i, "name": g.value} for i, g in enumerate(GenreEnum, 1)]
+    )
+    for model, count in ((Venue, num_venues), (Artist, num_artists)):
+        rows: list[dict[str, Any]] = [
+            {
+                "id": i,
+                "name": f"{model.__name__}{i}",
+                "city": "San Francisco",
+                "state": "CA",
+                "create_date": now,
+                **({"address": f"{i} Folsom Street"} if model is Venue else {}),
+            }
+            for i in range(1, count + 1)
+        ]
+        connection.execute(sa.insert(model), rows)
+
+    for table, key, count in (
+        (venue_genre, "venue_id", num_venues),
+        (artist_genre, "artist_id", num_artists),
+    ):
+        connection.execute(
+            sa.insert(table),
+            [
+                {key: i, "genre_id": genre_id}
+                for i in range(1, count + 1)
+                for genre_id in rng.sample(range(1, len(GenreEnum) + 1), 3)
+            ],
+        )
+
+    # one show per slot so the rows satisfy the overlap rules of `insert_show`
+    batch: list[dict[str, Any]] = []
+    for i in range(num_shows):
+        batch.append(
+            {
+                "venue_id": rng.randint(1, num_venues),
+                "artist_id": rng.randint(1, num_artists),
+                "start_time": now + timedelta(minutes=2 * (i - num_shows // 2)),
+            }
+        )
+        if len(batch) == 10_000:
+            connection.execute(sa.insert(Show), batch)
+            batch = []
+    if batch:
+        connection.execute(sa.insert(Show), batch)
+
+
+def hot_queries(now: datetime) -> dict[str, sa.Select[Any]]:
+    offset = timedelta(minutes=1)
+    return {
+        "venue page shows": sa.select(Show.artist_id, Show.start_time)
+        .where(Show.venue_id == 42)
+        .order_by(Show.start_time),
+        "artist page shows": sa.select(Show.venue_id, Show.start_time)
+        .where(Show.artist_id == 42)
+        .order_by(Show.start_time),
+        "upcoming shows count": sa.select(Venue.id, Venue.upcoming_shows_count).where(
+            Venue.id < 50
+        ),
+        "insert_show conflict scan": sa.select(Show.id)
+        .where(Show.start_time >= now - offset, Show.start_time <= now + offset)
+        .where(sa.or_(Show.artist_id == 42, Show.venue_id == 42))
+        .limit(1),
+        "shows page": sa.select(Show.id)
+        .where(sa.tuple_(Show.start_time, Show.id) > (now, 0))
+        .order_by(Show.start_time, Show.id)
+        .limit(30),
+        "venues of a genre": sa.select(venue_genre.c.venue_id).where(
+            venue_genre.c.genre_id == 3
+        ),
+    }
+
+
+def explain(connection: sa.Connection, query: sa.Select[Any]) -> list[str]:
+    compiled = query.compile(connection, compile_kwargs={"literal_binds": True})
+    prefix = "EXPLAIN QUERY PLAN" if connection.dialect.name == "sqlite" else "EXPLAIN"
+    rows = connection.exec_driver_sql(f"{prefix} {compiled}").all()
+    return [str(row[-1]) for row in rows]
+
+
+def timeit(run: Callable[[], Any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def report(connection: sa.Connection, repeat: int) -> dict[str, tuple[list[str], float]]:
+    now = datetime.now()
+    return {
+        name: (
+            explain(connection, query),
+            timeit(lambda: connection.execute(query).all(), repeat),
+        )
+        for name, query in hot_queries(now).items()
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--database-url", default="sqlite://")
+    parser.add_argument("--venues", type=int, default=2_000)
+    parser.add_argument("--artists", type=int, default=10_000)
+    parser.add_argument("--shows", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    engine = sa.create_engine(args.database_url)
+    db.metadata.create_all(engine)
+    try:
+        with engine.begin() as connection:
+            seed(connection, args.venues, args.artists, args.shows)
+
+        indexes = [index for table in INDEXED_TABLES for index in table.indexes]
+        with engine.begin() as connection:
+            for index in indexes:
+                index.drop(connection)
+            without_indexes = report(connection, args.repeat)
+            for index in indexes:
+                index.create(connection)
+            with_indexes = report(connection, args.repeat)
+    finally:
+        db.metadata.drop_all(engine)
+
+    for name, (plan_before, ms_before) in without_indexes.items():
+        plan_after, ms_after = with_indexes[name]
+        print(f"== {name}: {ms_before:.2f}ms -> {ms_after:.2f}ms")
+        print("   without indexes:")
+        print("\n".join(f"     {line}" for line in plan_before))
+        print("   with indexes:")
+        print("\n".join(f"     {line}" for line in plan_after))
+
+
+if __name__ == "__main__":
+    main()
@@ -11,13 +11,12 @@ from fyyur.models import db
 from tests.mock import insert_mock_data
 
 
-@pytest.fixture()
-def app() -> Iterator[Flask]:
-    test_app = create_app(TestingConfig)
+def make_app(config: type[TestingConfig]) -> Iterator[Flask]:
+    # before the app starts, its startup connects to the database
+    if os.path.exists(config.TEST_DB_PATH):
+        os.remove(config.TEST_DB_PATH)
 
-    test_db_path = test_app.config["TEST_DB_PATH"]
-    if os.path.exists(test_db_path):
-        os.remove(test_db_path)
+    test_app = create_app(config)
 
     with test_app.app_context():
         db.create_all()
@@ -31,6 +30,11 @@ def app() -> Iterator[Flask]:
         db.drop_all()
 
 
+@pytest.fixture()
+def app() -> Iterator[Flask]:
+    yield from make_app(TestingConfig)
+
+
 @pytest.fixture()
 def client(app: Flask) -> FlaskClient:
     return app.test_client()
@@ -7,10 +7,10 @@ from flask.testing import FlaskClient
 from fyyur.models import Artist, Genre, Show, db
 from fyyur.routes.artist import find_artists, get_artist_info, get_artists
 from fyyur.schema.artist import ArtistInfoResponse
-from fyyur.schema.base import SearchSchema
+from fyyur.schema.base import SearchMode, SearchSchema
 from fyyur.schema.genre import GenreEnum
 from tests.mock import mock_artist, mock_show
-from tests.utils import date_future, date_past
+from tests.utils import count_queries, date_future, date_past
 
 
 def test_get_artists(app: Flask) -> None:
@@ -86,6 +86,37 @@ def test_find_artists_with_past_shows(app: Flask) -> None:
         assert artists_data == [{"id": 10, "name": "King", "num_upcoming_shows": 1}]
 
 
+def test_find_artists_full_text(app: Flask, client: FlaskClient) -> None:
+    with app.app_context():
+        db.session.add(mock_artist(id=10, name="The Wild Sax Band").to_orm(Artist))
+        db.session.add(mock_artist(id=11, name="Sax & Sax").to_orm(Artist))
+        db.session.commit()
+
+        def search(search_term: str) -> list[int]:
+            return [
+                artist.id
+                for artist in find_artists(
+                    SearchSchema(search_term=search_term, mode=SearchMode.FULL_TEXT)
+                )
+            ]
+
+        assert search("band wild") == [10]
+        assert search("and") == []
+        # more occurrences of the word rank first
+        assert search("sax") == [11, 10]
+        assert search("artist") == [1, 2, 3, 4]
+
+        artist = db.session.get(Artist, 11)
+        assert artist is not None
+        artist.name = "Brass & Brass"
+        db.session.commit()
+        assert search("sax") == [10]
+
+    response = client.post("/artists/search", data={"search_term": "wild"})
+    assert response.status_code == 200
+    assert b"The Wild Sax Band" in response.data
+
+
 @pytest.mark.parametrize(
     "artist_id, expected_artist_data",
     [
@@ -127,7 +158,7 @@ def test_find_artists_with_past_shows(app: Flask) -> None:
             {
                 "id": 2,
                 "name": "Artist2",
-                "genres": ["Jazz", "Rock n Roll", "Pop"],
+                "genres": ["Jazz", "Pop", "Rock n Roll"],
                 "city": "San Francisco",
                 "state": "CA",
                 "phone": "326-123-5000",
@@ -313,6 +344,7 @@ def test_update_artist_basic(app: Flask, client: FlaskClient) -> None:
         # Folk exist now
         assert len(updated_artist.genres) == 1
         assert updated_artist.genres[0].name == GenreEnum.Folk.value
+        assert updated_artist.genre_enums == [GenreEnum.Folk]
 
 
 def test_update_non_existing_artist(app: Flask, client: FlaskClient) -> None:
@@ -337,3 +369,73 @@ def test_edit_artist_request(client: FlaskClient) -> None:
 
     response = client.get("/artists/100/edit")
     assert response.status_code == 404
+
+
+def test_find_artists_queries_do_not_grow_with_shows(app: Flask) -> None:
+    with app.app_context():
+        with count_queries() as statements:
+            find_artists(SearchSchema(search_term="Artist", mode=SearchMode.FULL_TEXT))
+        num_statements = len(statements)
+
+        for artist_id in range(10, 15):
+            db.session.add(mock_artist(id=artist_id).to_orm(Artist))
+            # shift every artist's shows so venue 1 never hosts two at once
+            shift = 50 * (artist_id - 10)
+            for day_offset in (
+                -20 - shift,
+                -10 - shift,
+                10 + shift,
+                20 + shift,
+                30 + shift,
+            ):
+                db.session.add(
+                    mock_show(
+                        venue_id=1, artist_id=artist_id, day_offset=day_offset
+                    ).to_orm(Show)
+                )
+        db.session.commit()
+
+        with count_queries() as statements:
+            artists = find_artists(
+                SearchSchema(search_term="Artist", mode=SearchMode.FULL_TEXT)
+            )
+        assert len(statements) == num_statements
+
+        artist = next(artist for artist in artists if artist.id == 10)
+        assert artist.num_upcoming_shows == 3
+
+
+def test_artist_show_hybrids_in_sql(app: Flask) -> None:
+    with app.app_context():
+        artists_with_upcoming_shows = (
+            db.session.query(Artist.id, Artist.upcoming_shows_count)
+            .filter(Artist.has_upcoming_shows)
+            .order_by(Artist.upcoming_shows_count.desc(), Artist.id)
+            .all()
+        )
+        artists_with_past_shows = (
+            db.session.query(Artist.id, Artist.past_shows_count)
+            .filter(Artist.has_past_shows)
+            .all()
+        )
+
+        assert artists_with_upcoming_shows == [(1, 2), (2, 1), (3, 1)]
+        assert artists_with_past_shows == [(4, 1)]
+
+
+def test_get_artist_info_query_budget(app: Flask) -> None:
+    with app.app_context():
+        for day_offset in (-30, -20, 20, 30):
+            db.session.add(
+                mock_show(venue_id=3, artist_id=3, day_offset=day_offset).to_orm(Show)
+            )
+        db.session.commit()
+
+        with count_queries() as statements:
+            artist_info = get_artist_info(artist_id=3)
+        assert len(statements) <= 2
+
+        assert artist_info is not None
+        assert artist_info.genres == [GenreEnum.Pop]
+        assert artist_info.past_shows_count == 2
+        assert artist_info.upcoming_shows_count == 3
@@ -0,0 +1,118 @@
+import sqlalchemy as sa
+from flask import Flask
+from flask.testing import FlaskClient
+
+from fyyur.importer import import_records
+from fyyur.models import Artist, Venue, db
+from fyyur.search import PrefixIndex, autocomplete_index
+from tests.mock import mock_artist, mock_venue
+from tests.utils import count_queries
+
+
+def completions(client: FlaskClient, q: str, limit: int = 10) -> list[str]:
+    response = client.get("/api/autocomplete", query_string={"q": q, "limit": limit})
+    assert response.status_code == 200
+    return [completion["name"] for completion in response.get_json()["completions"]]
+
+
+def test_prefix_index() -> None:
+    index = PrefixIndex()
+    index.built = True
+    index.replace("Venue", 1, "The Musical Hop")
+    index.replace("Venue", 2, "Hop Hop Hop")
+    index.replace("Artist", 1, "Guns N Petals")
+
+    assert PrefixIndex.keys("The Musical  Hop") == [
+        "the musical hop",
+        "musical hop",
+        "hop",
+    ]
+    # in the order of the matching words, each row once
+    assert index.complete("hop", 10) == [
+        ("Venue", 1, "The Musical Hop"),
+        ("Venue", 2, "Hop Hop Hop"),
+    ]
+    assert index.complete("  MUSICAL   h", 10) == [("Venue", 1, "The Musical Hop")]
+    assert index.complete("g", 10) == [("Artist", 1, "Guns N Petals")]
+    assert index.complete("hop", 1) == [("Venue", 1, "The Musical Hop")]
+    assert index.complete("", 10) == []
+
+    index.replace("Venue", 2, "Blue Note")
+    assert index.complete("hop", 10) == [("Venue", 1, "The Musical Hop")]
+    index.replace("Venue", 1, None)
+    assert index.complete("hop", 10) == []
+    assert len(index.entries) == 2 + 3
+
+
+def test_autocomplete(app: Flask, client: FlaskClient) -> None:
+    response = client.get("/api/autocomplete", query_string={"q": "venue2"})
+    assert response.status_code == 200
+    assert response.get_json() == {
+        "completions": [
+            {"kind": "venue", "id": 2, "name": "Venue2", "url": "/venues/2"},
+        ]
+    }
+    assert completions(client, "ARTIST") == ["Artist1", "Artist2", "Artist3", "Artist4"]
+    assert completions(client, "artist", limit=2) == ["Artist1", "Artist2"]
+    assert completions(client, "") == []
+
+    # served from memory once built
+    with app.app_context(), count_queries() as statements:
+        assert completions(client, "v") == ["Venue1", "Venue2", "Venue3"]
+    assert statements == []
+
+    for limit in ("0", "51", "ten"):
+        response = client.get("/api/autocomplete", query_string={"limit": limit})
+        assert response.status_code == 400
+
+
+def test_autocomplete_follows_writes(app: Flask, client: FlaskClient) -> None:
+    assert completions(client, "guns") == []
+
+    with app.app_context():
+        db.session.add(mock_artist(id=10, name="Guns N Petals").to_orm(Artist))
+        db.session.add(mock_venue(id=10, name="Park Square Live").to_orm(Venue))
+        db.session.commit()
+        assert completions(client, "guns") == ["Guns N Petals"]
+        assert completions(client, "pe") == ["Guns N Petals"]
+
+        venue = db.session.get(Venue, 10)
+        assert venue is not None
+        venue.name = "The Dueling Pianos Bar"
+        db.session.commit()
+        assert completions(client, "park") == []
+        assert completions(client, "pi") == ["The Dueling Pianos Bar"]
+
+        venue.name = "Rolled Back"
+        db.session.flush()
+        db.session.rollback()
+        assert completions(client, "rolled") == []
+
+        artist = db.session.get(Artist, 10)
+        db.session.delete(artist)
+        db.session.commit()
+        assert completions(client, "guns") == []
+
+
+def test_autocomplete_sees_writes_out_of_band(app: Flask, client: FlaskClient) -> None:
+    assert completions(client, "zebra") == []
+
+    with app.app_context():
+        record = mock_artist(id=0, name="Zebra Katz").model_dump(
+            mode="json", exclude={"id", "shows", "genres"}
+        )
+        import_records("artist", [record])
+        index = autocomplete_index()
+        # looked for at most every refresh interval
+        index.refreshed_at = 0.0
+        assert completions(client, "zebra") == ["Zebra Katz"]
+        assert completions(client, "katz") == ["Zebra Katz"]
+
+        db.session.execute(
+            sa.update(Artist).where(Artist.name == "Zebra Katz").values(name="Okapi")
+        )
+        db.session.commit()
+        assert completions(client, "okapi") == []
+        index.max_age = 0.0
+        assert completions(client, "okapi") == ["Okapi"]
+        assert completions(client, "zebra") == []
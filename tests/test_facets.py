@@ -0,0 +1,99 @@
+from flask import Flask
+from flask.testing import FlaskClient
+
+from fyyur.facets import facet_counts, get_facets
+from fyyur.models import Artist, Venue, db
+from fyyur.routes.artist import get_artists
+from fyyur.routes.venue import get_venues
+from fyyur.schema.base import State
+from fyyur.schema.facet import BrowseFilters
+from fyyur.schema.genre import GenreEnum
+from tests.mock import mock_venue
+from tests.utils import count_queries
+
+
+def test_facet_counts(app: Flask) -> None:
+    with app.app_context():
+        db.session.add(mock_venue(id=4, city="Austin", state=State.TX).to_orm(Venue))
+        db.session.commit()
+
+        with count_queries() as statements:
+            counts = facet_counts(Venue, BrowseFilters())
+        assert len(statements) == 1
+        assert counts == {
+            "genre": {"Blues": 1, "Hip-Hop": 1, "Jazz": 2, "Rock n Roll": 1, "Pop": 2},
+            "state": {"CA": 3, "TX": 1},
+            "city": {"San Francisco": 3, "Austin": 1},
+            "seeking": {True: 4},
+            "upcoming": {True: 2, False: 2},
+        }
+
+        # counts among the rows matching the filters
+        counts = facet_counts(Venue, BrowseFilters(genre=GenreEnum.Jazz))
+        assert counts["genre"] == {
+            "Blues": 1,
+            "Hip-Hop": 1,
+            "Jazz": 2,
+            "Rock n Roll": 1,
+            "Pop": 1,
+        }
+        assert counts["state"] == {"CA": 2}
+        assert counts["upcoming"] == {True: 2}
+
+        counts = facet_counts(Artist, BrowseFilters(upcoming=False))
+        assert counts == {
+            "genre": {},
+            "state": {"CA": 1},
+            "city": {"San Francisco": 1},
+            "seeking": {True: 1},
+            "upcoming": {False: 1},
+        }
+
+
+def test_get_facets(app: Flask) -> None:
+    with app.app_context():
+        facets = get_facets(Artist, BrowseFilters(genre=GenreEnum.Pop))
+
+    genre = facets[0]
+    assert genre.name == "genre"
+    assert [(value.label, value.count) for value in genre.values] == [
+        ("Pop", 2),
+        ("Jazz", 1),
+        ("Rock n Roll", 1),
+    ]
+    # the selected value removes the filter, the others replace it
+    assert genre.values[0].selected
+    assert genre.values[0].args == {}
+    assert genre.values[1].args == {"genre": "Jazz"}
+
+    upcoming = facets[-1]
+    assert [(value.label, value.count) for value in upcoming.values] == [("Yes", 2)]
+    assert upcoming.values[0].args == {"genre": "Pop", "upcoming": "true"}
+
+
+def test_browse_filters(app: Flask) -> None:
+    with app.app_context():
+        venues = get_venues(BrowseFilters(genre=GenreEnum.Pop, upcoming=False))
+        assert [venue.id for area in venues for venue in area.venues] == [3]
+
+        artists = get_artists(BrowseFilters(genre=GenreEnum.Jazz))
+        assert [artist.id for artist in artists] == [1, 2]
+        artists = get_artists(BrowseFilters(seeking=False))
+        assert artists == []
+
+
+def test_browse_pages(client: FlaskClient) -> None:
+    response = client.get("/venues/", query_string={"genre": "Hip-Hop"})
+    assert response.status_code == 200
+    assert b"Venue1" in response.data
+    assert b"Venue2" not in response.data
+    assert b'href="/venues/?genre=Jazz"' in response.data
+
+    response = client.get("/artists/", query_string={"state": "CA", "upcoming": "true"})
+    assert response.status_code == 200
+    assert b"Artist3" in response.data
+    assert b"Artist4" not in response.data
+
+    for args in ({"genre": "Polka"}, {"state": "XX"}, {"upcoming": "maybe"}):
+        response = client.get("/artists/", query_string=args)
+        assert response.status_code == 400
@@ -0,0 +1,238 @@
+from typing import Union
+
+import pytest
+import sqlalchemy as sa
+from flask import Flask
+from flask.testing import FlaskClient
+
+from fyyur import create_app
+from fyyur.config import TestingConfig
+from fyyur.genre_cache import genre_ids, set_genres
+from fyyur.models import (
+    Artist,
+    Genre,
+    Venue,
+    db,
+    from_genre_mask,
+    to_genre_mask,
+)
+from fyyur.routes.genre import get_genre_page
+from fyyur.routes.venue import get_venue_info
+from fyyur.schema.genre import GenreEnum, GenrePage
+from tests.mock import mock_artist, mock_venue
+from tests.utils import count_loaded_objects, count_queries
+
+
+def test_genre_mask() -> None:
+    assert to_genre_mask([]) == 0
+    assert to_genre_mask([GenreEnum.Alternative, GenreEnum.Blues]) == 0b11
+    assert to_genre_mask([GenreEnum.Other]) == 1 << 18
+    # in the order of the enum
+    assert from_genre_mask(to_genre_mask([GenreEnum.Pop, GenreEnum.Jazz])) == [
+        GenreEnum.Jazz,
+        GenreEnum.Pop,
+    ]
+    assert from_genre_mask(0) == []
+
+
+def genre_rows(genres: list[GenreEnum]) -> list[Genre]:
+    """The `Genre` rows of `genres`, new ones for those not in the database."""
+    in_db = {
+        genre.name: genre
+        for genre in Genre.query.filter(Genre.name.in_(genre.value for genre in genres))
+    }
+    return [in_db.get(genre.value) or Genre(name=genre.value) for genre in genres]
+
+
+def test_genre_mask_follows_genres(app: Flask) -> None:
+    with app.app_context():
+        venue = mock_venue(id=10).to_orm(Venue)
+        assert venue.genre_enums == []
+
+        venue.genres = genre_rows([GenreEnum.Jazz, GenreEnum.Folk])
+        assert venue.genre_enums == [GenreEnum.Folk, GenreEnum.Jazz]
+        db.session.add(venue)
+        db.session.commit()
+
+        venue.genres = genre_rows([GenreEnum.Folk, GenreEnum.Soul])
+        venue.genres.remove(venue.genres[0])
+        db.session.commit()
+
+        stored = db.session.scalar(
+            db.select(Venue.genre_mask)
+            .where(Venue.id == 10)
+            .execution_options(populate_existing=True)
+        )
+        assert stored == to_genre_mask([GenreEnum.Soul])
+
+
+def test_with_any_genre(app: Flask) -> None:
+    def ids(model: type[Union[Venue, Artist]], *genres: GenreEnum) -> list[int]:
+        return [
+            row.id
+            for row in model.query.filter(model.with_any_genre(genres)).order_by("id")
+        ]
+
+    with app.app_context():
+        assert ids(Venue, GenreEnum.Jazz) == [1, 2]
+        assert ids(Venue, GenreEnum.Blues, GenreEnum.Pop) == [1, 2, 3]
+        assert ids(Artist, GenreEnum.RockNRoll) == [2]
+        assert ids(Artist, GenreEnum.Folk) == []
+
+        with count_queries() as statements:
+            ids(Artist, GenreEnum.Pop)
+        assert "artist_genres" not in statements[0]
+
+
+def test_genres_read_from_mask(app: Flask) -> None:
+    with app.app_context(), count_queries() as statements:
+        venue = get_venue_info(2)
+    assert venue is not None
+    assert venue.genres == [GenreEnum.Jazz, GenreEnum.Pop, GenreEnum.RockNRoll]
+    assert len(statements) == 2
+    assert not any('"Genre"' in statement for statement in statements)
+
+
+def test_editing_artist_loads_bounded_rows(app: Flask, client: FlaskClient) -> None:
+    with app.app_context():
+        for id in range(10, 60):
+            artist = mock_artist(id).to_orm(Artist)
+            venue = mock_venue(id).to_orm(Venue)
+            db.session.add_all([artist, venue])
+            set_genres(artist, [GenreEnum.Jazz])
+            set_genres(venue, [GenreEnum.Jazz])
+        db.session.commit()
+        artist_in_form = Artist.query.filter_by(id=1).one().artist_in_form
+        artist_in_form.genres = [GenreEnum.Folk, GenreEnum.Jazz]
+
+    with app.app_context(), count_loaded_objects() as loaded:
+        client.post("/artists/1/edit", data=artist_in_form.model_dump(mode="json"))
+
+    with app.app_context():
+        assert Artist.query.filter_by(id=1).one().genre_enums == artist_in_form.genres
+    # the artist, its former genres and Jazz, none of the other Jazz artists or venues
+    assert len(loaded) <= 5
+    assert not any(
+        isinstance(object, Artist) and sa.inspect(object).identity != (1,)
+        for object in loaded
+    )
+
+
+def test_get_genre_page(app: Flask) -> None:
+    with app.app_context():
+        for id in range(10, 15):
+            artist = mock_artist(id).to_orm(Artist)
+            db.session.add(artist)
+            set_genres(artist, [GenreEnum.Jazz])
+        db.session.commit()
+
+        def ids(page: GenrePage) -> list[int]:
+            return [member.id for member in page.members]
+
+        first = get_genre_page(GenreEnum.Jazz, Artist, per_page=3)
+        assert ids(first) == [1, 2, 10]
+        assert first.prev_cursor is None
+        assert first.next_cursor == 10
+
+        second = get_genre_page(GenreEnum.Jazz, Artist, after=10, per_page=3)
+        assert ids(second) == [11, 12, 13]
+        assert (second.prev_cursor, second.next_cursor) == (11, 13)
+
+        last = get_genre_page(GenreEnum.Jazz, Artist, after=13, per_page=3)
+        assert ids(last) == [14]
+        assert (last.prev_cursor, last.next_cursor) == (14, None)
+
+        back = get_genre_page(GenreEnum.Jazz, Artist, before=11, per_page=3)
+        assert ids(back) == [1, 2, 10]
+        assert (back.prev_cursor, back.next_cursor) == (None, 10)
+
+        assert ids(get_genre_page(GenreEnum.Pop, Venue)) == [2, 3]
+        # not in the database yet
+        assert ids(get_genre_page(GenreEnum.Folk, Venue)) == []
+
+
+def test_browse_genre(client: FlaskClient) -> None:
+    response = client.get("/genres/")
+    assert response.status_code == 200
+    assert b'href="/genres/Rock%20n%20Roll/venues"' in response.data
+
+    response = client.get("/genres/Rock n Roll/artists")
+    assert response.status_code == 200
+    assert b"Artist2" in response.data
+    assert b"Artist1" not in response.data
+
+    assert client.get("/genres/Polka/artists").status_code == 404
+    assert client.get("/genres/Jazz/shows").status_code == 404
+    assert client.get("/genres/Jazz/venues?after=x").status_code == 400
+
+
+def test_genre_ids(app: Flask) -> None:
+    with app.app_context():
+        assert Genre.query.count() == 5
+        ids = genre_ids().ids()
+        # created after the startup, the first access inserts every genre of the enum
+        assert Genre.query.count() == len(GenreEnum)
+        assert ids[GenreEnum.Jazz] == 3
+        with pytest.raises(TypeError):
+            ids[GenreEnum.Jazz] = 4  # type: ignore[index]
+
+        with count_queries() as statements:
+            assert genre_ids().get([GenreEnum.Folk, GenreEnum.Jazz]) == [
+                ids[GenreEnum.Folk],
+                3,
+            ]
+        assert statements == []
+
+        # the genres written through the ORM invalidate the ids on the commit
+        db.session.delete(Genre.query.filter_by(name="Folk").one())
+        db.session.flush()
+        assert genre_ids().ids() is ids
+        db.session.commit()
+        assert genre_ids().ids() is not ids
+
+
+def test_genre_ids_seeded_at_startup(app: Flask) -> None:
+    with app.app_context():
+        assert Genre.query.count() == 5
+
+    # the tables of the test app only exist once created, after its startup
+    started_app = create_app(TestingConfig)
+    with started_app.app_context():
+        assert Genre.query.count() == len(GenreEnum)
+        with count_queries() as statements:
+            assert genre_ids().get([GenreEnum.Jazz]) == [3]
+        assert statements == []
+        db.engine.dispose()
+
+
+def test_editing_artist_runs_no_genre_query(app: Flask, client: FlaskClient) -> None:
+    with app.app_context():
+        artist_in_form = Artist.query.filter_by(id=1).one().artist_in_form
+        artist_in_form.genres = [GenreEnum.Folk, GenreEnum.Jazz]
+        genre_ids().ids()
+
+        with count_queries() as statements:
+            client.post("/artists/1/edit", data=artist_in_form.model_dump(mode="json"))
+        assert not any('FROM "Genre"' in statement for statement in statements)
+
+        artist = Artist.query.filter_by(id=1).one()
+        assert artist.genre_enums == [GenreEnum.Folk, GenreEnum.Jazz]
+        assert sorted(genre.name for genre in artist.genres) == ["Folk", "Jazz"]
+
+
+def test_genre_ids_invalidated_out_of_band(app: Flask, client: FlaskClient) -> None:
+    with app.app_context():
+        artist_in_form = Artist.query.filter_by(id=1).one().artist_in_form
+        artist_in_form.genres = [GenreEnum.Folk]
+        folk_id = genre_ids().ids()[GenreEnum.Folk]
+
+        with db.engine.begin() as connection:
+            connection.execute(sa.delete(Genre).where(Genre.name == "Folk"))
+
+        # the first write fails on the missing genre and drops the ids
+        client.post("/artists/1/edit", data=artist_in_form.model_dump(mode="json"))
+        assert Artist.query.filter_by(id=1).one().genre_enums != [GenreEnum.Folk]
+
+        client.post("/artists/1/edit", data=artist_in_form.model_dump(mode="json"))
+        assert Artist.query.filter_by(id=1).one().genre_enums == [GenreEnum.Folk]
+        assert genre_ids().ids()[GenreEnum.Folk] != folk_id
@@ -0,0 +1,126 @@
+import io
+import json
+from pathlib import Path
+from typing import Any
+
+import pytest
+import sqlalchemy as sa
+from flask import Flask
+
+from fyyur import importer
+from fyyur.importer import import_records, read_records
+from fyyur.models import Artist, Genre, Venue
+from fyyur.schema.genre import GenreEnum
+from tests.mock import mock_artist, mock_venue
+
+
+def venue_record(id: int, genres: list[str]) -> dict[str, Any]:
+    return {
+        **mock_venue(id).model_dump(mode="json", exclude={"id", "shows", "genres"}),
+        "genres": genres,
+    }
+
+
+def test_import_venues_jsonl(app: Flask, tmp_path: Path) -> None:
+    records = [
+        venue_record(10, ["Jazz", "Folk"]),
+        {"name": "no address"},
+        venue_record(11, []),
+        venue_record(12, ["Not a genre"]),
+        venue_record(13, ["Folk"]),
+    ]
+    input_file = tmp_path / "venues.jsonl"
+    input_file.write_text("\n".join(json.dumps(record) for record in records))
+
+    result = app.test_cli_runner().invoke(
+        args=["fyyur", "import", "venue", str(input_file), "--chunk-size", "2"]
+    )
+    assert result.exit_code == 0
+    assert "3 venues imported, 2 rejected, 0 chunks failed" in result.output
+    assert "record 2:" in result.output
+    assert "record 4:" in result.output
+
+    with app.app_context():
+        venues = {venue.name: venue for venue in Venue.query.all()}
+        assert {"Venue10", "Venue11", "Venue13"} <= venues.keys()
+        assert sorted(genre.name for genre in venues["Venue10"].genres) == [
+            "Folk",
+            "Jazz",
+        ]
+        assert venues["Venue11"].genres == []
+        assert [genre.name for genre in venues["Venue13"].genres] == ["Folk"]
+        # Folk didn't exist before, it is created once
+        assert Genre.query.filter_by(name="Folk").count() == 1
+
+
+def test_import_skips_unreadable_records(app: Flask, tmp_path: Path) -> None:
+    lines = [
+        json.dumps(venue_record(10, ["Jazz"])),
+        '{"name": "Truncated',
+        "[1]",
+        json.dumps({**venue_record(12, []), "genres": 5}),
+        json.dumps(venue_record(11, [])),
+    ]
+    input_file = tmp_path / "venues.jsonl"
+    input_file.write_text("\n".join(lines))
+
+    result = app.test_cli_runner().invoke(
+        args=["fyyur", "import", "venue", str(input_file)]
+    )
+    assert result.exit_code == 0
+    assert "2 venues imported, 3 rejected, 0 chunks failed" in result.output
+    assert "record 2: invalid JSON" in result.output
+    assert "record 3: not an object" in result.output
+    assert "record 4:" in result.output
+
+    with app.app_context():
+        assert {"Venue10", "Venue11"} <= {venue.name for venue in Venue.query.all()}
+
+
+def test_import_artists_csv(app: Flask) -> None:
+    artist = mock_artist(10).model_dump(mode="json", exclude={"id", "shows", "genres"})
+    header = ",".join([*artist, "genres"])
+    row = ",".join([*(str(value) for value in artist.values()), "Jazz;Rock n Roll"])
+    stream = io.StringIO(f"{header}\n{row}\n")
+
+    with app.app_context():
+        report = import_records("artist", read_records(stream, "csv"))
+        assert report.imported == 1
+
+        imported: Artist = Artist.query.filter_by(name="Artist10").one()
+        assert imported.artist_info == mock_artist(10).to_orm(Artist).artist_info
+        assert sorted(genre.name for genre in imported.genres) == [
+            GenreEnum.Jazz.value,
+            GenreEnum.RockNRoll.value,
+        ]
+        assert imported.genre_enums == [GenreEnum.Jazz, GenreEnum.RockNRoll]
+
+
+def test_import_failed_chunk_does_not_abort(
+    app: Flask, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    write_chunk = importer.write_chunk
+    calls: list[int] = []
+
+    def failing_second_chunk(*args: Any) -> None:
+        calls.append(1)
+        write_chunk(*args)
+        if len(calls) == 2:
+            raise sa.exc.OperationalError("INSERT", {}, Exception("disk full"))
+
+    monkeypatch.setattr(importer, "write_chunk", failing_second_chunk)
+
+    progress: list[int] = []
+    with app.app_context():
+        report = import_records(
+            "venue",
+            (venue_record(id, ["Jazz"]) for id in range(10, 16)),
+            chunk_size=2,
+            on_progress=lambda report: progress.append(report.imported),
+        )
+        assert report.imported == 4
+        assert report.failed_chunks == 1
+        assert progress == [2, 2, 4]
+
+        names = {venue.name for venue in Venue.query.filter(Venue.id > 3)}
+        assert names == {"Venue10", "Venue11", "Venue14", "Venue15"}
@@ -0,0 +1,102 @@
+import logging
+import re
+from typing import Iterator
+
+import pytest
+import sqlalchemy as sa
+from flask import Flask
+
+from fyyur.config import TestingConfig
+from fyyur.instrumentation import statement_shape
+from fyyur.models import Artist, Genre, Show, Venue, db
+from tests.conftest import make_app
+
+
+class InstrumentedConfig(TestingConfig):
+    SQL_INSTRUMENTATION = True
+    SQL_STATEMENT_BUDGET = 3
+    SQL_REPEATED_STATEMENT_THRESHOLD = 3
+
+
+@pytest.fixture()
+def instrumented_app() -> Iterator[Flask]:
+    yield from make_app(InstrumentedConfig)
+
+
+def test_statement_shape() -> None:
+    assert statement_shape("SELECT *\n  FROM t WHERE id IN (?, ?, ?)") == (
+        "SELECT * FROM t WHERE id IN (?)"
+    )
+    assert statement_shape("SELECT * FROM t WHERE id IN (%(id_1_1)s, %(id_1_2)s)") == (
+        "SELECT * FROM t WHERE id IN (?)"
+    )
+    assert statement_shape("SELECT * FROM t WHERE id = ?") == (
+        "SELECT * FROM t WHERE id = ?"
+    )
+
+
+def test_server_timing_header(instrumented_app: Flask) -> None:
+    response = instrumented_app.test_client().get("/venues/")
+    assert response.status_code == 200
+
+    spans = {
+        span.split(";")[0]: span for span in response.headers["Server-Timing"].split(", ")
+    }
+    assert spans.keys() == {"db", "render", "total"}
+    assert re.fullmatch(r'db;dur=[\d.]+;desc="\d+ statements"', spans["db"])
+
+
+def test_not_instrumented_by_default(app: Flask) -> None:
+    assert "Server-Timing" not in app.test_client().get("/venues/").headers
+
+
+def test_repeated_statements_are_logged(
+    instrumented_app: Flask, caplog: pytest.LogCaptureFixture
+) -> None:
+    @instrumented_app.route("/n-plus-one")
+    def n_plus_one() -> str:
+        names = [
+            db.session.scalars(sa.select(Venue.name).where(Venue.id == venue_id)).first()
+            for venue_id in range(1, 5)
+        ]
+        return ",".join(name or "" for name in names)
+
+    with caplog.at_level(logging.WARNING):
+        response = instrumented_app.test_client().get("/n-plus-one")
+
+    assert response.status_code == 200
+    assert 'desc="4 statements"' in response.headers["Server-Timing"]
+    warnings = [record.getMessage() for record in caplog.records]
+    assert any("run 4 times, possible N+1 query" in warning for warning in warnings)
+    # the statement budget is only checked in debug mode
+    assert not any("over the budget" in warning for warning in warnings)
+
+
+def test_statement_budget_in_debug_mode(
+    instrumented_app: Flask, caplog: pytest.LogCaptureFixture
+) -> None:
+    @instrumented_app.route("/over-budget")
+    def over_budget() -> str:
+        for model in (Venue, Artist, Show, Genre):
+            db.session.scalars(sa.select(model.id)).all()
+        return ""
+
+    instrumented_app.debug = True
+    with caplog.at_level(logging.WARNING):
+        instrumented_app.test_client().get("/venues/1")
+        instrumented_app.test_client().get("/")
+        instrumented_app.test_client().get("/over-budget")
+
+    warnings = [record.getMessage() for record in caplog.records]
+    assert warnings == ["GET /over-budget: 4 statements, over the budget of 3"]
+
+
+def test_failed_statement_leaves_nothing_on_the_connection(
+    instrumented_app: Flask,
+) -> None:
+    with instrumented_app.app_context(), db.engine.connect() as connection:
+        with pytest.raises(sa.exc.OperationalError):
+            connection.exec_driver_sql("SELECT * FROM missing")
+        connection.rollback()
+        assert connection.exec_driver_sql("SELECT 1").scalar() == 1
+        assert connection.info == {}
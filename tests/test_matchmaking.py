@@ -0,0 +1,158 @@
+from typing import Any
+
+import sqlalchemy as sa
+from flask import Flask
+from flask.testing import FlaskClient
+
+from fyyur.genre_cache import set_genres
+from fyyur.importer import import_records
+from fyyur.matchmaking import (
+    MatchIndex,
+    Profile,
+    find_matches,
+    match_cache,
+    match_indexes,
+)
+from fyyur.models import Artist, Venue, db, to_genre_mask
+from fyyur.schema.base import State
+from fyyur.schema.genre import GenreEnum
+from tests.mock import mock_artist
+from tests.utils import count_queries
+
+
+def test_find_matches(app: Flask) -> None:
+    with app.app_context():
+        with count_queries() as statements:
+            page = find_matches(Venue, 1)
+        assert page is not None
+        # building the index, the venue, the shows and the artists
+        assert len(statements) == 4
+
+        assert [match.id for match in page.matches] == [1, 2, 3, 4]
+        artist1, artist2, artist3, _ = page.matches
+        assert artist1.shared_genres == [
+            GenreEnum.Blues,
+            GenreEnum.HipHop,
+            GenreEnum.Jazz,
+        ]
+        # the three days of shows of the venue, and the one of artist2
+        assert (artist1.free_days, artist2.free_days) == (27, 26)
+        assert artist1.score == 1.725
+        assert artist3.shared_genres == []
+
+        page = find_matches(Artist, 3)
+        assert page is not None
+        # by the share of Pop in their genres
+        assert [match.id for match in page.matches] == [3, 2, 1]
+
+        assert find_matches(Venue, 10) is None
+
+
+def test_matches_by_location(app: Flask) -> None:
+    with app.app_context():
+        artist = mock_artist(id=5).to_orm(Artist)
+        artist.city, artist.state = "Austin", State.TX.value
+        db.session.add(artist)
+        set_genres(artist, [GenreEnum.Blues, GenreEnum.HipHop, GenreEnum.Jazz])
+        db.session.commit()
+
+        page = find_matches(Venue, 1)
+        assert page is not None
+        # the same genres elsewhere rank below the same genres in the same city,
+        # above a single shared genre in the same city
+        assert [match.id for match in page.matches] == [1, 5, 2, 3, 4]
+
+        index = match_indexes()["Artist"]
+        profile = Profile(to_genre_mask([GenreEnum.Jazz]), "TX", "Austin")
+        # no other group can reach the best one with the calendar
+        assert index.candidates(profile, 1) == [(1 / 3 + 0.5, 5)]
+
+
+def test_matches_cached_until_changed(app: Flask) -> None:
+    with app.app_context():
+        find_matches(Venue, 1)
+        with count_queries() as statements:
+            page = find_matches(Venue, 1)
+        assert page is not None
+        assert len(statements) == 0
+
+        artist4 = db.session.get(Artist, 4)
+        assert artist4 is not None
+        set_genres(artist4, [GenreEnum.Jazz])
+        db.session.commit()
+        page = find_matches(Venue, 1)
+        assert page is not None
+        assert [match.id for match in page.matches] == [1, 4, 2, 3]
+
+        artist1 = db.session.get(Artist, 1)
+        assert artist1 is not None
+        artist1.seeking_venue = False
+        db.session.commit()
+        page = find_matches(Venue, 1)
+        assert page is not None
+        assert [match.id for match in page.matches] == [4, 2, 3]
+
+        # a rolled back change is not applied
+        artist1.seeking_venue = True
+        db.session.flush()
+        db.session.rollback()
+        page = find_matches(Venue, 1)
+        assert page is not None
+        assert [match.id for match in page.matches] == [4, 2, 3]
+
+
+def test_matches_see_writes_out_of_band(app: Flask) -> None:
+    with app.app_context():
+        find_matches(Venue, 1)
+
+        # bulk inserted, unknown to the index until the next query
+        record = mock_artist(id=0, name="Imported").model_dump(
+            mode="json", exclude={"id", "shows", "genres"}
+        )
+        import_records("artist", [{**record, "genres": ["Blues", "Hip-Hop", "Jazz"]}])
+        match_cache().clear()
+        page = find_matches(Venue, 1)
+        assert page is not None
+        assert [match.id for match in page.matches] == [1, 5, 2, 3, 4]
+
+        # updated out of band, seen once the index is rebuilt
+        db.session.execute(
+            sa.update(Artist).where(Artist.id == 5).values(seeking_venue=False)
+        )
+        db.session.commit()
+        match_cache().clear()
+        match_indexes()["Artist"].max_age = 0.0
+        page = find_matches(Venue, 1)
+        assert page is not None
+        assert [match.id for match in page.matches] == [1, 2, 3, 4]
+
+
+def test_match_index_keeps_writes_committed_while_building(app: Flask) -> None:
+    index = MatchIndex(Artist)
+
+    def commit_during_build(*args: Any) -> None:
+        # the select of the build reads the tables as before the commit
+        index.replace(1, None)
+
+    with app.app_context():
+        sa.event.listen(db.engine, "before_cursor_execute", commit_during_build)
+        try:
+            index.build()
+        finally:
+            sa.event.remove(db.engine, "before_cursor_execute", commit_during_build)
+
+    assert sorted(index.profiles) == [2, 3, 4]
+
+
+def test_matches_pages(client: FlaskClient) -> None:
+    response = client.get("/venues/1/matches")
+    assert response.status_code == 200
+    assert b'href="/artists/1"' in response.data
+    assert b"Blues, Hip-Hop, Jazz" in response.data
+
+    response = client.get("/artists/1/matches")
+    assert response.status_code == 200
+    assert b'href="/venues/1"' in response.data
+
+    assert client.get("/venues/10/matches").status_code == 404
+    assert client.get("/artists/10/matches").status_code == 404
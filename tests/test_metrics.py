@@ -0,0 +1,135 @@
+import multiprocessing
+from multiprocessing.synchronize import Event
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+from flask import Flask
+
+from fyyur.config import TestingConfig
+from fyyur.metrics import record_cache_access
+from fyyur.models import db
+from tests.conftest import make_app
+
+
+class MetricsConfig(TestingConfig):
+    METRICS = True
+
+
+@pytest.fixture()
+def metrics_app() -> Iterator[Flask]:
+    yield from make_app(MetricsConfig)
+
+
+def parse_metrics(text: str) -> dict[str, float]:
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            sample, value = line.rsplit(" ", 1)
+            samples[sample] = float(value)
+    return samples
+
+
+def test_metrics(metrics_app: Flask) -> None:
+    client = metrics_app.test_client()
+    client.get("/venues/")
+    client.get("/venues/")
+    client.get("/venues/1")
+    client.get("/venues/1000")
+    client.get("/not-found")
+    with metrics_app.app_context():
+        record_cache_access("genres", hit=True)
+        record_cache_access("genres", hit=True)
+        record_cache_access("genres", hit=True)
+        record_cache_access("genres", hit=False)
+        record_cache_access("matches", hit=False)
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain; version=0.0.4")
+    assert "# TYPE fyyur_request_duration_seconds histogram" in response.text
+    samples = parse_metrics(response.text)
+
+    venues = 'endpoint="venue.venues",method="GET"'
+    assert samples[f'fyyur_requests_total{{{venues},status="200"}}'] == 2
+    assert samples[f"fyyur_request_duration_seconds_count{{{venues}}}"] == 2
+    assert samples[f'fyyur_request_duration_seconds_bucket{{{venues},le="+Inf"}}'] == 2
+    assert samples[f"fyyur_db_duration_seconds_count{{{venues}}}"] == 2
+    assert samples[f"fyyur_render_duration_seconds_sum{{{venues}}}"] > 0
+    show_venue = 'endpoint="venue.show_venue",method="GET"'
+    assert samples[f'fyyur_requests_total{{{show_venue},status="404"}}'] == 1
+    unknown = 'endpoint="unknown",method="GET"'
+    assert samples[f'fyyur_requests_total{{{unknown},status="404"}}'] == 1
+
+    # buckets are cumulative
+    buckets = [
+        value
+        for sample, value in samples.items()
+        if sample.startswith(f"fyyur_request_duration_seconds_bucket{{{venues}")
+    ]
+    assert buckets == sorted(buckets)
+
+    assert samples["fyyur_db_pool_checked_out"] == 0
+    assert samples["fyyur_db_pool_overflow"] == 0
+    assert samples['fyyur_cache_hit_ratio{cache="genres"}'] == 0.75
+    assert samples['fyyur_cache_hit_ratio{cache="matches"}'] == 0
+
+
+def serve_requests(app: Flask, served: Event, stop: Event) -> None:
+    # connections must not be shared with the parent process
+    with app.app_context():
+        db.engine.dispose(close=False)
+    client = app.test_client()
+    client.get("/venues/")
+    client.get("/artists/")
+    served.set()
+    stop.wait()
+
+
+def test_metrics_are_merged_across_processes(tmp_path: Path) -> None:
+    class SharedMetricsConfig(MetricsConfig):
+        METRICS_DIR = str(tmp_path)
+        # multiprocessing workers exit without running the atexit hooks
+        METRICS_FLUSH_INTERVAL = 0
+
+    context = multiprocessing.get_context("fork")
+    for app in make_app(SharedMetricsConfig):
+        client = app.test_client()
+        client.get("/venues/")
+
+        served, stop = context.Event(), context.Event()
+        worker = context.Process(target=serve_requests, args=(app, served, stop))
+        worker.start()
+        assert served.wait(timeout=30)
+
+        samples = parse_metrics(client.get("/metrics").text)
+        venues = 'endpoint="venue.venues",method="GET",status="200"'
+        artists = 'endpoint="artist.artists",method="GET",status="200"'
+        assert samples[f"fyyur_requests_total{{{venues}}}"] == 2
+        assert samples[f"fyyur_requests_total{{{artists}}}"] == 1
+        assert len(list(tmp_path.glob("*.json"))) == 2
+
+        stop.set()
+        worker.join()
+        assert worker.exitcode == 0
+
+        # the file of the exited worker is removed, its metrics are not counted
+        samples = parse_metrics(client.get("/metrics").text)
+        assert samples[f"fyyur_requests_total{{{venues}}}"] == 1
+        assert f"fyyur_requests_total{{{artists}}}" not in samples
+        assert samples["fyyur_db_pool_checked_out"] == 0
+
+    assert len(list(tmp_path.glob("*.json"))) == 1
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_metrics_file_removed_on_exit(tmp_path: Path) -> None:
+    class SharedMetricsConfig(MetricsConfig):
+        METRICS_DIR = str(tmp_path)
+
+    for app in make_app(SharedMetricsConfig):
+        app.test_client().get("/metrics")
+        assert len(list(tmp_path.glob("*.json"))) == 1
+        app.extensions["metrics"].remove()
+
+    assert not list(tmp_path.glob("*.json"))
@@ -0,0 +1,120 @@
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+from flask import Flask
+
+from fyyur.config import TestingConfig
+from fyyur.profiling import (
+    SamplingProfilerMiddleware,
+    hot_functions_report,
+    profile_endpoint,
+)
+from tests.conftest import make_app
+
+PROFILE_HEADERS = {"X-Fyyur-Profile": "token"}
+
+
+@pytest.fixture()
+def profiled_app(tmp_path: Path) -> Iterator[Flask]:
+    class ProfiledConfig(TestingConfig):
+        PROFILE_DIR = str(tmp_path / "profiles")
+        PROFILE_SAMPLE_RATE = 3
+        PROFILE_MAX_FILES = 4
+        PROFILE_TOKEN = "token"
+
+    yield from make_app(ProfiledConfig)
+
+
+def profiles(app: Flask) -> list[Path]:
+    return sorted(Path(app.config["PROFILE_DIR"]).iterdir())
+
+
+def test_one_request_in_n_is_profiled(profiled_app: Flask) -> None:
+    client = profiled_app.test_client()
+    for _ in range(6):
+        assert client.get("/venues/").status_code == 200
+
+    assert [profile_endpoint(path) for path in profiles(profiled_app)] == [
+        "venue.venues",
+        "venue.venues",
+    ]
+
+
+def test_profile_header(profiled_app: Flask) -> None:
+    client = profiled_app.test_client()
+    client.get("/artists/1", headers=PROFILE_HEADERS)
+    client.get("/not-found", headers=PROFILE_HEADERS)
+
+    assert sorted(profile_endpoint(path) for path in profiles(profiled_app)) == [
+        "artist.show_artist",
+        "unknown",
+    ]
+
+
+def test_untrusted_profile_header(profiled_app: Flask) -> None:
+    client = profiled_app.test_client()
+    client.get("/artists/1", headers={"X-Fyyur-Profile": "1"})
+    assert profiles(profiled_app) == []
+
+    profiled_app.debug = True
+    client.get("/artists/1", headers={"X-Fyyur-Profile": "1"})
+    assert [profile_endpoint(path) for path in profiles(profiled_app)] == [
+        "artist.show_artist"
+    ]
+
+
+def test_profiles_are_rotated(profiled_app: Flask) -> None:
+    client = profiled_app.test_client()
+    for _ in range(6):
+        client.get("/shows/", headers=PROFILE_HEADERS)
+
+    assert len(profiles(profiled_app)) == 4
+
+
+def test_other_files_are_not_rotated(
+    profiled_app: Flask, caplog: pytest.LogCaptureFixture
+) -> None:
+    profile_dir = Path(profiled_app.config["PROFILE_DIR"])
+    names = ["venue.venues-2000-1.prof", "foo.prof", "a-b.prof", "show.shows-1000-2.prof"]
+    for name in names:
+        (profile_dir / name).touch()
+
+    middleware = SamplingProfilerMiddleware(
+        profiled_app, str(profile_dir), 0, "X-Fyyur-Profile", "token", 4
+    )
+    assert [path.name for path in middleware.saved] == [
+        "show.shows-1000-2.prof",
+        "venue.venues-2000-1.prof",
+    ]
+    assert "foo.prof, not named as a saved profile" in caplog.text
+
+
+def test_profile_failing_to_save(
+    profiled_app: Flask, caplog: pytest.LogCaptureFixture
+) -> None:
+    profile_dir = Path(profiled_app.config["PROFILE_DIR"])
+    profile_dir.rmdir()
+    profile_dir.write_text("not a directory")
+
+    response = profiled_app.test_client().get("/venues/", headers=PROFILE_HEADERS)
+    assert response.status_code == 200
+    assert "could not save the profile" in caplog.text
+
+
+def test_profile_report(profiled_app: Flask) -> None:
+    client = profiled_app.test_client()
+    client.get("/venues/", headers=PROFILE_HEADERS)
+    client.get("/shows/", headers=PROFILE_HEADERS)
+
+    report = hot_functions_report(profiled_app.config["PROFILE_DIR"], top=5)
+    assert report.startswith("2 profiles")
+
+    result = profiled_app.test_cli_runner().invoke(
+        args=["fyyur", "profile-report", "--endpoint", "show.shows", "--sort", "tottime"]
+    )
+    assert result.exit_code == 0, result.output
+    assert result.output.startswith("1 profiles")
+    assert "get_shows" in hot_functions_report(
+        profiled_app.config["PROFILE_DIR"], endpoint="show.shows", top=200
+    )
@@ -0,0 +1,182 @@
+import json
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+import sqlalchemy as sa
+from flask import Flask
+
+from fyyur.config import TestingConfig
+from fyyur.index_advisor import (
+    ExistingIndex,
+    advise_indexes,
+    column_usages,
+    migration_indexes,
+)
+from fyyur.models import Venue, db
+from fyyur.query_stats import fingerprint
+from tests.conftest import make_app
+
+VERSIONS_DIR = Path(__file__).parent.parent / "migrations" / "versions"
+
+
+class QueryStatsConfig(TestingConfig):
+    QUERY_STATS = True
+    QUERY_STATS_TOKEN = "token"
+
+
+AUTHORIZATION = {"Authorization": "Bearer token"}
+
+
+@pytest.fixture()
+def query_stats_app() -> Iterator[Flask]:
+    yield from make_app(QueryStatsConfig)
+
+
+def stats(statement: str, total_time: float = 1.0, count: int = 1) -> dict[str, object]:
+    return {"fingerprint": statement, "total_time": total_time, "count": count}
+
+
+def test_fingerprint() -> None:
+    assert (
+        fingerprint("""SELECT "Venue".name FROM "Venue"
+        WHERE "Venue".id = 12 AND "Venue".city = 'San Francisco'""")
+        == ('SELECT "Venue".name FROM "Venue" WHERE "Venue".id = ? AND "Venue".city = ?')
+    )
+    assert fingerprint(
+        'SELECT "Show".id FROM "Show" WHERE "Show".venue_id IN (?, ?, ?)'
+    ) == fingerprint('SELECT "Show".id FROM "Show" WHERE "Show".venue_id IN (%(id_1)s)')
+    # numbers within names are kept
+    assert fingerprint("SELECT anon_1.x FROM t1 AS anon_1 WHERE :p = $1") == (
+        "SELECT anon_1.x FROM t1 AS anon_1 WHERE ? = ?"
+    )
+
+
+def test_query_stats_endpoint(query_stats_app: Flask) -> None:
+    client = query_stats_app.test_client()
+    for venue_id in (1, 2, 3):
+        client.get(f"/venues/{venue_id}")
+
+    dumped = client.get("/query-stats", headers=AUTHORIZATION).get_json()
+    assert dumped == sorted(dumped, key=lambda s: s["total_time"], reverse=True)
+    by_venue_id = [
+        s
+        for s in dumped
+        if 'FROM "Venue"' in s["fingerprint"]
+        and 'WHERE "Venue".id = ?' in s["fingerprint"]
+    ]
+    assert len(by_venue_id) == 1
+    assert by_venue_id[0]["count"] == 3
+    assert by_venue_id[0]["max_time"] <= by_venue_id[0]["total_time"]
+    # one venue fetched by each
+    assert by_venue_id[0]["rows"] == 3
+
+    query_stats_app.extensions["query_stats"].reset()
+    assert client.get("/query-stats", headers=AUTHORIZATION).get_json() == []
+
+
+def test_query_stats_rows(query_stats_app: Flask) -> None:
+    with query_stats_app.app_context():
+        assert len(db.session.execute(sa.select(Venue.id).where(Venue.id > 1)).all()) == 2
+        db.session.execute(sa.update(Venue).values(seeking_talent=True))
+        db.session.commit()
+        dumped = query_stats_app.extensions["query_stats"].dump()
+
+    def rows(prefix: str) -> int:
+        (stats,) = [s for s in dumped if s["fingerprint"].startswith(prefix)]
+        rows: int = stats["rows"]
+        return rows
+
+    assert rows('SELECT "Venue".id FROM "Venue" WHERE "Venue".id > ?') == 2
+    assert rows('UPDATE "Venue" SET seeking_talent') == 3
+
+
+def test_query_stats_needs_authorization(query_stats_app: Flask) -> None:
+    client = query_stats_app.test_client()
+    assert client.get("/query-stats").status_code == 403
+    headers = {"Authorization": "Bearer other"}
+    assert client.get("/query-stats", headers=headers).status_code == 403
+
+    query_stats_app.debug = True
+    assert client.get("/query-stats").status_code == 200
+
+
+def test_query_stats_is_disabled_by_default(app: Flask) -> None:
+    assert "query_stats" not in app.extensions
+    assert app.test_client().get("/query-stats").status_code == 404
+
+
+def test_migration_indexes() -> None:
+    indexes = migration_indexes(VERSIONS_DIR)
+    assert ExistingIndex("Genre", ("name",), True) in indexes["Genre"]
+    assert ExistingIndex("Venue", ("id",), True) in indexes["Venue"]
+    assert ExistingIndex("Show", ("venue_id", "start_time"), False) in indexes["Show"]
+    assert ExistingIndex("Show", ("artist_id", "start_time"), False) in indexes["Show"]
+
+
+def test_column_usages() -> None:
+    usages = column_usages(
+        'SELECT "Venue".name FROM "Show" JOIN "Venue" ON "Show".venue_id = "Venue".id '
+        'WHERE "Show".artist_id = ? ORDER BY "Show".start_time',
+        db.metadata,
+    )
+    # the join columns of the filtered table are not part of its index, the other
+    # table is looked up by its join columns
+    assert [(table, usage.candidate()) for table, usage in usages] == [
+        ("Show", ("artist_id", "start_time")),
+        ("Venue", ("id",)),
+    ]
+
+
+def test_advise_indexes() -> None:
+    indexes = migration_indexes(VERSIONS_DIR)
+    query_stats = [
+        stats('SELECT "Venue".id FROM "Venue" WHERE "Venue".city = ?', 3.0, 10),
+        stats('SELECT "Venue".id FROM "Venue" WHERE "Venue".city = ? LIMIT ?', 1.0, 5),
+        stats(
+            'SELECT "Show".id FROM "Show" WHERE "Show".venue_id = ? '
+            'AND "Show".start_time > ? ORDER BY "Show".start_time',
+            5.0,
+        ),
+        stats('SELECT "Genre".id FROM "Genre" WHERE "Genre".name IN (?)', 2.0),
+        stats('INSERT INTO "Venue" (name, city) VALUES (?)', 8.0),
+    ]
+
+    (suggestion,) = advise_indexes(query_stats, db.metadata, indexes)
+    assert suggestion.table == "Venue"
+    assert suggestion.columns == ("city",)
+    assert suggestion.name == "ix_Venue_city"
+    assert suggestion.total_time == 4.0
+    assert suggestion.count == 15
+    assert len(suggestion.fingerprints) == 2
+
+    # only the most time consuming fingerprints are looked at
+    assert advise_indexes(query_stats, db.metadata, indexes, top=2) == []
+
+
+def test_advise_indexes_command(app: Flask, tmp_path: Path) -> None:
+    stats_file = tmp_path / "stats.json"
+    stats_file.write_text(
+        json.dumps(
+            [
+                stats(
+                    'SELECT "Artist".id FROM "Artist" '
+                    'ORDER BY "Artist".create_date DESC LIMIT ?',
+                    0.5,
+                    4,
+                ),
+                stats('SELECT "Artist".id FROM "Artist" WHERE "Artist".id = ?', 0.5),
+            ]
+        )
+    )
+
+    result = app.test_cli_runner().invoke(
+        args=["fyyur", "advise-indexes", str(stats_file)]
+    )
+    assert result.exit_code == 0, result.output
+    lines = result.output.splitlines()
+    assert lines[0] == 'CREATE INDEX ix_Artist_create_date ON "Artist" ("create_date");'
+    assert (
+        lines[1] == "  -- up to 500.0ms saved (50% of the DB time) over 4 executions of:"
+    )
+    assert len(lines) == 3
@@ -0,0 +1,352 @@
+import math
+import threading
+from typing import Any
+
+import sqlalchemy as sa
+from alembic.autogenerate.api import compare_metadata
+from alembic.migration import MigrationContext
+from flask import Flask
+from flask.testing import FlaskClient
+from sqlalchemy.dialects import postgresql
+
+from fyyur import create_app
+from fyyur.config import TestingConfig
+from fyyur.importer import import_records
+from fyyur.models import Artist, Venue, db, is_search_object
+from fyyur.routes.artist import find_artists
+from fyyur.routes.venue import find_venues
+from fyyur.schema.base import SearchMode, SearchSchema
+from fyyur.search import NgramIndex, trigram_search
+from scripts.benchmark_fuzzy_search import run_benchmark
+from tests.mock import mock_artist, mock_venue
+from tests.utils import count_queries
+
+
+def substring(search_term: str) -> SearchSchema:
+    return SearchSchema(search_term=search_term, mode=SearchMode.SUBSTRING)
+
+
+def test_search_objects_left_out_of_migrations(app: Flask) -> None:
+    def include_object(object: Any, name: str, type_: str, *args: Any) -> bool:
+        # as `migrations/env.py`
+        return not is_search_object(name, type_)
+
+    with app.app_context(), db.engine.connect() as connection:
+        context = MigrationContext.configure(connection)
+        assert len(compare_metadata(context, db.metadata)) == 12
+
+        context = MigrationContext.configure(
+            connection, opts={"include_object": include_object}
+        )
+        assert compare_metadata(context, db.metadata) == []
+
+    # only created on Postgres
+    assert is_search_object("ix_Venue_location_trgm", "index")
+    assert is_search_object("ix_Artist_name_trgm", "index")
+    assert not is_search_object("ix_Show_venue_id_start_time", "index")
+
+
+def test_ngram_index() -> None:
+    index = NgramIndex(Artist)
+    index.built = True
+    index.add(1, ["Guns N Petals"])
+    index.add(2, ["aba bab"])
+    index.add(3, ["Ns"])
+
+    assert index.candidates("ns") == {1, 3}
+    assert index.candidates("N") == {1, 3}
+    assert index.candidates("petals") == {1}
+    # the candidates hold every n-gram of the term, not necessarily the term
+    assert index.candidates("abab") == {2}
+    assert index.candidates("xyz") == set()
+    # the index can't tell for wildcards or the empty term
+    assert index.candidates("p_tals") is None
+    assert index.candidates("") is None
+
+    index.replace(1, ["Guns"])
+    assert index.candidates("petals") == set()
+    assert index.candidates("ns") == {1, 3}
+    index.replace(3, None)
+    assert index.candidates("ns") == {1}
+    assert "s" in index.postings
+    assert "ns" not in index.ids
+    assert 3 not in index.strings
+
+    # the rows sharing a string share its postings
+    index.add(4, ["Guns"])
+    assert index.postings["gun"] == {"guns"}
+    assert index.candidates("gun") == {1, 4}
+    # the index can't tell past the limit
+    assert index.candidates("gun", limit=1) is None
+
+
+def test_substring_search_uses_ngram_index(app: Flask) -> None:
+    with app.app_context():
+        db.session.add(mock_artist(id=10, name="Guns N Petals").to_orm(Artist))
+        db.session.add(mock_artist(id=11, name="aba bab").to_orm(Artist))
+        db.session.commit()
+
+        assert [artist.id for artist in find_artists(substring("ns"))] == [10]
+        assert find_artists(substring("abab")) == []
+
+        with count_queries() as statements:
+            find_artists(substring("tist"))
+        assert '"Artist".id IN' in statements[0]
+
+        # the index can't serve wildcards
+        with count_queries() as statements:
+            find_artists(substring("a_"))
+        assert '"Artist".id IN' not in statements[0]
+
+
+def test_ngram_index_built_at_startup(app: Flask) -> None:
+    # the tables of the test app only exist once created, after its startup
+    started_app = create_app(TestingConfig)
+    index = started_app.extensions["ngram_index"]["Venue"]
+    assert index.built
+    assert index.candidates("venue1") == {1}
+
+    with started_app.app_context():
+        with count_queries() as statements:
+            assert [venue.id for venue in find_venues(substring("enue"))] == [1, 2, 3]
+        assert len(statements) == 1
+        db.engine.dispose()
+
+
+def test_ngram_index_built_in_background(app: Flask) -> None:
+    index = NgramIndex(Venue)
+    index.app = app
+    reading = threading.Event()
+
+    def wait_for_searches(*args: Any) -> None:
+        reading.wait()
+
+    with app.app_context():
+        sa.event.listen(db.engine, "before_cursor_execute", wait_for_searches)
+        try:
+            # the searches go without the index until it is built
+            assert index.candidates("venue1") is None
+            assert index.similar("venue1", 0.5, 10) is None
+            assert index.builder is not None
+            reading.set()
+            index.builder.join()
+            assert index.candidates("venue1") == {1}
+
+            # and keep the current index while rebuilt
+            db.session.execute(sa.update(Venue).where(Venue.id == 1).values(name="Okapi"))
+            db.session.commit()
+            reading.clear()
+            index.max_age = 0.0
+            assert index.candidates("venue1") == {1}
+            reading.set()
+            index.builder.join()
+        finally:
+            sa.event.remove(db.engine, "before_cursor_execute", wait_for_searches)
+
+    index.max_age = math.inf
+    assert index.candidates("venue1") == set()
+    assert index.candidates("okapi") == {1}
+
+
+def test_ngram_index_follows_writes(app: Flask) -> None:
+    def search(search_term: str) -> list[int]:
+        return [venue.id for venue in find_venues(substring(search_term))]
+
+    with app.app_context():
+        # build the index
+        assert search("enue") == [1, 2, 3]
+
+        db.session.add(mock_venue(id=10, name="Guns N Petals").to_orm(Venue))
+        db.session.commit()
+        assert search("ns n") == [10]
+
+        venue = db.session.get(Venue, 10)
+        assert venue is not None
+        venue.name = "The Dueling Pianos"
+        db.session.commit()
+        assert search("petals") == []
+        assert search("pianos") == [10]
+
+        venue.city = "Tulsa"
+        db.session.flush()
+        db.session.rollback()
+        assert search("tulsa") == []
+        assert search("francisco") == [1, 2, 3, 10]
+
+        db.session.delete(venue)
+        db.session.commit()
+        assert search("pianos") == []
+
+    ngram_index = app.extensions["ngram_index"]["Venue"]
+    assert ngram_index.candidates("pianos") == set()
+
+
+def venue_record(name: str) -> dict[str, Any]:
+    return mock_venue(id=0, name=name).model_dump(
+        mode="json", exclude={"id", "shows", "genres"}
+    )
+
+
+def test_ngram_index_sees_writes_out_of_band(app: Flask) -> None:
+    def search(search_term: str) -> list[int]:
+        return [venue.id for venue in find_venues(substring(search_term))]
+
+    with app.app_context():
+        assert search("enue") == [1, 2, 3]
+
+        # bulk inserted, unknown to the index until it looks for new rows
+        import_records("venue", [venue_record("Zebra Lounge")])
+        assert search("zebra") == [4]
+        index = app.extensions["ngram_index"]["Venue"]
+        index.refreshed_at = 0.0
+        index.refresh()
+        assert index.candidates("zebra") == {4}
+        assert search("zebra") == [4]
+
+        # updated out of band, seen once the index is rebuilt
+        db.session.execute(
+            sa.update(Venue).where(Venue.id == 4).values(name="Okapi Lounge")
+        )
+        db.session.commit()
+        assert search("okapi") == []
+        index.max_age = 0.0
+        assert search("okapi") == [4]
+
+
+def test_ngram_index_keeps_writes_committed_while_building(app: Flask) -> None:
+    index = NgramIndex(Venue)
+
+    def commit_during_build(*args: Any) -> None:
+        # the select of the build reads the tables as before the commit
+        index.replace(1, ["The Blue Note"])
+
+    with app.app_context():
+        sa.event.listen(db.engine, "before_cursor_execute", commit_during_build)
+        try:
+            index.build()
+        finally:
+            sa.event.remove(db.engine, "before_cursor_execute", commit_during_build)
+
+    assert index.candidates("blue") == {1}
+    assert index.candidates("venue1") == set()
+    assert index.pending is None
+
+
+def fuzzy(search_term: str) -> SearchSchema:
+    return SearchSchema(search_term=search_term, mode=SearchMode.FUZZY)
+
+
+def test_ngram_index_similar() -> None:
+    index = NgramIndex(Venue)
+    index.built = True
+    index.add(1, ["The Musical Hop", "San Francisco, CA"])
+    index.add(2, ["The Musical Hop Annex", "Oakland, CA"])
+    index.add(3, ["Park Square Live Music & Coffee", "San Francisco, CA"])
+
+    # as many trigrams of the term, the row with the fewest others first
+    assert index.similar("Musicl Hop", 0.5, 10) == [1, 2]
+    assert index.similar("Musicl Hop", 0.5, 1) == [1]
+    assert index.similar("music", 0.5, 10) == [1, 2, 3]
+    assert index.similar("San Fransisco", 0.5, 10) == [1, 3]
+    assert index.similar("jazz", 0.5, 10) == []
+    assert index.similar("hp", 0.5, 10) is None
+
+
+def test_ngram_index_similar_ranks_before_stopping() -> None:
+    index = NgramIndex(Venue)
+    index.built = True
+    for id in range(1, 101):
+        index.add(id, ["The Blue Moon Lantern Parlor", "New York, NY"])
+    index.add(101, ["Blue Mon", "Tulsa, OK"])
+    index.add(102, ["The Blue Moon", "Tulsa, OK"])
+
+    # the short strings are scanned first, the rows of the long one never rank above
+    assert index.similar("Blue Mon", 0.5, 2) == [101, 102]
+    assert index.similar("Blue Mon", 0.5, 4) == [101, 102, 1, 2]
+    # the most common trigrams are only checked on the candidates of the others
+    assert index.similar("New Yrok", 0.5, 3) == [1, 2, 3]
+
+
+def test_fuzzy_search_within_budget() -> None:
+    # see `scripts.benchmark_fuzzy_search` for the full size
+    report = run_benchmark(venues=20_000, artists=20_000, num_terms=50)
+    for stats in report.values():
+        assert stats["p99_ms"] < 5.0, stats
+
+
+def test_fuzzy_search(app: Flask) -> None:
+    with app.app_context():
+        db.session.add(mock_venue(id=10, name="The Musical Hop").to_orm(Venue))
+        db.session.add(mock_venue(id=11, name="The Dueling Pianos Bar").to_orm(Venue))
+        db.session.add(mock_artist(id=10, name="Guns N Petals").to_orm(Artist))
+        db.session.commit()
+
+        assert find_venues(SearchSchema(search_term="Musicl Hop")) == []
+        assert [venue.id for venue in find_venues(fuzzy("Musicl Hop"))] == [10]
+        assert [venue.id for venue in find_venues(fuzzy("duelling piano"))] == [11]
+        assert [artist.id for artist in find_artists(fuzzy("guns and petals"))] == [10]
+        # the terms too short for trigrams are searched as substrings
+        assert [venue.id for venue in find_venues(fuzzy("Ho"))] == [10]
+        assert [venue.id for venue in find_venues(fuzzy("zz"))] == []
+
+        # the index follows the writes
+        venue = db.session.get(Venue, 10)
+        assert venue is not None
+        venue.name = "Musical Hoop"
+        db.session.commit()
+        assert [venue.id for venue in find_venues(fuzzy("Musicl Hop"))] == [10]
+        venue.name = "The Blue Note"
+        db.session.commit()
+        assert find_venues(fuzzy("Musicl Hop")) == []
+
+
+def test_fuzzy_search_sees_writes_out_of_band(app: Flask) -> None:
+    with app.app_context():
+        assert find_venues(fuzzy("Musicl Hop")) == []
+
+        import_records("venue", [venue_record("The Musical Hop")])
+        assert [venue.id for venue in find_venues(fuzzy("Musicl Hop"))] == [4]
+
+        db.session.execute(
+            sa.update(Venue).where(Venue.id == 4).values(name="The Blue Note")
+        )
+        db.session.commit()
+        app.extensions["ngram_index"]["Venue"].max_age = 0.0
+        assert find_venues(fuzzy("Musicl Hop")) == []
+        assert [venue.id for venue in find_venues(fuzzy("Blu Note"))] == [4]
+
+
+def test_trigram_search_groups_concatenated_fields(app: Flask) -> None:
+    with app.app_context():
+        query = trigram_search(db.session.query(Venue), Venue, "san fransisco")
+        dialect = postgresql.dialect()  # type: ignore[no-untyped-call]
+        sql = str(query.statement.compile(dialect=dialect))
+
+    location = """("Venue".city || %(city_1)s::VARCHAR || "Venue".state)"""
+    assert f"{location} %% " in sql
+    assert f"similarity({location}, " in sql
+    assert '"Venue".name %% ' in sql
+
+
+def test_search_again_allowing_typos(app: Flask) -> None:
+    with app.app_context():
+        db.session.add(mock_venue(id=10, name="The Musical Hop").to_orm(Venue))
+        db.session.commit()
+
+    client = app.test_client()
+    response = client.post("/venues/search", data={"search_term": "Musicl Hop"})
+    assert response.status_code == 200
+    assert b"allowing typos" in response.data
+
+    response = client.post(
+        "/venues/search", data={"search_term": "Musicl Hop", "mode": "fuzzy"}
+    )
+    assert response.status_code == 200
+    assert b"The Musical Hop" in response.data
+    assert b"allowing typos" not in response.data
+
+
+def test_search_unknown_mode(client: FlaskClient) -> None:
+    for path in ("/venues/search", "/artists/search"):
+        response = client.post(path, data={"search_term": "a", "mode": "regex"})
+        assert response.status_code == 400
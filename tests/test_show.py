@@ -1,14 +1,17 @@
-from datetime import datetime
+import json
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
 
 import pytest
+import sqlalchemy as sa
 from flask import Flask
 from flask.testing import FlaskClient
 
-from fyyur.models import Artist, Show, Venue, db
+from fyyur.models import Artist, Show, Venue, db, is_show_overlap_error
 from fyyur.routes.show import get_shows
-from fyyur.schema.show import ShowResponse
+from fyyur.schema.show import ShowCursor, ShowResponse
 from tests.mock import mock_artist, mock_show, mock_venue
-from tests.utils import date_future
+from tests.utils import count_queries, date_future, date_future_str, date_past
 
 
 def test_get_shows_status_200(client: FlaskClient) -> None:
@@ -86,8 +89,8 @@ def test_get_shows(app: Flask, client: FlaskClient) -> None:
     ]
 
     with app.app_context():
-        all_shows = get_shows()
-        dumped_shows = [show.model_dump() for show in get_shows()]
+        all_shows = get_shows().shows
+        dumped_shows = [show.model_dump() for show in all_shows]
         for expected_show in expected_shows:
             assert ShowResponse.model_validate(expected_show) in all_shows
             assert expected_show in dumped_shows
@@ -126,3 +129,263 @@ def test_create_show_same_date_different_venue_and_artist(
 
 def test_create_show_in_the_past(app: Flask, client: FlaskClient) -> None:
     assert not add_show(app=app, client=client, venue_id=2, artist_id=2, day_offset=-100)
+
+
+@pytest.mark.parametrize("num_shows", [1, 50])
+def test_get_shows_constant_queries(app: Flask, num_shows: int) -> None:
+    with app.app_context():
+        for day_offset in range(10, 10 + num_shows):
+            db.session.add(
+                mock_show(venue_id=3, artist_id=4, day_offset=day_offset).to_orm(Show)
+            )
+        db.session.commit()
+
+        with count_queries() as statements:
+            page = get_shows(per_page=100)
+
+        # the mock data has 4 upcoming shows
+        assert len(page.shows) == 4 + num_shows
+        # the page itself and the existence check for the previous page
+        assert len(statements) == 2
+
+
+def test_get_shows_starts_at_now(app: Flask) -> None:
+    with app.app_context():
+        page = get_shows()
+        assert [show.start_time for show in page.shows] == [
+            date_future(1),
+            date_future(2),
+            date_future(3),
+            date_future(4),
+        ]
+        assert page.next_cursor is None
+        assert page.prev_cursor is not None
+
+        previous_page = get_shows(before=ShowCursor.decode(page.prev_cursor))
+        assert [show.start_time for show in previous_page.shows] == [date_past(4)]
+        assert previous_page.prev_cursor is None
+        assert previous_page.next_cursor is not None
+
+
+def test_get_shows_keyset_pagination(app: Flask) -> None:
+    with app.app_context():
+        # same start time for all of them, so only the id tells them apart
+        for venue_id in range(10, 17):
+            db.session.add(mock_venue(venue_id).to_orm(Venue))
+            db.session.add(mock_artist(venue_id).to_orm(Artist))
+            db.session.add(
+                mock_show(venue_id=venue_id, artist_id=venue_id, day_offset=100).to_orm(
+                    Show
+                )
+            )
+        db.session.commit()
+
+        forward: list[ShowResponse] = []
+        page = get_shows(after=ShowCursor(date_future(50), 0), per_page=3)
+        forward.extend(page.shows)
+        while page.next_cursor is not None:
+            page = get_shows(after=ShowCursor.decode(page.next_cursor), per_page=3)
+            forward.extend(page.shows)
+        assert [show.venue_id for show in forward] == list(range(10, 17))
+
+        backward: list[ShowResponse] = []
+        while page.prev_cursor is not None:
+            page = get_shows(before=ShowCursor.decode(page.prev_cursor), per_page=3)
+            backward = page.shows + backward
+        assert [show.start_time for show in backward][-6:] == [*[date_future(100)] * 6]
+        assert len(backward) == 5 + 6
+
+
+def test_get_shows_pagination_links(client: FlaskClient) -> None:
+    response = client.get("/shows/")
+    assert response.status_code == 200
+    assert b"before=" in response.data
+    assert b"after=" not in response.data
+
+    assert client.get("/shows/?after=not-a-cursor").status_code == 400
+
+
+def test_create_show_single_statement(app: Flask, client: FlaskClient) -> None:
+    show = mock_show(venue_id=3, artist_id=4, day_offset=100)
+    with app.app_context():
+        with count_queries() as statements:
+            client.post("/shows/create", data=show.model_dump())
+        assert len(statements) == 1
+        assert statements[0].startswith("INSERT")
+
+
+@pytest.mark.parametrize(
+    "venue_id, artist_id, offset, overlaps",
+    [
+        (3, 4, timedelta(seconds=30), True),
+        (3, 4, timedelta(minutes=1), True),
+        (3, 4, timedelta(minutes=1, seconds=1), False),
+        (3, 1, -timedelta(seconds=59), True),
+        (1, 4, timedelta(seconds=59), True),
+        (1, 1, timedelta(0), False),
+    ],
+)
+def test_show_overlap_enforced_by_database(
+    app: Flask, venue_id: int, artist_id: int, offset: timedelta, overlaps: bool
+) -> None:
+    start_time = date_future(100)
+    with app.app_context():
+        db.session.add(Show(venue_id=3, artist_id=4, start_time=start_time))
+        db.session.commit()
+
+        db.session.add(
+            Show(venue_id=venue_id, artist_id=artist_id, start_time=start_time + offset)
+        )
+        if overlaps:
+            with pytest.raises(sa.exc.IntegrityError) as e:
+                db.session.commit()
+            assert is_show_overlap_error(e.value)
+            db.session.rollback()
+        else:
+            db.session.commit()
+
+
+def test_show_overlap_enforced_on_update(app: Flask) -> None:
+    with app.app_context():
+        show: Show = Show.query.filter_by(id=2).one()
+        show.start_time = date_future(1)
+        with pytest.raises(sa.exc.IntegrityError):
+            db.session.commit()
+        db.session.rollback()
+
+        show = Show.query.filter_by(id=2).one()
+        show.start_time = date_future(50)
+        db.session.commit()
+
+
+def test_create_shows_bulk(app: Flask, client: FlaskClient) -> None:
+    batch = [
+        # 1: accepted
+        mock_show(venue_id=3, artist_id=4, day_offset=100).model_dump(mode="json"),
+        # 2: in the past
+        mock_show(venue_id=3, artist_id=4, day_offset=-100).model_dump(mode="json"),
+        # 3: artist doesn't exist
+        mock_show(venue_id=3, artist_id=100, day_offset=100).model_dump(mode="json"),
+        # 4: venue 1 already has show 1 at that time
+        mock_show(venue_id=1, artist_id=4, day_offset=1).model_dump(mode="json"),
+        # 5: artist 4 plays at row 1 at the same time
+        mock_show(venue_id=2, artist_id=4, day_offset=100).model_dump(mode="json"),
+        # 6: invalid
+        {"venue_id": 3, "artist_id": 4},
+        # 7: accepted
+        mock_show(venue_id=2, artist_id=3, day_offset=100).model_dump(mode="json"),
+    ]
+
+    with app.app_context():
+        with count_queries() as statements:
+            response = client.post("/shows/bulk", json=batch)
+        # artist/venue lookup, range query and the insert
+        assert len(statements) == 3
+
+    assert response.status_code == 200
+    assert response.json is not None
+    assert response.json["accepted"] == 2
+    assert response.json["rejected"] == 5
+    results = {result["row"]: result for result in response.json["results"]}
+    assert [row for row, result in results.items() if result["accepted"]] == [1, 7]
+    assert results[2]["reason"] == "Could not create show in the past"
+    assert results[3]["reason"] == "Artist or Venue doesn't exist"
+    assert results[4]["reason"] == "Show existed"
+    assert results[5]["reason"] == "Conflicts with row 1"
+
+    with app.app_context():
+        assert (
+            Show.query.filter_by(
+                venue_id=3, artist_id=4, start_time=date_future(100)
+            ).one_or_none()
+            is not None
+        )
+        assert Show.query.filter_by(venue_id=2, artist_id=4).count() == 1
+
+
+def test_create_shows_bulk_with_time_zones(app: Flask, client: FlaskClient) -> None:
+    batch = [
+        {"venue_id": 3, "artist_id": 4, "start_time": "2030-01-01T10:00:00Z"},
+        {"venue_id": 3, "artist_id": 4, "start_time": "2001-01-01T10:00:00+02:00"},
+    ]
+    response = client.post("/shows/bulk", json=batch)
+    assert response.status_code == 200
+    assert response.json is not None
+    assert [result["accepted"] for result in response.json["results"]] == [True, False]
+    assert response.json["results"][1]["reason"] == "Could not create show in the past"
+
+    # stored in local time
+    start_time = datetime(2030, 1, 1, 10, tzinfo=timezone.utc).astimezone()
+    with app.app_context():
+        show = Show.query.filter_by(venue_id=3, artist_id=4).one()
+        assert show.start_time == start_time.replace(tzinfo=None)
+
+
+def test_create_shows_bulk_csv(app: Flask, client: FlaskClient) -> None:
+    csv_batch = "artist_id,venue_id,start_time\n" + "".join(
+        f"4,3,{date_future_str(day_offset)}\n" for day_offset in (100, 101, 102)
+    )
+    response = client.post("/shows/bulk", data=csv_batch, content_type="text/csv")
+    assert response.json is not None
+    assert response.json["accepted"] == 3
+
+    response = client.post("/shows/bulk", json={"not": "a list"})
+    assert response.status_code == 400
+
+    csv_batch = f"artist_id,venue_id,start_time\n4,3,{date_future_str(103)},extra\n"
+    response = client.post("/shows/bulk", data=csv_batch, content_type="text/csv")
+    assert response.status_code == 400
+    assert response.json == {"error": "Row 1 has more columns than the header"}
+
+
+def test_create_shows_bulk_looks_up_conflicts_around_the_batch(
+    app: Flask, client: FlaskClient
+) -> None:
+    batch = [
+        mock_show(venue_id=3, artist_id=4, day_offset=100).model_dump(mode="json"),
+        mock_show(venue_id=3, artist_id=4, day_offset=400).model_dump(mode="json"),
+        # venue 1 already has show 1 at that time
+        mock_show(venue_id=1, artist_id=3, day_offset=1).model_dump(mode="json"),
+    ]
+    with app.app_context():
+        db.session.add(mock_show(venue_id=3, artist_id=4, day_offset=200).to_orm(Show))
+        db.session.commit()
+
+        with count_queries() as statements:
+            response = client.post("/shows/bulk", json=batch)
+        assert len(statements) == 3
+        # one range per group of close start times, not the whole span of the batch
+        conflict_query = statements[1]
+        assert conflict_query.count("start_time >=") == 3
+
+    assert response.json is not None
+    assert [result["accepted"] for result in response.json["results"]] == [
+        True,
+        True,
+        False,
+    ]
+    assert response.json["results"][2]["reason"] == "Show existed"
+
+
+def test_schedule_shows_command(app: Flask, tmp_path: Path) -> None:
+    batch_file = tmp_path / "shows.json"
+    batch_file.write_text(
+        json.dumps(
+            [
+                mock_show(venue_id=3, artist_id=4, day_offset=100).model_dump(
+                    mode="json"
+                ),
+                mock_show(venue_id=3, artist_id=4, day_offset=100).model_dump(
+                    mode="json"
+                ),
+            ]
+        )
+    )
+
+    result = app.test_cli_runner().invoke(
+        args=["fyyur", "schedule-shows", str(batch_file)]
+    )
+    assert result.exit_code == 0
+    assert "row 1: accepted" in result.output
+    assert "row 2: rejected: Conflicts with row 1" in result.output
+    assert "1 accepted, 1 rejected" in result.output
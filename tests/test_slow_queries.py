@@ -0,0 +1,82 @@
+import logging
+from typing import Iterator
+
+import pytest
+import sqlalchemy as sa
+from flask import Flask
+
+from fyyur.config import TestingConfig
+from fyyur.models import Genre, Venue, db
+from tests.conftest import make_app
+
+
+class SlowQueryConfig(TestingConfig):
+    # log every statement
+    SLOW_QUERY_THRESHOLD = 0.0
+
+
+@pytest.fixture()
+def slow_query_app() -> Iterator[Flask]:
+    yield from make_app(SlowQueryConfig)
+
+
+def slow_queries(caplog: pytest.LogCaptureFixture) -> list[str]:
+    return [
+        record.getMessage()
+        for record in caplog.records
+        if record.getMessage().startswith("slow query")
+    ]
+
+
+def first_logged_with(caplog: pytest.LogCaptureFixture, text: str) -> str:
+    # the loads of the relationships of the results come after
+    return next(query for query in slow_queries(caplog) if text in query)
+
+
+def test_slow_query_is_logged_with_its_plan(
+    slow_query_app: Flask, caplog: pytest.LogCaptureFixture
+) -> None:
+    client = slow_query_app.test_client()
+    with caplog.at_level(logging.WARNING):
+        response = client.post("/venues/search", data={"search_term": "enue"})
+    assert response.status_code == 200
+
+    search = first_logged_with(caplog, "'%enue%'")
+    assert "in venue.search_venues" in search
+    assert 'FROM "Venue"' in search
+    # the ilike only runs on the candidates of the n-gram index
+    assert "SEARCH Venue USING INTEGER PRIMARY KEY" in search
+
+    with caplog.at_level(logging.WARNING):
+        client.post("/venues/search", data={"search_term": "v_n"})
+    # the index can't serve wildcards, the ilike has to scan the whole table
+    assert "SCAN Venue" in first_logged_with(caplog, "'%v_n%'")
+
+    with caplog.at_level(logging.WARNING):
+        client.post("/venues/search", data={"search_term": "music", "mode": "full_text"})
+    full_text_search = first_logged_with(caplog, "'\"music\"*'")
+    assert "SCAN venue_search VIRTUAL TABLE" in full_text_search
+    assert "SEARCH Venue USING INTEGER PRIMARY KEY" in full_text_search
+
+
+def test_slow_query_outside_requests(
+    slow_query_app: Flask, caplog: pytest.LogCaptureFixture
+) -> None:
+    with slow_query_app.app_context(), caplog.at_level(logging.WARNING):
+        db.session.execute(sa.select(Venue.id).where(Venue.id == 1)).all()
+        db.session.execute(sa.insert(Genre), [{"name": "A"}, {"name": "B"}])
+        db.session.execute(sa.text("PRAGMA foreign_keys"))
+
+    select, insert, pragma = slow_queries(caplog)
+    assert "in no request" in select
+    assert "SEARCH Venue USING INTEGER PRIMARY KEY" in select
+    assert "not available for executemany" in insert
+    assert "not available for this statement" in pragma
+
+
+def test_slow_query_log_is_disabled_by_default(
+    app: Flask, caplog: pytest.LogCaptureFixture
+) -> None:
+    with caplog.at_level(logging.WARNING):
+        app.test_client().get("/venues/")
+    assert not slow_queries(caplog)
@@ -0,0 +1,88 @@
+from datetime import datetime
+from functools import partial
+from multiprocessing.pool import Pool
+
+import sqlalchemy as sa
+from flask import Flask
+
+from fyyur.models import Artist, Show, Venue, db
+from fyyur.synthetic import (
+    DatasetSpec,
+    artist_rows,
+    generate_chunks,
+    show_rows,
+    venue_rows,
+)
+
+ORIGIN = datetime(2030, 1, 1)
+
+
+def test_generated_rows_are_deterministic() -> None:
+    spec = DatasetSpec(venues=30, artists=50, shows=200, seed=7, origin=ORIGIN)
+    assert venue_rows(spec, 0) == venue_rows(spec, 0)
+    assert artist_rows(spec, 0) == artist_rows(spec, 0)
+    assert show_rows(spec, 0) == show_rows(spec, 0)
+    assert venue_rows(spec, 0) != venue_rows(DatasetSpec(30, 50, 200, seed=8), 0)
+
+    # the rows only depend on the chunk, not on which process generates them
+    spec = DatasetSpec(venues=30, artists=50, shows=200, origin=ORIGIN, chunk_size=16)
+    with Pool(2) as pool:
+        in_pool = list(generate_chunks(pool, partial(show_rows, spec), 13, 2))
+    assert in_pool == [show_rows(spec, chunk) for chunk in range(13)]
+
+
+def test_generated_shows_do_not_overlap() -> None:
+    spec = DatasetSpec(
+        venues=7, artists=11, shows=500, past_ratio=0.3, days=3, origin=ORIGIN
+    )
+    shows = show_rows(spec, 0)
+    assert len(shows) == 500
+
+    for owner in ("venue", "artist"):
+        times: dict[int, list[datetime]] = {}
+        for venue, artist, start_time in shows:
+            times.setdefault(venue if owner == "venue" else artist, []).append(start_time)
+        for owner_times in times.values():
+            owner_times.sort()
+            assert all(
+                (later - earlier).total_seconds() >= 120
+                for earlier, later in zip(owner_times, owner_times[1:])
+            )
+
+    num_past = sum(start_time < ORIGIN for _, _, start_time in shows)
+    assert abs(num_past - 150) <= 7
+
+
+def test_generate_command(app: Flask) -> None:
+    with app.app_context():
+        counts_before = [
+            db.session.scalars(sa.select(sa.func.count()).select_from(model)).one()
+            for model in (Venue, Artist, Show)
+        ]
+
+    result = app.test_cli_runner().invoke(
+        args=[
+            "fyyur",
+            "generate",
+            "--venues=20",
+            "--artists=40",
+            "--shows=300",
+            "--chunk-size=64",
+            "--processes=2",
+        ]
+    )
+    assert result.exit_code == 0, result.output
+    assert "20 venues, 40 artists and 300 shows generated" in result.output
+
+    with app.app_context():
+        counts = [
+            db.session.scalars(sa.select(sa.func.count()).select_from(model)).one()
+            for model in (Venue, Artist, Show)
+        ]
+        added = [count - before for count, before in zip(counts, counts_before)]
+        assert added == [20, 40, 300]
+
+        venue = db.session.scalars(sa.select(Venue).order_by(Venue.id.desc())).first()
+        assert venue is not None
+        assert 1 <= len(venue.genres) <= 3
+        assert venue.venue_info.state is not None
@@ -6,11 +6,11 @@ from flask.testing import FlaskClient
 
 from fyyur.models import Show, Venue, db
 from fyyur.routes.venue import find_venues, get_venue_info, get_venues
-from fyyur.schema.base import SearchSchema, State
+from fyyur.schema.base import SearchMode, SearchSchema, State
 from fyyur.schema.genre import GenreEnum
 from fyyur.schema.venue import VenueInfoResponse
 from tests.mock import mock_show, mock_venue
-from tests.utils import date_future, date_past
+from tests.utils import count_queries, date_future, date_past
 
 
 def test_get_venues(app: Flask) -> None:
@@ -127,6 +127,48 @@ def test_find_venues_with_past_shows(app: Flask) -> None:
         assert venues_data == [{"id": 10, "name": "King", "num_upcoming_shows": 1}]
 
 
+def test_find_venues_full_text(app: Flask, client: FlaskClient) -> None:
+    with app.app_context():
+        db.session.add(
+            mock_venue(id=10, name="The Blue Note", city="New York").to_orm(Venue)
+        )
+        db.session.add(mock_venue(id=11, name="New Orleans Jazz Club").to_orm(Venue))
+        db.session.commit()
+
+        def search(search_term: str) -> list[int]:
+            return [
+                venue.id
+                for venue in find_venues(
+                    SearchSchema(search_term=search_term, mode=SearchMode.FULL_TEXT)
+                )
+            ]
+
+        # words by prefix, in any order, ignoring case and punctuation
+        assert search("blue not") == [10]
+        assert search("Club, JAZZ") == [11]
+        assert search("lue") == []
+        # names rank above locations
+        assert search("new") == [11, 10]
+        assert search("san francisco") == [1, 2, 3, 11]
+        assert search("") == [1, 2, 3, 10, 11]
+
+        # the index follows the changes of the venues
+        venue = db.session.get(Venue, 10)
+        assert venue is not None
+        venue.name = "Village Vanguard"
+        db.session.commit()
+        assert search("blue") == []
+        assert search("vanguard") == [10]
+
+        db.session.delete(venue)
+        db.session.commit()
+        assert search("vanguard") == []
+
+    response = client.post("/venues/search", data={"search_term": "jazz"})
+    assert response.status_code == 200
+    assert b"New Orleans Jazz Club" in response.data
+
+
 @pytest.mark.parametrize(
     "venue_id, expected_venue_data",
     [
@@ -175,7 +217,7 @@ def test_find_venues_with_past_shows(app: Flask) -> None:
             {
                 "id": 2,
                 "name": "Venue2",
-                "genres": ["Jazz", "Rock n Roll", "Pop"],
+                "genres": ["Jazz", "Pop", "Rock n Roll"],
                 "address": "123",
                 "city": "San Francisco",
                 "state": "CA",
@@ -300,3 +342,99 @@ def test_edit_venue_request(client: FlaskClient) -> None:
 
     response = client.get("/venues/100/edit")
     assert response.status_code == 404
+
+
+def test_venue_list_queries_do_not_grow_with_shows(app: Flask) -> None:
+    with app.app_context():
+        with count_queries() as statements:
+            get_venues()
+            find_venues(SearchSchema(search_term="Venue", mode=SearchMode.FULL_TEXT))
+        num_statements = len(statements)
+
+        for venue_id in range(10, 15):
+            db.session.add(mock_venue(id=venue_id).to_orm(Venue))
+            # shift every venue's shows so artist 1 never plays twice at once
+            shift = 50 * (venue_id - 10)
+            for day_offset in (
+                -20 - shift,
+                -10 - shift,
+                10 + shift,
+                20 + shift,
+                30 + shift,
+            ):
+                db.session.add(
+                    mock_show(
+                        venue_id=venue_id, artist_id=1, day_offset=day_offset
+                    ).to_orm(Show)
+                )
+        db.session.commit()
+
+        with count_queries() as statements:
+            venues = get_venues()
+            find_venues(SearchSchema(search_term="Venue", mode=SearchMode.FULL_TEXT))
+        assert len(statements) == num_statements
+
+        venue = next(venue for venue in venues[0].venues if venue.id == 10)
+        assert venue.num_upcoming_shows == 3
+
+
+def test_venue_with_show_counts(app: Flask) -> None:
+    with app.app_context():
+        venues: list[Venue] = (
+            Venue.query.options(*Venue.with_show_counts()).order_by(Venue.id).all()
+        )
+        assert [(venue.num_upcoming_shows, venue.num_past_shows) for venue in venues] == [
+            (3, 0),
+            (1, 1),
+            (0, 0),
+        ]
+
+
+def test_venue_show_hybrids_in_sql(app: Flask) -> None:
+    with app.app_context():
+        with count_queries() as statements:
+            venues_with_upcoming_shows = (
+                db.session.query(Venue.id, Venue.upcoming_shows_count)
+                .filter(Venue.has_upcoming_shows)
+                .order_by(Venue.upcoming_shows_count.desc())
+                .all()
+            )
+            venues_with_past_shows = (
+                db.session.query(Venue.id, Venue.past_shows_count)
+                .filter(Venue.has_past_shows)
+                .all()
+            )
+            venues_without_shows = (
+                db.session.query(Venue.id)
+                .filter(~Venue.has_upcoming_shows, ~Venue.has_past_shows)
+                .all()
+            )
+
+        assert venues_with_upcoming_shows == [(1, 3), (2, 1)]
+        assert venues_with_past_shows == [(2, 1)]
+        assert venues_without_shows == [(3,)]
+        assert len(statements) == 3
+
+
+def test_get_venue_info_query_budget(app: Flask) -> None:
+    with app.app_context():
+        for day_offset in (-30, -20, 20, 30):
+            db.session.add(
+                mock_show(venue_id=3, artist_id=2, day_offset=day_offset).to_orm(Show)
+            )
+        db.session.commit()
+
+        with count_queries() as statements:
+            venue_info = get_venue_info(venue_id=3)
+        assert len(statements) <= 2
+
+        assert venue_info is not None
+        assert venue_info.genres == [GenreEnum.Pop]
+        assert [show.start_time for show in venue_info.past_shows] == [
+            date_past(30),
+            date_past(20),
+        ]
+        assert [show.start_time for show in venue_info.upcoming_shows] == [
+            date_future(20),
+            date_future(30),
+        ]
@@ -1,6 +1,12 @@
+from collections.abc import Iterator
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from typing import Any
+
+import sqlalchemy as sa
 
 from fyyur.constant import DATETIME_FORMAT
+from fyyur.models import db
 
 
 def date_offset(days: int = 1) -> datetime:
@@ -27,3 +33,35 @@ def date_future_str(days: int = 1) -> str:
 
 def date_past_str(days: int = 1) -> str:
     return date_past(days).strftime(DATETIME_FORMAT)
+
+
+@contextmanager
+def count_queries() -> Iterator[list[str]]:
+    """Collect every statement sent to the database inside the block.
+    Must be used inside an app context."""
+    statements: list[str] = []
+
+    def before_cursor_execute(*args: Any) -> None:
+        statements.append(args[2])
+
+    engine = db.engine
+    sa.event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        sa.event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+@contextmanager
+def count_loaded_objects() -> Iterator[list[Any]]:
+    """Collect every model instance loaded from the database inside the block."""
+    loaded: list[Any] = []
+
+    def load(target: Any, context: Any) -> None:
+        loaded.append(target)
+
+    sa.event.listen(db.Model, "load", load, propagate=True)
+    try:
+        yield loaded
+    finally:
+        sa.event.remove(db.Model, "load", load)